@@ -1,15 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from starlette.requests import HTTPConnection
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
 from app.services.chat_service import ChatService
 from app.services.bot_service import BotService
 from app.models.schemas import ChatCreate, Chat, MessageCreate, Message
-from typing import List
+from app.models.haiguitang import HaiguiTangStart
+from app.core.message_cache import message_window_cache
+from app.services.llm.answer_cache import judge_answer_cache
+from app.repositories.haiguitang_cache import haiguitang_cache
+from app.core.logger import bind_log_context
+from app.core.chat_hub import chat_hub
+from app.core.exceptions import AppException
+from app.core.security import decode_access_token
+from app.db.database import AsyncSessionLocal
+from app.repositories.chat_repository import ChatRepository
+from app.core.config import settings
+from app.utils.etag import make_etag, etag_matches
+from app.utils.fast_json import FastJSONResponse
+from typing import List, AsyncIterator, Tuple, Optional
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+async def bind_path_log_context(request: HTTPConnection):
+    # 异步依赖与路由函数在同一任务中执行，路径中的 chat_id/user_id 会出现在后续所有日志中
+    bind_log_context(chat_id=request.path_params.get("chat_id"), user_id=request.path_params.get("user_id"))
+
+router = APIRouter(dependencies=[Depends(bind_path_log_context)])
 
 def get_chat_service(db: AsyncSession = Depends(get_db)):
     bot_service = BotService(db)
@@ -19,26 +39,61 @@ def get_chat_service(db: AsyncSession = Depends(get_db)):
 async def create_chat(chat: ChatCreate, chat_service: ChatService = Depends(get_chat_service)):
     return await chat_service.create_chat(chat)
 
+# FAST_SERIALIZATION 开启时，读接口直接返回 FastJSONResponse：内容由查询结果组装，不再经过 response_model 校验
+
 @router.get("/all", response_model=List[Chat])
 async def get_all_chats(chat_service: ChatService = Depends(get_chat_service)):
+    if settings.FAST_SERIALIZATION:
+        return FastJSONResponse(await chat_service.get_all_chat_rows())
     return await chat_service.get_all_chats()
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        "messages": message_window_cache.stats(),
+        "answers": judge_answer_cache.stats(),
+        "haiguitangs": haiguitang_cache.stats(),
+    }
+
+def cache_headers(etag: str) -> dict:
+    # no-cache：客户端可以缓存，但每次使用前都要带 If-None-Match 重新验证
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
 @router.get("/{chat_id}", response_model=Chat)
-async def get_chat(chat_id: str, chat_service: ChatService = Depends(get_chat_service)):
-    print(f"尝试获取聊天ID: {chat_id}")
+async def get_chat(chat_id: str, request: Request, response: Response,
+                   chat_service: ChatService = Depends(get_chat_service)):
     try:
-        chat = await chat_service.get_chat(chat_id)
+        # 先取版本号再加载内容：期间写入的新消息只会让 ETag 偏旧，客户端下次请求会重新获取
+        version = await chat_service.get_chat_version(chat_id)
+        if version is None:
+            logger.info("未找到聊天ID: %s", chat_id)
+            raise HTTPException(status_code=404, detail="聊天未找到")
+        etag = make_etag(version)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cache_headers(etag))
+
+        if settings.FAST_SERIALIZATION:
+            chat = await chat_service.get_chat_row(chat_id)
+        else:
+            chat = await chat_service.get_chat(chat_id)
         if not chat:
-            print(f"未找到聊天ID: {chat_id}")
+            logger.info("未找到聊天ID: %s", chat_id)
             raise HTTPException(status_code=404, detail="聊天未找到")
-        print(f"成功获取聊天ID: {chat_id}")
+        logger.debug("成功获取聊天ID: %s", chat_id)
+        if settings.FAST_SERIALIZATION:
+            return FastJSONResponse(chat, headers=cache_headers(etag))
+        response.headers.update(cache_headers(etag))
         return chat
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"获取聊天时发生错误: {str(e)}")
+        logger.exception("获取聊天时发生错误")
         raise HTTPException(status_code=500, detail=f"获取聊天时发生错误: {str(e)}")
 
 @router.get("/users/{user_id}", response_model=List[Chat])
 async def get_chat_history(user_id: str, limit: int = 10, chat_service: ChatService = Depends(get_chat_service)):
+    if settings.FAST_SERIALIZATION:
+        return FastJSONResponse(await chat_service.get_chat_history_rows(user_id, limit))
     return await chat_service.get_chat_history(user_id, limit)
 
 # 添加消息到聊天
@@ -51,23 +106,62 @@ async def add_message_to_chat(
     try:
         messages = await chat_service.add_message_and_get_caipan_reply(chat_id, message)
         return messages
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def format_sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+# 添加消息到聊天，并以 SSE 流式返回裁判的回复
+@router.post("/{chat_id}/messages/stream")
+async def stream_message_to_chat(
+    chat_id: str,
+    message: MessageCreate,
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    events = chat_service.add_message_and_stream_caipan_reply(chat_id, message)
+    # 先取第一个事件，这样聊天不存在等错误仍能以普通 HTTP 状态码返回
+    try:
+        first_event = await events.__anext__()
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream(first_event: Tuple[str, str], events: AsyncIterator[Tuple[str, str]]):
+        yield format_sse(*first_event)
+        try:
+            async for event in events:
+                yield format_sse(*event)
+        except Exception as e:
+            logger.error(f"流式生成回复时发生错误: {str(e)}")
+            yield format_sse("error", json.dumps({"detail": str(e)}, ensure_ascii=False))
+            return
+        yield format_sse("done", "{}")
+
+    return StreamingResponse(
+        event_stream(first_event, events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/join/{chat_id}/user/{user_id}", response_model=Chat)
 async def add_user_to_chat(chat_id: str, user_id: str, chat_service: ChatService = Depends(get_chat_service)):
-    print(f"API: 尝试将用户 {user_id} 添加到聊天 {chat_id}")
     try:
         result = await chat_service.add_user_to_chat(chat_id, user_id)
-        print("API: 用户成功添加到聊天")
+        logger.info("用户已加入聊天")
         return result
     except ValueError as e:
-        print(f"API: 值错误 - {str(e)}")
+        logger.info("用户加入聊天失败: %s", e)
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        print(f"API: 未知错误 - {str(e)}")
+        logger.exception("用户加入聊天时发生未知错误")
         raise HTTPException(status_code=500, detail=f"发生未知错误: {str(e)}")
 
 @router.delete("/{chat_id}/user/{user_id}", response_model=Chat)
@@ -77,10 +171,95 @@ async def remove_user_from_chat(chat_id: str, user_id: str, chat_service: ChatSe
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+# 在聊天中开始一道海龟汤（不指定时随机抽取未玩过的），并结束正在进行的那一道
+@router.post("/{chat_id}/haiguitang/start", response_model=Chat)
+async def start_haiguitang(chat_id: str, request: HaiguiTangStart, chat_service: ChatService = Depends(get_chat_service)):
+    try:
+        return await chat_service.start_haiguitang(chat_id, request)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/{chat_id}/haiguitang/end", response_model=Chat)
+async def end_haiguitang(chat_id: str, chat_service: ChatService = Depends(get_chat_service)):
+    try:
+        return await chat_service.end_haiguitang(chat_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# 支持 If-None-Match：内容未变时返回 304；同时传 wait（秒）时改为长轮询，等到下一条消息或超时再返回
 @router.get("/{chat_id}/messages/history", response_model=List[Message])
-async def get_chat_messages_history(chat_id: str, limit: int = 50, chat_service: ChatService = Depends(get_chat_service)):
+async def get_chat_messages_history(
+    chat_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    wait: float = Query(0, ge=0, le=settings.LONG_POLL_MAX_WAIT),
+    chat_service: ChatService = Depends(get_chat_service)
+):
     try:
-        messages = await chat_service.get_chat_messages_history(chat_id, limit)
+        headers = {}
+        version = await chat_service.get_chat_version(chat_id)
+        if version is not None:
+            etag = make_etag(version)
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                if not wait:
+                    return Response(status_code=304, headers=cache_headers(etag))
+                # 等待期间不占用数据库连接：每次查询结束后会话即归还连接
+                await chat_hub.wait_for_message(chat_id, wait)
+                # 超时也要重新取版本：其他进程写入的消息不会唤醒本进程的等待者
+                etag = make_etag(await chat_service.get_chat_version(chat_id) or version)
+                if etag_matches(request.headers.get("if-none-match"), etag):
+                    return Response(status_code=304, headers=cache_headers(etag))
+            headers = cache_headers(etag)
+        if settings.FAST_SERIALIZATION:
+            rows = await chat_service.get_message_rows(chat_id, limit, before=before, after=after)
+            return FastJSONResponse(rows, headers=headers)
+        response.headers.update(headers)
+        messages = await chat_service.get_chat_messages_history(chat_id, limit, before=before, after=after)
         return messages
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{chat_id}/messages", response_model=List[Message])
+async def get_chat_messages(
+    chat_id: str,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    try:
+        if settings.FAST_SERIALIZATION:
+            return FastJSONResponse(await chat_service.get_message_rows(chat_id, limit, after=after, oldest_first=True))
+        return await chat_service.get_chat_messages(chat_id, after=after, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 聊天的实时推送：连接时在查询参数中携带登录返回的 access_token，只有聊天成员可以订阅
+# 只推送不接收，发消息仍走 HTTP 接口；被断开（1013）后可用 GET /{chat_id}/messages?after= 补齐
+@router.websocket("/{chat_id}/ws")
+async def chat_websocket(websocket: WebSocket, chat_id: str, token: Optional[str] = None):
+    try:
+        user = decode_access_token(token) if token else None
+    except AppException:
+        user = None
+    if user is None:
+        await websocket.close(code=1008)
+        return
+    async with AsyncSessionLocal() as session:
+        is_member = await ChatRepository(session).is_chat_member(chat_id, user.id)
+    if not is_member:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    connection = chat_hub.connect(chat_id, user.id, websocket)
+    try:
+        while True:
+            # 客户端发来的内容忽略，只用于感知断开
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await chat_hub.disconnect(connection)
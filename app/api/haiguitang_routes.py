@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.db.database import get_db
-from app.models.haiguitang import HaiguiTangCreate, HaiguiTang, HaiguiTangUpdate
-from app.repositories.haiguitang_repository import HaiguiTangRepository
+from app.models.haiguitang import HaiguiTangCreate, HaiguiTang, HaiguiTangUpdate, HaiguiTangImportResult
+from app.repositories.haiguitang_repository import HaiguiTangRepository, export_ndjson
+from app.core.config import settings
+from app.utils.ndjson import iter_ndjson_lines
 from app.services.haiguitang_service import HaiguiTangService
+from app.core.puzzle_sampler import puzzle_sampler
 
 router = APIRouter()
 
@@ -15,4 +20,35 @@ async def create_haiguitang(haiguitang: HaiguiTangCreate, db: Session = Depends(
 @router.put("/haiguitang/{haiguitang_id}", response_model=HaiguiTang)
 async def update_haiguitang(haiguitang_id: str, haiguitang: HaiguiTangUpdate, db: Session = Depends(get_db)):
     haiguitang_repo = HaiguiTangRepository(db)
-    return await haiguitang_repo.update_haiguitang(haiguitang_id, haiguitang)
\ No newline at end of file
+    return await haiguitang_repo.update_haiguitang(haiguitang_id, haiguitang)
+
+@router.get("/haiguitang/random", response_model=HaiguiTang)
+async def get_random_haiguitang(
+    chat_id: Optional[str] = None,
+    tags: List[str] = Query(default=[]),
+    difficulty: Optional[int] = None,
+    favor_unused: bool = False,
+    db: Session = Depends(get_db)
+):
+    # chat_id: 排除该聊天玩过的题目；difficulty: 偏向接近该难度的题目；favor_unused: 偏向使用次数少的题目
+    haiguitang_repo = HaiguiTangRepository(db)
+    haiguitang = await haiguitang_repo.get_random_haiguitang(
+        chat_id=chat_id, tags=tags or None, target_difficulty=difficulty, favor_unused=favor_unused
+    )
+    if not haiguitang:
+        raise HTTPException(status_code=404, detail="没有符合条件的海龟汤")
+    return haiguitang
+
+@router.get("/haiguitang/sampler/stats")
+async def get_sampler_stats():
+    return puzzle_sampler.stats()
+
+@router.post("/haiguitang/import", response_model=HaiguiTangImportResult)
+async def import_haiguitang(request: Request, db: Session = Depends(get_db)):
+    # 请求体为 NDJSON，每行一个 HaiguiTangCreate；按块读取，不会把整个请求体读入内存
+    haiguitang_repo = HaiguiTangRepository(db)
+    return await haiguitang_repo.import_ndjson(iter_ndjson_lines(request.stream()), settings.HAIGUITANG_IMPORT_BATCH_SIZE)
+
+@router.get("/haiguitang/export")
+async def export_haiguitang():
+    return StreamingResponse(export_ndjson(settings.HAIGUITANG_EXPORT_BATCH_SIZE), media_type="application/x-ndjson")
@@ -1,16 +1,38 @@
-from fastapi import APIRouter, HTTPException
-from app.services.prompt_validator_service import validate_prompt, PromptValidation
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException
+from app.services.prompt_validator_service import validate_prompt, validate_prompts, reload_keywords, PromptValidation
+from pydantic import BaseModel, Field
+from typing import List
+from app.core.security import get_current_user
+from app.models.user import TokenUser
 
 router = APIRouter()
 
 class PromptRequest(BaseModel):
     prompt: str
 
+class BatchPromptRequest(BaseModel):
+    prompts: List[str] = Field(max_length=1000)
+
 @router.post("/validate", response_model=PromptValidation)
 async def validate_prompt_route(request: PromptRequest):
     try:
         result = await validate_prompt(request.prompt)
         return result
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"验证提示时发生错误：{str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"验证提示时发生错误：{str(e)}")
+
+@router.post("/validate/batch", response_model=List[PromptValidation])
+async def validate_prompts_route(request: BatchPromptRequest):
+    try:
+        return await validate_prompts(request.prompts)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"验证提示时发生错误：{str(e)}")
+
+# 重新读取服务器上的关键词文件（PROMPT_KEYWORDS_FILE），需要登录；关键词只能通过修改该文件变更
+@router.post("/keywords/reload")
+async def reload_keywords_route(current_user: TokenUser = Depends(get_current_user)):
+    try:
+        count = reload_keywords()
+        return {"count": count}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"重新加载关键词时发生错误：{str(e)}")
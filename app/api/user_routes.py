@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.user import UserCreate, User, UserLogin
-from app.services.user_service import create_user, get_user, login_or_register
+from app.models.user import UserCreate, User, UserLogin, UserWithToken, TokenUser
+from app.services.user_service import create_user, get_user, login_or_register, issue_token
+from app.core.security import get_current_user
 from app.db.database import get_db
 
 router = APIRouter()
@@ -10,6 +11,10 @@ router = APIRouter()
 async def create_user_route(user: UserCreate, db: AsyncSession = Depends(get_db)):
     return await create_user(db, user)
 
+@router.get("/me", response_model=TokenUser)
+async def get_me_route(current_user: TokenUser = Depends(get_current_user)):
+    return current_user
+
 @router.get("/{user_id}", response_model=User)
 async def get_user_route(user_id: str, db: AsyncSession = Depends(get_db)):
     user = await get_user(db, user_id)
@@ -17,9 +22,10 @@ async def get_user_route(user_id: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="用户未找到")
     return user
 
-@router.post("/login_or_register", response_model=User)
+@router.post("/login_or_register", response_model=UserWithToken)
 async def login_or_register_route(user: UserLogin, db: AsyncSession = Depends(get_db)):
-    return await login_or_register(db, user)
+    # 返回用户信息的同时签发访问令牌，后续请求携带令牌即可，无需再次提交密码
+    return issue_token(await login_or_register(db, user))
 
 
 @router.post("/check_story_completion")
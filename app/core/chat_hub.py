@@ -0,0 +1,143 @@
+from typing import Dict, Optional, Set
+import asyncio
+import logging
+from pydantic import BaseModel
+from app.core.config import settings
+from app.core.tasks import spawn
+
+logger = logging.getLogger(__name__)
+
+# 发送队列已满的连接以 1013（Try Again Later）关闭，客户端重连后用 GET /{chat_id}/messages?after= 补齐
+SLOW_CONSUMER_CLOSE_CODE = 1013
+GOING_AWAY_CLOSE_CODE = 1001
+
+class Connection:
+    __slots__ = ("chat_id", "user_id", "websocket", "queue", "task", "closed")
+
+    def __init__(self, chat_id: str, user_id: str, websocket, queue_size: int):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+
+class ChatHub:
+    """进程内的聊天室发布/订阅：每个 WebSocket 连接有独立的有界发送队列和发送任务。
+
+    publish 只把编码好的帧放入各连接的队列，不等待网络发送，写消息的请求不会被慢客户端拖慢；
+    某个连接的队列满了（或单次发送超时）说明它跟不上，直接断开，而不是无限缓存或阻塞其他成员。
+    """
+
+    def __init__(self, queue_size: int, send_timeout: float):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.rooms: Dict[str, Set[Connection]] = {}
+        # 长轮询请求：等待某个聊天的下一条消息
+        self.waiters: Dict[str, Set[asyncio.Future]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.evicted = 0
+
+    def connect(self, chat_id: str, user_id: str, websocket) -> Connection:
+        connection = Connection(chat_id, user_id, websocket, self.queue_size)
+        self.rooms.setdefault(chat_id, set()).add(connection)
+        connection.task = asyncio.create_task(self.send_loop(connection))
+        return connection
+
+    async def disconnect(self, connection: Connection):
+        self.remove(connection)
+        if connection.task is not None and connection.task is not asyncio.current_task():
+            connection.task.cancel()
+
+    def remove(self, connection: Connection):
+        connection.closed = True
+        room = self.rooms.get(connection.chat_id)
+        if room is not None:
+            room.discard(connection)
+            if not room:
+                del self.rooms[connection.chat_id]
+
+    def publish(self, chat_id: str, event: str, data: BaseModel):
+        self.wake_waiters(chat_id)
+        room = self.rooms.get(chat_id)
+        if not room:
+            return
+        # 每条消息只序列化一次，所有连接共享同一个帧
+        frame = f'{{"event":"{event}","data":{data.model_dump_json()}}}'
+        self.published += 1
+        for connection in list(room):
+            try:
+                connection.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.evict(connection, "发送队列已满")
+
+    def evict(self, connection: Connection, reason: str):
+        if connection.closed:
+            return
+        self.evicted += 1
+        logger.warning(f"断开跟不上的 WebSocket 连接 chat={connection.chat_id} user={connection.user_id}: {reason}")
+        self.remove(connection)
+        if connection.task is not None and connection.task is not asyncio.current_task():
+            connection.task.cancel()
+        spawn(self.close(connection, SLOW_CONSUMER_CLOSE_CODE))
+
+    async def close(self, connection: Connection, code: int):
+        try:
+            await asyncio.wait_for(connection.websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+    async def send_loop(self, connection: Connection):
+        try:
+            while True:
+                frame = await connection.queue.get()
+                await asyncio.wait_for(connection.websocket.send_text(frame), self.send_timeout)
+                self.delivered += 1
+        except asyncio.TimeoutError:
+            self.evict(connection, "发送超时")
+        except Exception:
+            # 连接已断开，接收循环会负责清理
+            self.remove(connection)
+
+    async def wait_for_message(self, chat_id: str, timeout: float) -> bool:
+        """等待该聊天的下一条消息，超时返回 False。只能感知本进程写入的消息，多进程部署时可能等到超时。"""
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(chat_id, set()).add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters = self.waiters.get(chat_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self.waiters[chat_id]
+
+    def wake_waiters(self, chat_id: str):
+        for waiter in self.waiters.pop(chat_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def close_all(self):
+        connections = [connection for room in self.rooms.values() for connection in room]
+        for connection in connections:
+            await self.disconnect(connection)
+        await asyncio.gather(*(self.close(connection, GOING_AWAY_CLOSE_CODE) for connection in connections))
+        # 正在长轮询的请求立即返回
+        for chat_id in list(self.waiters):
+            self.wake_waiters(chat_id)
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self.rooms),
+            "connections": sum(len(room) for room in self.rooms.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "long_poll_waiters": sum(len(waiters) for waiters in self.waiters.values()),
+        }
+
+chat_hub = ChatHub(queue_size=settings.WS_SEND_QUEUE_SIZE, send_timeout=settings.WS_SEND_TIMEOUT)
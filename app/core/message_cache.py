@@ -0,0 +1,126 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+import sys
+from app.core.config import settings
+from app.models.schemas import Message
+
+# 每条消息除正文外的大致内存开销（pydantic 对象、datetime、ID 字符串等）
+MESSAGE_OVERHEAD_BYTES = 600
+
+class _Window:
+    __slots__ = ("messages", "has_all", "size_bytes")
+
+    def __init__(self, maxlen: int):
+        self.messages: Deque[Message] = deque(maxlen=maxlen)
+        # 窗口中是否已包含该聊天的全部消息（聊天较短时成立）
+        self.has_all = False
+        self.size_bytes = 0
+
+def message_size(message: Message) -> int:
+    return sys.getsizeof(message.content) + MESSAGE_OVERHEAD_BYTES
+
+class MessageWindowCache:
+    """按聊天缓存最近的消息窗口，按最近使用淘汰。
+
+    写入通过 append 同步更新，读取未命中时由调用方回源数据库并 fill。
+    缓存在进程内，多进程部署时需要按 chat_id 做粘性路由或关闭缓存。
+    """
+
+    def __init__(self, max_chats: int, window_size: int):
+        self.max_chats = max_chats
+        self.window_size = window_size
+        self.windows: "OrderedDict[str, _Window]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = 0
+        # 记录每个聊天最近一次写入的序号，防止并发写入时用过期的读取结果填充缓存
+        self.write_seq = 0
+        self.last_writes: "OrderedDict[str, int]" = OrderedDict()
+        # 已从 last_writes 淘汰的最大序号：不在记录中的聊天可能在这之前有过写入，早于它开始的读取一律不回填
+        self.evicted_write_seq = 0
+
+    def get(self, chat_id: str, limit: int) -> Optional[List[Message]]:
+        window = self.windows.get(chat_id)
+        if window is None or (len(window.messages) < limit and not window.has_all):
+            self.misses += 1
+            return None
+        self.windows.move_to_end(chat_id)
+        self.hits += 1
+        messages = list(window.messages)
+        return messages[-limit:] if limit < len(messages) else messages
+
+    def begin_read(self) -> int:
+        return self.write_seq
+
+    def fill(self, chat_id: str, messages: List[Message], limit: int, read_seq: int):
+        # messages 为从数据库取回的最新 limit 条（按时间正序），read_seq 为读取前 begin_read 的返回值
+        if self.last_writes.get(chat_id, self.evicted_write_seq) > read_seq:
+            return
+        # 取回数量少于 limit 说明已是全部消息；否则只有 limit 不小于窗口大小时才能填满窗口
+        has_all = len(messages) < limit
+        if not has_all and limit < self.window_size:
+            return
+        self.discard(chat_id)
+        window = _Window(self.window_size)
+        for message in messages[-self.window_size:]:
+            window.messages.append(message)
+            window.size_bytes += message_size(message)
+        window.has_all = has_all and len(messages) <= self.window_size
+        self.windows[chat_id] = window
+        self.size_bytes += window.size_bytes
+        while len(self.windows) > self.max_chats:
+            _, evicted = self.windows.popitem(last=False)
+            self.size_bytes -= evicted.size_bytes
+            self.evictions += 1
+
+    def append(self, chat_id: str, message: Message):
+        self.write_seq += 1
+        self.last_writes[chat_id] = self.write_seq
+        self.last_writes.move_to_end(chat_id)
+        while len(self.last_writes) > self.max_chats * 4:
+            _, seq = self.last_writes.popitem(last=False)
+            self.evicted_write_seq = max(self.evicted_write_seq, seq)
+
+        # 未缓存的聊天不创建窗口，等下次读取时再从数据库填充
+        window = self.windows.get(chat_id)
+        if window is None:
+            return
+        if len(window.messages) == self.window_size:
+            dropped = window.messages[0]
+            window.size_bytes -= message_size(dropped)
+            self.size_bytes -= message_size(dropped)
+            window.has_all = False
+        window.messages.append(message)
+        added = message_size(message)
+        window.size_bytes += added
+        self.size_bytes += added
+        self.windows.move_to_end(chat_id)
+
+    def discard(self, chat_id: str):
+        window = self.windows.pop(chat_id, None)
+        if window is not None:
+            self.size_bytes -= window.size_bytes
+
+    def clear(self):
+        self.windows.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "chats": len(self.windows),
+            "messages": sum(len(window.messages) for window in self.windows.values()),
+            "approx_bytes": self.size_bytes,
+            "max_chats": self.max_chats,
+            "window_size": self.window_size,
+        }
+
+message_window_cache = MessageWindowCache(
+    max_chats=settings.MESSAGE_CACHE_MAX_CHATS,
+    window_size=settings.MESSAGE_CACHE_WINDOW_SIZE,
+)
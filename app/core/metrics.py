@@ -0,0 +1,204 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+import time
+from sqlalchemy import event
+
+# 所有指标只在事件循环线程中更新（SQLAlchemy 的异步驱动同样在该线程的 greenlet 中执行），
+# 因此不需要加锁，热路径上只有几次整数/浮点数加法
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class RequestStats:
+    """单个请求内的 SQL 统计，由中间件创建并通过 contextvar 传递给引擎事件。"""
+    __slots__ = ("sql_statements", "sql_seconds")
+
+    def __init__(self):
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in items) + "}"
+
+def _format_le(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.histogram_buckets: Dict[str, Tuple[float, ...]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.help: Dict[str, str] = {}
+        self.collectors: List[Tuple[str, Callable[[], dict]]] = []
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.histograms.setdefault(name, {})
+        self.histogram_buckets[name] = buckets
+        self.help[name] = help_text
+
+    def counter(self, name: str, help_text: str):
+        self.counters.setdefault(name, {})
+        self.help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = tuple(labels.items())
+        series = self.histograms[name]
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.histogram_buckets[name])
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = tuple(labels.items())
+        series = self.counters[name]
+        series[key] = series.get(key, 0) + amount
+
+    def add_collector(self, prefix: str, collect: Callable[[], dict]):
+        # 抓取时才调用，用于导出连接池、缓存等已有统计中的数值
+        self.collectors.append((prefix, collect))
+
+    def render(self) -> str:
+        lines = []
+        for name, series in self.counters.items():
+            lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, series in self.histograms.items():
+            lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + [float("inf")], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_le(bound)))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for prefix, collect in self.collectors:
+            for key, value in collect().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+metrics.histogram("http_request_duration_seconds", "HTTP 请求耗时（到响应体发送完毕）")
+metrics.histogram("http_request_sql_statements", "单个请求执行的 SQL 语句数", COUNT_BUCKETS)
+metrics.histogram("http_request_sql_seconds", "单个请求内 SQL 执行总耗时")
+metrics.histogram("sql_statement_duration_seconds", "单条 SQL 语句耗时")
+metrics.histogram("llm_request_duration_seconds", "LLM 调用耗时")
+metrics.counter("llm_request_errors_total", "LLM 调用失败次数")
+metrics.counter("llm_tokens_total", "LLM 消耗的 token 数")
+
+class MetricsMiddleware:
+    """纯 ASGI 中间件，按路由模板记录请求耗时和请求内的 SQL 统计。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request_stats.reset(token)
+            # 使用路由模板而不是实际路径，避免 chat_id 等参数导致标签数量膨胀
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            metrics.observe("http_request_duration_seconds", elapsed, method=method, route=route_path, status=str(status_code))
+            metrics.observe("http_request_sql_statements", stats.sql_statements, method=method, route=route_path)
+            metrics.observe("http_request_sql_seconds", stats.sql_seconds, method=method, route=route_path)
+
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        metrics.observe("sql_statement_duration_seconds", elapsed)
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.sql_statements += 1
+            stats.sql_seconds += elapsed
+
+class LLMCallTracker:
+    """记录一次 LLM 调用的耗时和是否失败。
+
+    with track_llm_call("openai", "chat") as call:
+        response = await ...
+        call.tokens(input_tokens, output_tokens)
+    """
+
+    def __init__(self, provider: str, operation: str):
+        self.provider = provider
+        self.operation = operation
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        metrics.observe("llm_request_duration_seconds", elapsed, provider=self.provider, operation=self.operation)
+        # 取消（CancelledError）不计为失败
+        if exc_type is not None and issubclass(exc_type, Exception):
+            metrics.inc("llm_request_errors_total", provider=self.provider, operation=self.operation)
+        return False
+
+    def tokens(self, input_tokens: Optional[int], output_tokens: Optional[int]):
+        if input_tokens:
+            metrics.inc("llm_tokens_total", input_tokens, provider=self.provider, operation=self.operation, kind="input")
+        if output_tokens:
+            metrics.inc("llm_tokens_total", output_tokens, provider=self.provider, operation=self.operation, kind="output")
+
+    def usage_metadata(self, usage: Optional[dict]):
+        # langchain 的 AIMessage.usage_metadata
+        if usage:
+            self.tokens(usage.get("input_tokens"), usage.get("output_tokens"))
+
+def track_llm_call(provider: str, operation: str) -> LLMCallTracker:
+    return LLMCallTracker(provider, operation)
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+import asyncio
+from passlib.context import CryptContext
+from app.core.config import settings
+from app.core.exceptions import AppException
+
+T = TypeVar("T")
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class PasswordHasher:
+    """在独立的有界线程池中执行 bcrypt，避免阻塞事件循环。
+
+    bcrypt 计算期间会释放 GIL，线程池即可并行执行。排队的请求超过上限时直接返回 503，
+    登录风暴不会无限堆积，也不会拖慢其他接口。
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self.max_in_flight = max_workers + max_queue
+        # 只在事件循环线程中修改，无需加锁
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            raise AppException(status_code=503, detail="登录请求过多，请稍后重试")
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(pwd_context.verify, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,196 @@
+from typing import Collection, Dict, Iterable, List, Optional, Sequence
+import random
+
+class IndexedSet:
+    """支持 O(1) 添加、删除和均匀随机抽取的集合（数组 + 位置表，删除时与末尾元素交换）。"""
+
+    __slots__ = ("items", "positions")
+
+    def __init__(self):
+        self.items: List[str] = []
+        self.positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.positions
+
+    def add(self, item: str):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item: str):
+        position = self.positions.pop(item, None)
+        if position is None:
+            return
+        last = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.positions[last] = position
+
+    def choice(self, rng: random.Random) -> str:
+        return self.items[rng.randrange(len(self.items))]
+
+class _Puzzle:
+    __slots__ = ("difficulty", "tags", "usage_count")
+
+    def __init__(self, difficulty: Optional[int], tags: Sequence[str], usage_count: int):
+        self.difficulty = difficulty
+        self.tags = frozenset(tags or ())
+        self.usage_count = usage_count or 0
+
+class PuzzleSampler:
+    """海龟汤的内存索引，按标签过滤、排除已玩过的题目，并支持加权随机抽取。
+
+    加权抽取使用拒绝采样：先从候选集合中均匀抽一个，再以 weight(题目) ∈ (0, 1] 的概率接受，
+    期望尝试次数为 1 / 平均权重，与题库大小无关。尝试次数用尽（例如大部分题目都被排除）时，
+    退化为对候选集合做一次完整的加权抽取，结果分布不变。
+    """
+
+    def __init__(self, max_attempts: int = 64, seed: Optional[int] = None):
+        self.max_attempts = max_attempts
+        self.rng = random.Random(seed)
+        self.puzzles: Dict[str, _Puzzle] = {}
+        self.all = IndexedSet()
+        self.by_tag: Dict[str, IndexedSet] = {}
+        # 当前最小的使用次数，用于把“少用优先”的权重归一化到 (0, 1]。
+        # 必须是准确的最小值而不只是下界：下界偏低时所有权重都变小，拒绝采样频繁退化为 O(n) 的完整抽取。
+        # 用“使用次数 → 题目数”的直方图维护，最小值所在的桶清空时才重新取最小值
+        self.min_usage = 0
+        self.usage_histogram: Dict[int, int] = {}
+        self.loaded = False
+        self.samples = 0
+        self.attempts = 0
+        self.fallbacks = 0
+
+    def load(self, rows: Iterable[tuple]):
+        # rows: (id, difficulty, tags, usage_count)
+        self.puzzles.clear()
+        self.all = IndexedSet()
+        self.by_tag.clear()
+        self.usage_histogram.clear()
+        self.min_usage = 0
+        for puzzle_id, difficulty, tags, usage_count in rows:
+            self.upsert(puzzle_id, difficulty, tags, usage_count)
+        self.loaded = True
+
+    def upsert(self, puzzle_id: str, difficulty: Optional[int], tags: Sequence[str], usage_count: int = 0):
+        old = self.puzzles.get(puzzle_id)
+        if old is not None:
+            # 数据库中的 usage_count 不含 usage_counter 尚未写入的增量，编辑题目时不能用它覆盖内存中的计数
+            usage_count = max(old.usage_count, usage_count or 0)
+        puzzle = _Puzzle(difficulty, tags, usage_count)
+        if old is not None:
+            for tag in old.tags - puzzle.tags:
+                self._untag(puzzle_id, tag)
+            self._count_usage(old.usage_count, -1)
+        self._count_usage(puzzle.usage_count, 1)
+        self.puzzles[puzzle_id] = puzzle
+        self.all.add(puzzle_id)
+        for tag in puzzle.tags:
+            self.by_tag.setdefault(tag, IndexedSet()).add(puzzle_id)
+        self._refresh_min_usage()
+
+    def remove(self, puzzle_id: str):
+        puzzle = self.puzzles.pop(puzzle_id, None)
+        if puzzle is None:
+            return
+        self.all.discard(puzzle_id)
+        for tag in puzzle.tags:
+            self._untag(puzzle_id, tag)
+        self._count_usage(puzzle.usage_count, -1)
+        self._refresh_min_usage()
+
+    def _untag(self, puzzle_id: str, tag: str):
+        members = self.by_tag.get(tag)
+        if members is not None:
+            members.discard(puzzle_id)
+            if not members:
+                del self.by_tag[tag]
+
+    def record_usage(self, puzzle_id: str, count: int = 1):
+        puzzle = self.puzzles.get(puzzle_id)
+        if puzzle is not None:
+            self._count_usage(puzzle.usage_count, -1)
+            puzzle.usage_count += count
+            self._count_usage(puzzle.usage_count, 1)
+            self._refresh_min_usage()
+
+    def _count_usage(self, usage_count: int, delta: int):
+        remaining = self.usage_histogram.get(usage_count, 0) + delta
+        if remaining > 0:
+            self.usage_histogram[usage_count] = remaining
+        else:
+            self.usage_histogram.pop(usage_count, None)
+        if delta > 0 and usage_count < self.min_usage:
+            self.min_usage = usage_count
+
+    def _refresh_min_usage(self):
+        # 最小值的桶仍有题目时不变（O(1)）；清空后在直方图的不同取值中重新取最小值，取值个数远小于题目数
+        if self.min_usage not in self.usage_histogram:
+            self.min_usage = min(self.usage_histogram, default=0)
+
+    def weight(self, puzzle: _Puzzle, target_difficulty: Optional[int], favor_unused: bool) -> float:
+        weight = 1.0
+        if favor_unused:
+            # 权重与 1 / (1 + 使用次数) 成正比
+            weight *= (1 + self.min_usage) / (1 + max(puzzle.usage_count, self.min_usage))
+        if target_difficulty is not None and puzzle.difficulty is not None:
+            weight *= 1 / (1 + abs(puzzle.difficulty - target_difficulty))
+        return weight
+
+    def sample(self, tags: Optional[Sequence[str]] = None, exclude: Collection[str] = (),
+               target_difficulty: Optional[int] = None, favor_unused: bool = False) -> Optional[str]:
+        self.samples += 1
+        required = frozenset(tags or ())
+        if required:
+            pools = [self.by_tag.get(tag) for tag in required]
+            if any(pool is None for pool in pools):
+                return None
+            # 从最小的标签集合中抽取，再检查是否同时具有其余标签
+            pool = min(pools, key=len)
+        else:
+            pool = self.all
+        if not pool:
+            return None
+
+        weighted = favor_unused or target_difficulty is not None
+        for _ in range(self.max_attempts):
+            self.attempts += 1
+            puzzle_id = pool.choice(self.rng)
+            if puzzle_id in exclude:
+                continue
+            puzzle = self.puzzles[puzzle_id]
+            if not required <= puzzle.tags:
+                continue
+            if weighted and self.rng.random() >= self.weight(puzzle, target_difficulty, favor_unused):
+                continue
+            return puzzle_id
+
+        self.fallbacks += 1
+        return self._sample_exhaustive(pool, required, exclude, target_difficulty, favor_unused)
+
+    def _sample_exhaustive(self, pool: IndexedSet, required: frozenset, exclude: Collection[str],
+                           target_difficulty: Optional[int], favor_unused: bool) -> Optional[str]:
+        candidates = [
+            puzzle_id for puzzle_id in pool.items
+            if puzzle_id not in exclude and required <= self.puzzles[puzzle_id].tags
+        ]
+        if not candidates:
+            return None
+        weights = [self.weight(self.puzzles[puzzle_id], target_difficulty, favor_unused) for puzzle_id in candidates]
+        return self.rng.choices(candidates, weights=weights)[0]
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "puzzles": len(self.puzzles),
+            "tags": len(self.by_tag),
+            "samples": self.samples,
+            "attempts_per_sample": self.attempts / self.samples if self.samples else 0.0,
+            "fallbacks": self.fallbacks,
+        }
+
+puzzle_sampler = PuzzleSampler()
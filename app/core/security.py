@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from typing import Optional
+import jwt
+from fastapi import Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from app.core.config import settings
+from app.core.exceptions import AppException
+from app.models.user import TokenUser
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+MIN_SECRET_KEY_BYTES = 32
+# 曾经的默认值，已公开，不能用于签名
+KNOWN_WEAK_KEYS = {"default_secret_key"}
+
+def secret_key_problem() -> Optional[str]:
+    key = settings.SECRET_KEY
+    if not key:
+        return "未配置 SECRET_KEY"
+    if key in KNOWN_WEAK_KEYS:
+        return "SECRET_KEY 仍是公开的默认值"
+    if len(key.encode()) < MIN_SECRET_KEY_BYTES:
+        return f"SECRET_KEY 少于 {MIN_SECRET_KEY_BYTES} 字节"
+    return None
+
+def check_secret_key():
+    # 启动时调用：密钥可被猜到时任何人都能为任意用户伪造令牌，直接拒绝启动
+    problem = secret_key_problem()
+    if problem:
+        raise RuntimeError(f"{problem}，请设置环境变量 SECRET_KEY（例如 python -c \"import secrets; print(secrets.token_urlsafe(48))\"）")
+
+def signing_key() -> str:
+    # 未经启动检查的入口（脚本等）也不会用弱密钥签发或验证令牌
+    problem = secret_key_problem()
+    if problem:
+        raise AppException(status_code=500, detail=f"服务未正确配置: {problem}")
+    return settings.SECRET_KEY
+
+def create_access_token(user_id: str, username: str, expires_delta: Optional[timedelta] = None) -> str:
+    expires_delta = expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    now = datetime.utcnow()
+    payload = {
+        "sub": user_id,
+        "username": username,
+        "iat": now,
+        "exp": now + expires_delta,
+    }
+    return jwt.encode(payload, signing_key(), algorithm=settings.ALGORITHM)
+
+def decode_access_token(token: str) -> TokenUser:
+    try:
+        payload = jwt.decode(token, signing_key(), algorithms=[settings.ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise AppException(status_code=401, detail="登录已过期，请重新登录")
+    except jwt.InvalidTokenError:
+        raise AppException(status_code=401, detail="无效的访问令牌")
+    return TokenUser(id=payload["sub"], username=payload.get("username", ""))
+
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> TokenUser:
+    # 只校验签名和过期时间，不查询数据库也不做 bcrypt 校验
+    if credentials is None:
+        raise AppException(status_code=401, detail="未提供访问令牌")
+    return decode_access_token(credentials.credentials)
+
+async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> Optional[TokenUser]:
+    if credentials is None:
+        return None
+    return decode_access_token(credentials.credentials)
@@ -0,0 +1,29 @@
+from typing import Coroutine, Set
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 保存后台任务的引用，避免任务在完成前被垃圾回收
+_background_tasks: Set[asyncio.Task] = set()
+
+def spawn(coro: Coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_task_done)
+    return task
+
+def _on_task_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"后台任务执行失败: {task.exception()!r}")
+
+async def drain(timeout: float = 10.0):
+    # 关闭时等待仍在运行的后台任务，超时后取消
+    if not _background_tasks:
+        return
+    done, pending = await asyncio.wait(set(_background_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"关闭时取消了 {len(pending)} 个未完成的后台任务")
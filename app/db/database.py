@@ -1,14 +1,69 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.models.orm import MessageModel, ChatHaiguiTangHistory
+from app.core.metrics import instrument_engine
+import time
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+class PoolWaitStats:
+    # 只在事件循环线程中更新，无需加锁
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+pool_wait_stats = PoolWaitStats()
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """记录因连接池耗尽而排队等待连接的次数和时间。"""
+
+    def _do_get(self):
+        # 只有没有空闲连接且连接数已达 pool_size + max_overflow 时，QueuePool 才会阻塞在队列上等待其他请求归还连接；
+        # 取空闲连接和新建连接（含 TCP/认证握手）不算排队，不计入等待时间
+        if not self._pool.empty() or self._max_overflow < 0 or self._overflow < self._max_overflow:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_stats.record(time.perf_counter() - start)
+
+def create_engine_from_settings() -> AsyncEngine:
+    connect_args = {}
+    if settings.DATABASE_URL.startswith("postgresql+asyncpg"):
+        # 使用 pgbouncer 等事务级连接池时需将其设为 0
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+    return create_async_engine(
+        settings.DATABASE_URL,
+        echo=settings.DB_ECHO,
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        connect_args=connect_args,
+    )
+
+# 整个进程只使用这一个引擎和连接池
+engine = create_engine_from_settings()
+instrument_engine(engine.sync_engine)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 async def init_db():
     async with engine.begin() as conn:
         # 这里可以添加初始化数据库的逻辑
-        pass
+        # 确保消息分页所需的 (chat_id, id) 复合索引和海龟汤历史的 chat_id 索引存在
+        for table in (MessageModel.__table__, ChatHaiguiTangHistory.__table__):
+            for index in table.indexes:
+                await conn.run_sync(lambda sync_conn: index.create(sync_conn, checkfirst=True))
 
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -19,5 +74,22 @@ async def drop_all_tables():
         # 这里可以添加删除所有表的逻辑
         pass
 
+async def dispose_engine():
+    await engine.dispose()
+
+def get_pool_stats() -> dict:
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # QueuePool 在连接未建满时 overflow 为负数
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "wait_count": pool_wait_stats.count,
+        "wait_total_seconds": pool_wait_stats.total,
+        "wait_max_seconds": pool_wait_stats.max,
+    }
+
 # 确保这些函数被导出
-__all__ = ["init_db", "get_db", "drop_all_tables"]
\ No newline at end of file
+__all__ = ["engine", "AsyncSessionLocal", "init_db", "get_db", "drop_all_tables", "dispose_engine", "get_pool_stats"]
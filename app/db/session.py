@@ -1,10 +1,2 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from app.core.config import settings
-
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+# 引擎与会话统一在 app.db.database 中创建，这里仅为兼容旧的导入路径
+from app.db.database import engine, AsyncSessionLocal, get_db
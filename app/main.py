@@ -1,11 +1,31 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.api import bot_routes, chat_routes, user_routes, haiguitang_routes, prompt_routes
-from app.db.database import init_db, drop_all_tables
+from app.db.database import init_db, drop_all_tables, dispose_engine, get_pool_stats
 from app.core.exceptions import AppException, app_exception_handler
-import logging
+from app.services.llm.registry import init_llm_registry, close_llm_registry
+from app.repositories.message_writer import message_writer
+from app.core import tasks
+from app.core.password_hasher import password_hasher
+from app.core.metrics import metrics, MetricsMiddleware
+from app.core.message_cache import message_window_cache
+from app.services.llm.answer_cache import judge_answer_cache
+from app.core.logger import configure_logging, stop_logging
+from app.core.puzzle_sampler import puzzle_sampler
+from app.repositories.haiguitang_repository import load_puzzle_sampler
+from app.repositories.haiguitang_cache import haiguitang_cache
+from app.repositories.usage_counter import usage_counter
+from app.core.chat_hub import chat_hub
+from app.core.config import settings
+from app.core.security import check_secret_key
 
-logging.basicConfig(level=logging.DEBUG)
+configure_logging(
+    level=settings.LOG_LEVEL,
+    log_file=settings.LOG_FILE,
+    json_format=settings.LOG_JSON,
+    sample_rates=settings.LOG_SAMPLE_RATES,
+)
 
 app = FastAPI()
 
@@ -18,20 +38,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 记录每个路由的耗时和 SQL 统计
+app.add_middleware(MetricsMiddleware)
+
 # 添加异常处理器
 app.add_exception_handler(AppException, app_exception_handler)
 
 @app.on_event("startup")
 async def startup_event():
+    check_secret_key()
     await init_db()
+    await load_puzzle_sampler()
+    await init_llm_registry()
+    await message_writer.start()
+    await usage_counter.start()
     # await drop_all_tables()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    try:
+        await chat_hub.close_all()
+        # 等待后台任务（如故事完成度检查）结束，再把后写缓冲中的消息全部落库
+        await tasks.drain()
+        await message_writer.stop()
+        await usage_counter.stop()
+        await close_llm_registry()
+        password_hasher.shutdown()
+        await dispose_engine()
+    finally:
+        # 最后停止日志线程：前面各步骤（包括失败时）的日志都要写出
+        stop_logging()
+
 app.include_router(user_routes.router, prefix="/api/users", tags=["users"])
 app.include_router(bot_routes.router, prefix="/api/bots", tags=["bots"])
 app.include_router(chat_routes.router, prefix="/api/chats", tags=["chats"])
 app.include_router(haiguitang_routes.router, prefix="/api", tags=["haiguitang"])
 app.include_router(prompt_routes.router, prefix="/api/prompt", tags=["prompt"])
 
+metrics.add_collector("db_pool", get_pool_stats)
+metrics.add_collector("message_cache", message_window_cache.stats)
+metrics.add_collector("answer_cache", judge_answer_cache.stats)
+metrics.add_collector("message_writer", message_writer.stats)
+metrics.add_collector("password_hasher", password_hasher.stats)
+metrics.add_collector("puzzle_sampler", puzzle_sampler.stats)
+metrics.add_collector("haiguitang_cache", haiguitang_cache.stats)
+metrics.add_collector("usage_counter", usage_counter.stats)
+metrics.add_collector("chat_hub", chat_hub.stats)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return metrics.render()
+
+@app.get("/api/db/pool")
+async def db_pool_stats():
+    return get_pool_stats()
+
 @app.get("/api/chats/test")
 async def test_chat_route():
     return {"message": "Chat route is working"}
@@ -26,4 +26,21 @@ class HaiguiTangUpdate(BaseModel):
     tang_mian: Optional[str] = None
     tang_di: Optional[str] = None
     tags: Optional[List[str]] = None
-    difficulty: Optional[int] = None
\ No newline at end of file
+    difficulty: Optional[int] = None
+
+class HaiguiTangImportError(BaseModel):
+    line: int
+    error: str
+
+class HaiguiTangImportResult(BaseModel):
+    inserted: int = 0
+    failed: int = 0
+    # 只保留前若干条错误详情，failed 为全部失败行数
+    errors: List[HaiguiTangImportError] = []
+
+class HaiguiTangStart(BaseModel):
+    # 不指定 haiguitang_id 时随机抽取一道该聊天没玩过的海龟汤
+    haiguitang_id: Optional[str] = None
+    tags: List[str] = []
+    difficulty: Optional[int] = None
+    favor_unused: bool = False
@@ -1,8 +1,9 @@
-from sqlalchemy import Table, Column, String, DateTime, Boolean, ForeignKey, Enum as SQLAlchemyEnum, Integer, ARRAY
+from sqlalchemy import Table, Column, String, DateTime, Boolean, ForeignKey, Enum as SQLAlchemyEnum, Integer, ARRAY, Index, JSON
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 from app.models.enums import SenderType, MessageRole, ChatType
 from ulid import ULID
+from app.utils.id_generator import generate_ulid
 from sqlalchemy.sql import func
 
 Base = declarative_base()
@@ -60,7 +61,7 @@ class ChatModel(Base):
 
 class MessageModel(Base):
     __tablename__ = "messages"
-    id = Column(String(26), primary_key=True, default=lambda: str(ULID()), index=True)
+    id = Column(String(26), primary_key=True, default=generate_ulid, index=True)
     chat_id = Column(String(26), ForeignKey("chats.id"))
     sender_id = Column(String(26))
     sender_type = Column(SQLAlchemyEnum(SenderType))
@@ -70,6 +71,11 @@ class MessageModel(Base):
 
     chat = relationship("ChatModel", back_populates="messages")
 
+    __table_args__ = (
+        # 按 ULID 做游标分页：WHERE chat_id = ? AND id < ? ORDER BY id DESC
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+    )
+
 class HaiguiTangModel(Base):
     __tablename__ = "haiguitang"
 
@@ -77,7 +83,7 @@ class HaiguiTangModel(Base):
     title = Column(String, nullable=False)  # 标题
     tang_mian = Column(String, nullable=True)  # 汤面
     tang_di = Column(String, nullable=True)  # 汤底
-    tags = Column(ARRAY(String))  # 标签
+    tags = Column(ARRAY(String).with_variant(JSON(), "sqlite"))  # 标签（SQLite 上以 JSON 存储，供测试使用）
     usage_count = Column(Integer, default=0)  # 使用次数
     difficulty = Column(Integer)  # 难度等级
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -86,7 +92,8 @@ class HaiguiTangModel(Base):
 class ChatHaiguiTangHistory(Base):
     __tablename__ = "chat_haiguitang_history"
     id = Column(String(26), primary_key=True, default=lambda: str(ULID()), index=True)
-    chat_id = Column(String(26), ForeignKey("chats.id"), nullable=False)
+    # 开始/结束海龟汤和排除已玩过的题目都按 chat_id 查询
+    chat_id = Column(String(26), ForeignKey("chats.id"), nullable=False, index=True)
     haiguitang_id = Column(String(26), ForeignKey("haiguitang.id"), nullable=False)
     start_time = Column(DateTime, default=datetime.utcnow)
     end_time = Column(DateTime, nullable=True)
@@ -20,4 +20,13 @@ class UserInDB(User):
 
 class UserLogin(BaseModel):
     username: str
-    password: str
\ No newline at end of file
+    password: str
+class UserWithToken(User):
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+class TokenUser(BaseModel):
+    # 从访问令牌中解析出的用户身份，不查询数据库
+    id: str
+    username: str
@@ -1,17 +1,43 @@
 from app.models.enums import MessageRole, SenderType
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
-from sqlalchemy import select, and_
-from sqlalchemy.orm import selectinload, joinedload, sessionmaker
-from app.models.orm import ChatModel, UserModel, BotModel, MessageModel, HaiguiTangModel
+from sqlalchemy import select, and_, func, update
+from sqlalchemy.orm import selectinload, joinedload, sessionmaker, aliased
+from app.models.orm import ChatModel, UserModel, BotModel, MessageModel, HaiguiTangModel, ChatHaiguiTangHistory, chat_users, chat_bots
 from app.models.schemas import ChatResponse, Chat, Message, MessageCreate, ChatCreate, User, Bot, HaiguiTang
-from typing import Optional, List
+from typing import Awaitable, Callable, Optional, List, Dict
+from operator import itemgetter
 from app.services.bot_service import BotService
+from app.core.config import settings
+from app.core.message_cache import message_window_cache
+from app.repositories.message_writer import message_writer
+from app.repositories.haiguitang_cache import haiguitang_cache
+from app.repositories.usage_counter import usage_counter
+from app.core.puzzle_sampler import puzzle_sampler
+from app.core.chat_hub import chat_hub
+from app.utils.id_generator import generate_ulid
+from datetime import datetime
+from ulid import ULID
 import logging
 import asyncio
 from sqlalchemy.orm import joinedload
 
 logger = logging.getLogger(__name__)
 
+# 快速序列化路径直接查询的列，列名与对应 schema 的字段名一致
+MESSAGE_FIELDS = ("role", "content", "id", "chat_id", "sender_id", "sender_type", "created_at")
+CHAT_COLUMNS = (ChatModel.id, ChatModel.title, ChatModel.chat_type, ChatModel.creator_id, ChatModel.is_active,
+                ChatModel.created_at, ChatModel.updated_at, ChatModel.current_haiguitang_id)
+USER_COLUMNS = (UserModel.id, UserModel.username, UserModel.email, UserModel.created_at, UserModel.updated_at)
+BOT_COLUMNS = (BotModel.name, BotModel.description, BotModel.id, BotModel.creator_id, BotModel.is_active,
+               BotModel.created_at, BotModel.updated_at)
+
+def message_columns(entity=MessageModel) -> list:
+    return [getattr(entity, name) for name in MESSAGE_FIELDS]
+
+def message_row(row) -> dict:
+    # messages 表没有 group_chat_id 列，与 Message 的默认值保持一致
+    return {**row._mapping, "group_chat_id": None}
+
 class ChatRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -20,11 +46,8 @@ class ChatRepository:
         async with self.db as session:
             # 重新加载 db_chat 对象，包括所有需要的关系
             db_chat = await session.merge(db_chat)
-            await session.refresh(db_chat, ['users', 'bots', 'current_haiguitang'])
+            await session.refresh(db_chat, ['users', 'bots'])
 
-            users = [await self.user_to_schema(user) for user in db_chat.users]
-            bots = [Bot.model_validate(bot) for bot in db_chat.bots]
-            
             last_message = None
             messages = None
             if include_messages:
@@ -32,30 +55,56 @@ class ChatRepository:
                 if messages:
                     last_message = messages[-1]
             else:
-                last_message = await self.get_last_message(db_chat.id)
-            
-            current_haiguitang = None
-            if db_chat.current_haiguitang:
-                current_haiguitang = HaiguiTang.model_validate(db_chat.current_haiguitang)
-            
-            return ChatResponse(
-                id=db_chat.id,
-                title=db_chat.title,
-                chat_type=db_chat.chat_type,
-                creator_id=db_chat.creator_id,
-                is_active=db_chat.is_active,
-                created_at=db_chat.created_at,
-                updated_at=db_chat.updated_at,
-                users=users,
-                bots=bots,
-                messages=messages,
-                last_message=last_message,
-                current_haiguitang_id=db_chat.current_haiguitang_id,
-                current_haiguitang=current_haiguitang,
-                haiguitang_history=[]  # 不查询海龟汤历史记录
-            )
+                db_last_message = await self.get_last_message(db_chat.id)
+                if db_last_message:
+                    last_message = Message.model_validate(db_last_message)
+
+            haiguitangs = await self.get_haiguitangs([db_chat])
+            return self.build_chat_response(db_chat, messages=messages, last_message=last_message, haiguitangs=haiguitangs)
 
-    async def user_to_schema(self, user: UserModel) -> User:
+    async def chats_to_schemas(self, db_chats: List[ChatModel]) -> List[ChatResponse]:
+        # 批量构建：关系需已通过 selectinload 预加载，最后一条消息一次查询取回
+        # 整个列表的查询次数固定，不随聊天数量增长
+        last_messages = await self.get_last_messages([db_chat.id for db_chat in db_chats])
+        haiguitangs = await self.get_haiguitangs(db_chats)
+        return [
+            self.build_chat_response(db_chat, last_message=last_messages.get(db_chat.id), haiguitangs=haiguitangs)
+            for db_chat in db_chats
+        ]
+
+    async def get_haiguitangs(self, db_chats: List[ChatModel]) -> Dict[str, HaiguiTang]:
+        # 海龟汤几乎不变，从进程内缓存读取，不再随聊天一起 JOIN/selectinload
+        haiguitang_ids = [db_chat.current_haiguitang_id for db_chat in db_chats if db_chat.current_haiguitang_id]
+        if not haiguitang_ids:
+            return {}
+        return await haiguitang_cache.get_many(self.db, haiguitang_ids)
+
+    def build_chat_response(self, db_chat: ChatModel, messages: Optional[List[Message]] = None,
+                            last_message: Optional[Message] = None,
+                            haiguitangs: Optional[Dict[str, HaiguiTang]] = None) -> ChatResponse:
+        users = [self.user_to_schema(user) for user in db_chat.users]
+        bots = [Bot.model_validate(bot) for bot in db_chat.bots]
+
+        current_haiguitang = (haiguitangs or {}).get(db_chat.current_haiguitang_id)
+
+        return ChatResponse(
+            id=db_chat.id,
+            title=db_chat.title,
+            chat_type=db_chat.chat_type,
+            creator_id=db_chat.creator_id,
+            is_active=db_chat.is_active,
+            created_at=db_chat.created_at,
+            updated_at=db_chat.updated_at,
+            users=users,
+            bots=bots,
+            messages=messages,
+            last_message=last_message,
+            current_haiguitang_id=db_chat.current_haiguitang_id,
+            current_haiguitang=current_haiguitang,
+            haiguitang_history=[]  # 不查询海龟汤历史记录
+        )
+
+    def user_to_schema(self, user: UserModel) -> User:
         return User(
             id=str(user.id),
             username=user.username,
@@ -68,8 +117,7 @@ class ChatRepository:
         async with self.db as session:
             query = select(ChatModel).options(
                 selectinload(ChatModel.users),
-                selectinload(ChatModel.bots),
-                selectinload(ChatModel.current_haiguitang)
+                selectinload(ChatModel.bots)
             )
             if include_messages:
                 query = query.options(selectinload(ChatModel.messages))
@@ -78,26 +126,95 @@ class ChatRepository:
             result = await session.execute(query)
             db_chat = result.scalar_one_or_none()
             
-            if db_chat:
-                return await self.chat_to_schema(db_chat, include_messages)
-            return None
+            if not db_chat:
+                return None
+            # 关系已预加载，无需再 merge/refresh
+            if include_messages:
+                messages = [Message.model_validate(msg) for msg in db_chat.messages]
+                haiguitangs = await self.get_haiguitangs([db_chat])
+                return self.build_chat_response(db_chat, messages=messages, last_message=messages[-1] if messages else None,
+                                                haiguitangs=haiguitangs)
+            return (await self.chats_to_schemas([db_chat]))[0]
 
     async def add_message(self, chat_id: str, message: MessageCreate) -> Message:
+        # ID 和时间戳在进程内生成，写入后无需再 refresh；ID 单调递增，按 ID 排序即为写入顺序
+        saved_message = Message(
+            **message.dict(),
+            id=generate_ulid(),
+            chat_id=chat_id,
+            created_at=datetime.utcnow(),
+        )
+        if message_writer.enabled:
+            await message_writer.enqueue(saved_message)
+        else:
+            async with self.db as session:
+                async with session.begin():
+                    session.add(MessageModel(**saved_message.model_dump(exclude={"group_chat_id"})))
+        if settings.MESSAGE_CACHE_ENABLED:
+            message_window_cache.append(chat_id, saved_message)
+        # 推送给该聊天所有在线的 WebSocket 连接
+        chat_hub.publish(chat_id, "message", saved_message)
+        return saved_message
+
+    async def get_chat_version(self, chat_id: str) -> Optional[str]:
+        # 条件请求（ETag）用的版本号：chats.updated_at + 最新消息 ID + 当前海龟汤的 updated_at
+        # 只查一行，最新消息 ID 走 (chat_id, id) 索引，不加载任何关系；聊天不存在时返回 None
+        latest_message_id = select(func.max(MessageModel.id)).where(MessageModel.chat_id == chat_id).scalar_subquery()
+        query = (
+            select(ChatModel.updated_at, HaiguiTangModel.updated_at, latest_message_id)
+            .outerjoin(HaiguiTangModel, HaiguiTangModel.id == ChatModel.current_haiguitang_id)
+            .where(ChatModel.id == chat_id)
+        )
         async with self.db as session:
-            async with session.begin():
-                message_data = message.dict()
-                db_message = MessageModel(**message_data, chat_id=chat_id)
-                session.add(db_message)
-            await session.refresh(db_message)
-            return Message.from_orm(db_message)
+            row = (await session.execute(query)).first()
+        if row is None:
+            return None
+        chat_updated_at, haiguitang_updated_at, latest_message_id = row
+        # 后写模式下尚未落库的消息也算
+        pending_ids = [msg.id for msg in message_writer.pending_messages(chat_id)] if message_writer.enabled else []
+        latest_message_id = max([latest_message_id or "", *pending_ids])
+        return "|".join([
+            latest_message_id,
+            chat_updated_at.isoformat() if chat_updated_at else "",
+            haiguitang_updated_at.isoformat() if haiguitang_updated_at else "",
+        ])
 
-    async def get_chat_messages_history(self, chat_id: str, limit: int = 50) -> List[Message]:
-        async with self.db as session:  # 使用 self.db 而不是 self.db.begin()
+    async def is_chat_member(self, chat_id: str, user_id: str) -> bool:
+        async with self.db as session:
             result = await session.execute(
-                select(MessageModel).where(MessageModel.chat_id == chat_id).order_by(MessageModel.created_at.desc()).limit(limit)
+                select(chat_users.c.user_id).where(chat_users.c.chat_id == chat_id, chat_users.c.user_id == user_id)
             )
-            messages = result.scalars().all()
-            return [Message.from_orm(msg) for msg in reversed(messages)]
+            return result.first() is not None
+
+    async def get_chat_messages_history(self, chat_id: str, limit: int = 50, before: Optional[str] = None,
+                                        after: Optional[str] = None) -> List[Message]:
+        # 基于 ULID 的游标分页，返回结果按时间正序排列
+        # before: 取早于该消息的最近 limit 条；after: 取晚于该消息的最早 limit 条；都不传时取最新的 limit 条
+        use_cache = settings.MESSAGE_CACHE_ENABLED and not before and not after
+        if use_cache:
+            cached = message_window_cache.get(chat_id, limit)
+            if cached is not None:
+                return cached
+            read_seq = message_window_cache.begin_read()
+
+        async with self.db as session:  # 使用 self.db 而不是 self.db.begin()
+            query = select(MessageModel).where(MessageModel.chat_id == chat_id)
+            if after:
+                query = query.where(MessageModel.id > after).order_by(MessageModel.id.asc()).limit(limit)
+                result = await session.execute(query)
+                messages = [Message.from_orm(msg) for msg in result.scalars().all()]
+                return self.merge_pending(chat_id, messages, limit, before=before, after=after)
+
+            if before:
+                query = query.where(MessageModel.id < before)
+            query = query.order_by(MessageModel.id.desc()).limit(limit)
+            result = await session.execute(query)
+            messages = [Message.from_orm(msg) for msg in reversed(result.scalars().all())]
+            messages = self.merge_pending(chat_id, messages, limit, before=before, after=after)
+
+        if use_cache:
+            message_window_cache.fill(chat_id, messages, limit, read_seq)
+        return messages
 
     async def get_chat_history(self, user_id: str, limit: int = 10) -> List[Chat]:
         async with self.db as session:
@@ -107,7 +224,7 @@ class ChatRepository:
             ).filter(ChatModel.creator_id == user_id).order_by(ChatModel.created_at.desc()).limit(limit)
             result = await session.execute(query)
             db_chats = result.scalars().all()
-            return [await self.chat_to_schema(chat) for chat in db_chats]
+            return await self.chats_to_schemas(db_chats)
 
     async def create_chat(self, chat: ChatCreate) -> ChatModel:
         async with self.db as session:
@@ -133,36 +250,48 @@ class ChatRepository:
                 
                 session.add(db_chat)
             
-            # 在事务结束后刷新 db_chat 对象，包括 current_haiguitang
-            await session.refresh(db_chat, attribute_names=['users', 'bots', 'current_haiguitang'])
+            # 在事务结束后刷新 db_chat 对象，海龟汤由缓存提供
+            await session.refresh(db_chat, attribute_names=['users', 'bots'])
             
-            # 验证关联是否成功
-            print(f"Chat users: {[user.id for user in db_chat.users]}")
-            print(f"Chat bots: {[bot.id for bot in db_chat.bots]}")
+            logger.debug("聊天 %s 已创建，用户: %s，机器人: %s", db_chat.id,
+                         [user.id for user in db_chat.users], [bot.id for bot in db_chat.bots])
             
             return db_chat
 
     async def get_last_message(self, chat_id: str) -> Optional[MessageModel]:
         async with self.db as session:
-            query = select(MessageModel).filter(MessageModel.chat_id == chat_id).order_by(MessageModel.created_at.desc()).limit(1)
+            query = select(MessageModel).filter(MessageModel.chat_id == chat_id).order_by(MessageModel.id.desc()).limit(1)
             result = await session.execute(query)
             return result.scalar_one_or_none()
 
+    async def get_last_messages(self, chat_ids: List[str]) -> Dict[str, Message]:
+        if not chat_ids:
+            return {}
+        async with self.db as session:
+            result = await session.execute(select(MessageModel).where(MessageModel.id.in_(self.last_message_ids(chat_ids))))
+            return {msg.chat_id: Message.model_validate(msg) for msg in result.scalars().all()}
+
+    def last_message_ids(self, chat_ids: List[str]):
+        # 每个聊天各取一次 ORDER BY id DESC LIMIT 1（相关子查询），走 (chat_id, id) 索引倒序只读一项，
+        # 不必像窗口函数那样给这些聊天的全部消息编号；消息 ID 单调递增，最大的 ID 即最后一条
+        latest = aliased(MessageModel)
+        latest_id = (
+            select(latest.id).where(latest.chat_id == ChatModel.id)
+            .order_by(latest.id.desc()).limit(1).scalar_subquery()
+        )
+        return select(latest_id).where(ChatModel.id.in_(chat_ids))
+
     async def add_user_to_chat(self, chat_id: str, user_id: str) -> Chat:
-        print(f"Repository: 尝试将用户 {user_id} 添加到聊天 {chat_id}")
-        
         async with self.db as session:
             async with session.begin():
                 chat_query = select(ChatModel).options(
                     selectinload(ChatModel.users),
-                    selectinload(ChatModel.bots),
-                    selectinload(ChatModel.current_haiguitang)  # 添加这行来预加载 current_haiguitang
+                    selectinload(ChatModel.bots)
                 ).filter(ChatModel.id == chat_id)
                 result = await session.execute(chat_query)
                 db_chat = result.scalar_one_or_none()
                 
                 if not db_chat:
-                    print(f"Repository: 聊天 {chat_id} 不存在")
                     raise ValueError(f"聊天 {chat_id} 不存在")
 
                 user_query = select(UserModel).filter(UserModel.id == user_id)
@@ -170,18 +299,17 @@ class ChatRepository:
                 db_user = result.scalar_one_or_none()
                 
                 if not db_user:
-                    print(f"Repository: 用户 {user_id} 不存在")
                     raise ValueError(f"用户 {user_id} 不存在")
 
-                print(f"Repository: 聊天和用户都存在，尝试添加用户到聊天")
                 if db_user not in db_chat.users:
                     db_chat.users.append(db_user)
-                    print(f"Repository: 用户成功添加到聊天")
+                    # 成员变化只写关联表，手动更新 updated_at 让聊天的 ETag 失效
+                    db_chat.updated_at = datetime.utcnow()
                 else:
-                    print(f"Repository: 用户已经在聊天中")
+                    logger.debug("用户 %s 已经在聊天 %s 中", user_id, chat_id)
 
             # 在事务结束后刷新 db_chat 对象
-            await session.refresh(db_chat, ['users', 'bots', 'current_haiguitang'])
+            await session.refresh(db_chat, ['users', 'bots'])
             
             # 使用刷新后的 db_chat 对象创建 schema
             return await self.chat_to_schema(db_chat)
@@ -206,24 +334,173 @@ class ChatRepository:
 
                 if db_user in db_chat.users:
                     db_chat.users.remove(db_user)
+                    db_chat.updated_at = datetime.utcnow()
 
             await session.refresh(db_chat)
             return await self.chat_to_schema(db_chat)
 
+    async def start_haiguitang(self, chat_id: str, choose_haiguitang: Callable[[AsyncSession], Awaitable[str]]) -> Chat:
+        # 结束当前正在进行的海龟汤（如果有），写入新的历史记录并设为当前海龟汤
+        # 选题（读取已玩过的海龟汤）与写入在同一事务中、锁定聊天之后进行，并发开局不会选到同一道题
+        now = datetime.utcnow()
+        async with self.db as session:
+            async with session.begin():
+                db_chat = await self.lock_chat(session, chat_id)
+                haiguitang_id = await choose_haiguitang(session)
+                await self.close_haiguitang_history(session, chat_id, now)
+                session.add(ChatHaiguiTangHistory(
+                    id=str(ULID()), chat_id=chat_id, haiguitang_id=haiguitang_id, start_time=now
+                ))
+                db_chat.current_haiguitang_id = haiguitang_id
+
+            # 事务提交后再计数；使用次数由 usage_counter 定期批量写入
+            usage_counter.record(haiguitang_id)
+            puzzle_sampler.record_usage(haiguitang_id)
+            return await self.chat_to_schema(db_chat)
+
+    async def end_haiguitang(self, chat_id: str) -> Chat:
+        async with self.db as session:
+            async with session.begin():
+                db_chat = await self.lock_chat(session, chat_id)
+                await self.close_haiguitang_history(session, chat_id, datetime.utcnow())
+                db_chat.current_haiguitang_id = None
+            return await self.chat_to_schema(db_chat)
+
+    async def lock_chat(self, session: AsyncSession, chat_id: str) -> ChatModel:
+        # 行锁保证同一聊天的开始/结束操作依次执行，不会留下两条未结束的记录
+        result = await session.execute(select(ChatModel).where(ChatModel.id == chat_id).with_for_update())
+        db_chat = result.scalar_one_or_none()
+        if not db_chat:
+            raise ValueError(f"聊天 {chat_id} 不存在")
+        return db_chat
+
+    async def close_haiguitang_history(self, session: AsyncSession, chat_id: str, end_time: datetime):
+        await session.execute(
+            update(ChatHaiguiTangHistory)
+            .where(ChatHaiguiTangHistory.chat_id == chat_id, ChatHaiguiTangHistory.end_time.is_(None))
+            .values(end_time=end_time)
+        )
+
     async def get_all_chats(self):
         async with self.db as session:
             result = await session.execute(select(ChatModel).options(
                 selectinload(ChatModel.users),
-                selectinload(ChatModel.bots),
-                selectinload(ChatModel.current_haiguitang)
+                selectinload(ChatModel.bots)
             ))
             db_chats = result.scalars().all()
-            return [await self.chat_to_schema(chat) for chat in db_chats]
+            return await self.chats_to_schemas(db_chats)
 
-    async def get_chat_messages(self, chat_id: str) -> List[Message]:
+    async def get_chat_messages(self, chat_id: str, after: Optional[str] = None, limit: int = 100) -> List[Message]:
+        # 从最早的消息开始向后翻页，不再一次性加载整个聊天记录
         async with self.db as session:  # 使用 self.db 而不是 self.db.begin()
+            query = select(MessageModel).where(MessageModel.chat_id == chat_id)
+            if after:
+                query = query.where(MessageModel.id > after)
+            result = await session.execute(query.order_by(MessageModel.id.asc()).limit(limit))
+            messages = [Message.from_orm(msg) for msg in result.scalars().all()]
+            return self.merge_pending(chat_id, messages, limit, after=after)
+
+    def merge_pending(self, chat_id: str, messages: List[Message], limit: int, before: Optional[str] = None,
+                      after: Optional[str] = None) -> List[Message]:
+        # 后写模式下把尚未落库的消息合并进分页结果
+        if not message_writer.enabled:
+            return messages
+        pending = [
+            msg for msg in message_writer.pending_messages(chat_id)
+            if (not before or msg.id < before) and (not after or msg.id > after)
+        ]
+        if not pending:
+            return messages
+        merged = sorted({msg.id: msg for msg in messages + pending}.values(), key=lambda msg: msg.id)
+        return merged[:limit] if after else merged[-limit:]
+
+    # 以下为快速序列化路径（settings.FAST_SERIALIZATION）：查询只选需要的列，
+    # 结果元组直接组装成与 response_model 字段一致的字典，由路由用 orjson 编码，不创建 ORM 对象和 pydantic 模型
+
+    async def get_message_rows(self, chat_id: str, limit: int = 50, before: Optional[str] = None,
+                               after: Optional[str] = None, oldest_first: bool = False) -> List[dict]:
+        # 参数含义同 get_chat_messages_history；oldest_first 对应 get_chat_messages 从最早的消息开始翻页
+        if settings.MESSAGE_CACHE_ENABLED and not before and not after and not oldest_first:
+            # 最新一页走消息缓存（未命中时由它回源并填充），缓存中已是校验过的模型
+            return [message.model_dump() for message in await self.get_chat_messages_history(chat_id, limit)]
+        query = select(*message_columns()).where(MessageModel.chat_id == chat_id)
+        ascending = bool(after) or oldest_first
+        if after:
+            query = query.where(MessageModel.id > after)
+        if before:
+            query = query.where(MessageModel.id < before)
+        query = query.order_by(MessageModel.id.asc() if ascending else MessageModel.id.desc()).limit(limit)
+        async with self.db as session:
+            rows = [message_row(row) for row in (await session.execute(query)).all()]
+        if not ascending:
+            rows.reverse()
+        return self.merge_pending_rows(chat_id, rows, limit, before=before, after=after)
+
+    def merge_pending_rows(self, chat_id: str, rows: List[dict], limit: int, before: Optional[str] = None,
+                           after: Optional[str] = None) -> List[dict]:
+        # 与 merge_pending 相同，作用于字典
+        if not message_writer.enabled:
+            return rows
+        pending = [
+            msg.model_dump() for msg in message_writer.pending_messages(chat_id)
+            if (not before or msg.id < before) and (not after or msg.id > after)
+        ]
+        if not pending:
+            return rows
+        merged = sorted({row["id"]: row for row in rows + pending}.values(), key=itemgetter("id"))
+        return merged[:limit] if after else merged[-limit:]
+
+    async def get_chat_rows(self, query) -> List[dict]:
+        # query 只选 CHAT_COLUMNS；成员、机器人、最后一条消息各一次批量查询，海龟汤取自缓存
+        async with self.db as session:
+            chats = [dict(row._mapping) for row in (await session.execute(query)).all()]
+            if not chats:
+                return []
+            chat_ids = [chat["id"] for chat in chats]
+            users = await self.group_rows(session, select(chat_users.c.chat_id, *USER_COLUMNS).select_from(chat_users)
+                                          .join(UserModel, UserModel.id == chat_users.c.user_id)
+                                          .where(chat_users.c.chat_id.in_(chat_ids)))
+            bots = await self.group_rows(session, select(chat_bots.c.chat_id, *BOT_COLUMNS).select_from(chat_bots)
+                                         .join(BotModel, BotModel.id == chat_bots.c.bot_id)
+                                         .where(chat_bots.c.chat_id.in_(chat_ids)))
             result = await session.execute(
-                select(MessageModel).where(MessageModel.chat_id == chat_id).order_by(MessageModel.created_at)
+                select(*message_columns()).where(MessageModel.id.in_(self.last_message_ids(chat_ids)))
             )
-            messages = result.scalars().all()
-            return [Message.from_orm(msg) for msg in messages]
\ No newline at end of file
+            last_messages = {row.chat_id: message_row(row) for row in result.all()}
+
+        haiguitang_ids = [chat["current_haiguitang_id"] for chat in chats if chat["current_haiguitang_id"]]
+        haiguitangs = await haiguitang_cache.get_many(self.db, haiguitang_ids) if haiguitang_ids else {}
+        for chat in chats:
+            haiguitang = haiguitangs.get(chat["current_haiguitang_id"])
+            chat.update(
+                users=users.get(chat["id"], []),
+                bots=bots.get(chat["id"], []),
+                messages=None,
+                last_message=last_messages.get(chat["id"]),
+                current_haiguitang=haiguitang.model_dump() if haiguitang else None,
+                haiguitang_history=[],
+            )
+        return chats
+
+    async def group_rows(self, session: AsyncSession, query) -> Dict[str, List[dict]]:
+        grouped: Dict[str, List[dict]] = {}
+        for row in (await session.execute(query)).all():
+            item = row._asdict()
+            grouped.setdefault(item.pop("chat_id"), []).append(item)
+        return grouped
+
+    async def get_chat_row(self, chat_id: str) -> Optional[dict]:
+        chats = await self.get_chat_rows(select(*CHAT_COLUMNS).where(ChatModel.id == chat_id))
+        if not chats:
+            return None
+        chat = chats[0]
+        chat["messages"] = await self.get_message_rows(chat_id)
+        return chat
+
+    async def get_all_chat_rows(self) -> List[dict]:
+        return await self.get_chat_rows(select(*CHAT_COLUMNS))
+
+    async def get_chat_history_rows(self, user_id: str, limit: int = 10) -> List[dict]:
+        return await self.get_chat_rows(
+            select(*CHAT_COLUMNS).where(ChatModel.creator_id == user_id).order_by(ChatModel.created_at.desc()).limit(limit)
+        )
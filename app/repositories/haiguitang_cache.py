@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+import time
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.orm import HaiguiTangModel
+from app.models.schemas import HaiguiTang
+
+class HaiguiTangCatalogCache:
+    """按 ID 缓存已校验的 HaiguiTang，未命中时批量读库（read-through）。
+
+    条目以 updated_at 作为版本：只有版本不低于已缓存条目时才会写入，
+    避免并发读取把刚更新过的海龟汤覆盖回旧版本。其他进程的修改在 ttl 后生效。
+    """
+
+    def __init__(self, max_entries: int, ttl: float, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.entries: "OrderedDict[str, Tuple[HaiguiTang, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_writes = 0
+
+    def get(self, haiguitang_id: str) -> Optional[HaiguiTang]:
+        entry = self.entries.get(haiguitang_id)
+        if entry is None:
+            return None
+        haiguitang, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.entries[haiguitang_id]
+            return None
+        self.entries.move_to_end(haiguitang_id)
+        return haiguitang
+
+    def put(self, haiguitang: HaiguiTang):
+        if not self.enabled:
+            return
+        entry = self.entries.get(haiguitang.id)
+        if entry is not None and entry[0].updated_at > haiguitang.updated_at:
+            self.stale_writes += 1
+            return
+        self.entries[haiguitang.id] = (haiguitang, time.monotonic() + self.ttl)
+        self.entries.move_to_end(haiguitang.id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def put_model(self, db_haiguitang: HaiguiTangModel) -> HaiguiTang:
+        haiguitang = HaiguiTang.model_validate(db_haiguitang)
+        self.put(haiguitang)
+        return haiguitang
+
+    def invalidate(self, haiguitang_id: str):
+        self.entries.pop(haiguitang_id, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    async def get_many(self, session: AsyncSession, haiguitang_ids: Iterable[str]) -> Dict[str, HaiguiTang]:
+        found: Dict[str, HaiguiTang] = {}
+        missing = []
+        for haiguitang_id in set(haiguitang_ids):
+            haiguitang = self.get(haiguitang_id)
+            if haiguitang is None:
+                missing.append(haiguitang_id)
+            else:
+                found[haiguitang_id] = haiguitang
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            # 所有未命中的 ID 一次查询取回
+            result = await session.execute(select(HaiguiTangModel).where(HaiguiTangModel.id.in_(missing)))
+            for db_haiguitang in result.scalars().all():
+                found[db_haiguitang.id] = self.put_model(db_haiguitang)
+        return found
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "stale_writes": self.stale_writes,
+        }
+
+haiguitang_cache = HaiguiTangCatalogCache(
+    max_entries=settings.HAIGUITANG_CACHE_MAX_ENTRIES,
+    ttl=settings.HAIGUITANG_CACHE_TTL,
+    enabled=settings.HAIGUITANG_CACHE_ENABLED,
+)
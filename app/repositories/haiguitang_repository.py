@@ -1,9 +1,56 @@
+from typing import AsyncIterator, List, Optional, Tuple
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from app.models.orm import HaiguiTangModel
-from app.models.haiguitang import HaiguiTangCreate, HaiguiTang, HaiguiTangUpdate
+from app.models.orm import HaiguiTangModel, ChatHaiguiTangHistory
+from app.models.haiguitang import (
+    HaiguiTangCreate, HaiguiTangUpdate, HaiguiTangImportError, HaiguiTangImportResult,
+)
 from ulid import ULID
-from sqlalchemy import select
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.sql import func
+from app.utils.ndjson import LineTooLong
+from app.db.database import AsyncSessionLocal
+from app.core.puzzle_sampler import puzzle_sampler
+from app.repositories.haiguitang_cache import haiguitang_cache
+from app.services.llm.prompt_cache import prompt_cache
+from app.services.llm.answer_cache import judge_answer_cache
+import logging
+import orjson
+
+logger = logging.getLogger(__name__)
+
+async def load_puzzle_sampler() -> int:
+    # 启动时只读取抽题需要的列，之后由 create/update 增量维护
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(
+            HaiguiTangModel.id, HaiguiTangModel.difficulty, HaiguiTangModel.tags, HaiguiTangModel.usage_count
+        ))
+        puzzle_sampler.load(result.all())
+    logger.info(f"已加载 {len(puzzle_sampler.puzzles)} 道海龟汤到抽题索引")
+    return len(puzzle_sampler.puzzles)
+
+def index_haiguitang(db_haiguitang: HaiguiTangModel):
+    puzzle_sampler.upsert(db_haiguitang.id, db_haiguitang.difficulty, db_haiguitang.tags, db_haiguitang.usage_count)
+
+MAX_REPORTED_IMPORT_ERRORS = 1000
+
+# 批量插入后返回抽题索引需要的列
+_INDEX_COLUMNS = (HaiguiTangModel.id, HaiguiTangModel.difficulty, HaiguiTangModel.tags, HaiguiTangModel.usage_count)
+
+async def export_ndjson(batch_size: int) -> AsyncIterator[bytes]:
+    # 服务端游标按批取行，内存占用与题库大小无关；不经过 ORM，避免身份映射表随导出增长
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(
+            select(HaiguiTangModel.__table__).order_by(HaiguiTangModel.id).execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            # 直接编码整行，不经过 HaiguiTang 校验：旧数据中 difficulty、usage_count 可能为 NULL，
+            # 响应头已经发出后校验失败只会让客户端收到被截断的导出
+            yield b"".join(
+                orjson.dumps(dict(row._mapping), option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE)
+                for row in rows
+            )
 
 class HaiguiTangRepository:
     def __init__(self, db: Session):
@@ -21,13 +68,97 @@ class HaiguiTangRepository:
         self.db.add(db_haiguitang)
         await self.db.commit()
         await self.db.refresh(db_haiguitang)
+        # 新建海龟汤时预先编译好提示模板
+        prompt_cache.prime(db_haiguitang)
+        index_haiguitang(db_haiguitang)
+        haiguitang_cache.put_model(db_haiguitang)
         return db_haiguitang
 
-    async def get_random_haiguitang(self):
+    async def import_ndjson(self, lines: AsyncIterator[Tuple[int, bytes]], batch_size: int) -> HaiguiTangImportResult:
+        # 边读边校验，每凑满 batch_size 行在一个独立的事务中插入，单个事务的大小有上限
+        result = HaiguiTangImportResult()
+        batch: List[Tuple[int, dict]] = []
+        try:
+            async for line_number, line in lines:
+                try:
+                    haiguitang = HaiguiTangCreate.model_validate_json(line)
+                except ValidationError as e:
+                    self.report_import_error(result, line_number, str(e))
+                    continue
+                batch.append((line_number, {"id": str(ULID()), **haiguitang.model_dump()}))
+                if len(batch) >= batch_size:
+                    await self.insert_batch(batch, result)
+                    batch = []
+        except LineTooLong as e:
+            # 之后的内容无法可靠地切分，停止读取；已读到的有效行照常写入
+            self.report_import_error(result, -1, str(e))
+        if batch:
+            await self.insert_batch(batch, result)
+        logger.info(f"海龟汤导入完成：成功 {result.inserted} 条，失败 {result.failed} 条")
+        return result
+
+    async def insert_batch(self, batch: List[Tuple[int, dict]], result: HaiguiTangImportResult):
+        statement = insert(HaiguiTangModel).returning(*_INDEX_COLUMNS)
+        try:
+            async with self.db.begin():
+                rows = (await self.db.execute(statement, [row for _, row in batch])).all()
+        except SQLAlchemyError:
+            # 整批失败时逐行重试，找出出错的行，其余行照常写入
+            rows = []
+            for line_number, row in batch:
+                try:
+                    async with self.db.begin():
+                        rows.extend((await self.db.execute(statement, [row])).all())
+                except SQLAlchemyError as e:
+                    self.report_import_error(result, line_number, str(getattr(e, "orig", None) or e))
+        for row in rows:
+            # 新题目尚未被缓存，目录缓存在首次读取时加载
+            puzzle_sampler.upsert(*row)
+        result.inserted += len(rows)
+
+    def report_import_error(self, result: HaiguiTangImportResult, line_number: int, error: str):
+        result.failed += 1
+        if len(result.errors) < MAX_REPORTED_IMPORT_ERRORS:
+            result.errors.append(HaiguiTangImportError(line=line_number, error=error))
+
+    async def get_played_haiguitang_ids(self, chat_id: str) -> List[str]:
         result = await self.db.execute(
-            select(HaiguiTangModel).order_by(func.random()).limit(1)
+            select(ChatHaiguiTangHistory.haiguitang_id).where(ChatHaiguiTangHistory.chat_id == chat_id)
         )
-        return result.scalar_one_or_none()
+        return list(result.scalars().all())
+
+    async def get_random_haiguitang(self, chat_id: Optional[str] = None, tags: Optional[List[str]] = None,
+                                    target_difficulty: Optional[int] = None,
+                                    favor_unused: bool = False) -> Optional[HaiguiTangModel]:
+        # 传入 chat_id 时排除该聊天已经玩过的海龟汤
+        exclude = set(await self.get_played_haiguitang_ids(chat_id)) if chat_id else set()
+
+        if not puzzle_sampler.loaded:
+            # 未经过启动流程（脚本等）时退回数据库排序：不做加权抽取，
+            # 直接取难度最接近 target_difficulty 的题目（favor_unused 时其中使用次数最少的），同等条件下随机
+            query = select(HaiguiTangModel)
+            if exclude:
+                query = query.where(HaiguiTangModel.id.not_in(exclude))
+            if tags:
+                query = query.where(HaiguiTangModel.tags.contains(tags))
+            order_by = []
+            if target_difficulty is not None:
+                order_by.append(func.abs(func.coalesce(HaiguiTangModel.difficulty, target_difficulty) - target_difficulty))
+            if favor_unused:
+                order_by.append(func.coalesce(HaiguiTangModel.usage_count, 0))
+            result = await self.db.execute(query.order_by(*order_by, func.random()).limit(1))
+            return result.scalar_one_or_none()
+
+        while True:
+            haiguitang_id = puzzle_sampler.sample(tags=tags, exclude=exclude, target_difficulty=target_difficulty,
+                                                  favor_unused=favor_unused)
+            if haiguitang_id is None:
+                return None
+            db_haiguitang = await self.get_haiguitang(haiguitang_id)
+            if db_haiguitang is not None:
+                return db_haiguitang
+            # 其他进程已删除该海龟汤，从索引中移除后重抽
+            puzzle_sampler.remove(haiguitang_id)
 
     async def update_haiguitang(self, haiguitang_id: str, haiguitang: HaiguiTangUpdate) -> HaiguiTangModel:
         db_haiguitang = await self.get_haiguitang(haiguitang_id)
@@ -37,6 +168,11 @@ class HaiguiTangRepository:
                 setattr(db_haiguitang, key, value)
             await self.db.commit()
             await self.db.refresh(db_haiguitang)
+            # 汤面/汤底可能已变化，丢弃旧的提示模板和已缓存的回答
+            prompt_cache.invalidate(haiguitang_id)
+            judge_answer_cache.invalidate(haiguitang_id)
+            index_haiguitang(db_haiguitang)
+            haiguitang_cache.put_model(db_haiguitang)
         return db_haiguitang
 
     async def get_haiguitang(self, haiguitang_id: str) -> HaiguiTangModel:
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import asyncio
+import json
+import logging
+from sqlalchemy import insert
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.orm import MessageModel
+from app.models.schemas import Message
+
+logger = logging.getLogger(__name__)
+
+# 持久化模式
+#   sync:     每条消息在 add_message 返回前提交（默认，不会丢消息）
+#   batched:  消息进入队列，凑满 batch_size 或等待 flush_interval 后批量写入；
+#             进程崩溃时最多丢失最近一个刷新周期内已确认的消息
+#   shutdown: 只在凑满 batch_size 或正常关闭时写入；
+#             进程崩溃时会丢失上次整批写入之后的全部消息
+PERSISTENCE_MODES = ("sync", "batched", "shutdown")
+
+class MessageWriteBehind:
+    """消息的后写缓冲：入队即返回，由后台任务批量 INSERT。
+
+    尚未落库的消息保存在 pending 中，读取历史时与数据库结果合并，保证读到自己的写入。
+    """
+
+    def __init__(self, mode: str, batch_size: int, flush_interval: float, max_pending: int,
+                 max_retries: int = 3, dead_letter_file: Optional[str] = None):
+        if mode not in PERSISTENCE_MODES:
+            raise ValueError(f"不支持的消息持久化模式: {mode}")
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.dead_letter_file = dead_letter_file
+        self.queue: Optional[asyncio.Queue] = None
+        self.pending: Dict[str, "OrderedDict[str, Message]"] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "sync" and self.task is not None
+
+    async def start(self):
+        if self.mode == "sync" or self.task is not None:
+            return
+        # 队列有上限，数据库跟不上时 enqueue 会等待，形成背压
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        # 正常关闭：发送结束标记，等待后台任务把队列中剩余的消息全部写入
+        if self.task is None:
+            return
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+
+    async def enqueue(self, message: Message):
+        self.pending.setdefault(message.chat_id, OrderedDict())[message.id] = message
+        await self.queue.put(message)
+
+    def pending_messages(self, chat_id: str) -> List[Message]:
+        return list(self.pending.get(chat_id, {}).values())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                return
+            batch = [message]
+            closing = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                # shutdown 模式不按时间刷新，只等批次凑满
+                timeout = max(0.0, deadline - loop.time()) if self.mode == "batched" else None
+                try:
+                    message = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if message is None:
+                    closing = True
+                    break
+                batch.append(message)
+            await self.flush(batch)
+            if closing:
+                return
+
+    async def flush(self, batch: List[Message]):
+        # 整批重试有上限：一条坏数据（违反约束、内容过长）不能让所有消息的持久化停下来，
+        # 否则有界队列填满后所有写消息的请求都会被阻塞
+        rows = [message.model_dump(exclude={"group_chat_id"}) for message in batch]
+        if not await self.insert_with_retries(rows):
+            # 整批仍失败时逐条写入，定位出失败的行，其余消息照常落库
+            logger.error(f"批量写入 {len(rows)} 条消息失败，改为逐条写入")
+            failed = []
+            for row in rows:
+                try:
+                    await self.insert_rows([row])
+                    self.flushed += 1
+                except Exception as e:
+                    failed.append((row, str(e)))
+            if failed:
+                self.dead_letter(failed)
+        else:
+            self.flushed += len(rows)
+            self.batches += 1
+
+        for message in batch:
+            chat_pending = self.pending.get(message.chat_id)
+            if chat_pending is not None:
+                chat_pending.pop(message.id, None)
+                if not chat_pending:
+                    del self.pending[message.chat_id]
+
+    async def insert_with_retries(self, rows: List[dict]) -> bool:
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self.insert_rows(rows)
+                return True
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"批量写入消息失败（第 {attempt} 次）: {str(e)}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(min(0.1 * 2 ** attempt, 5.0))
+        return False
+
+    async def insert_rows(self, rows: List[dict]):
+        async with AsyncSessionLocal() as session:
+            async with session.begin():
+                # 多行 INSERT，一个事务写入整批消息
+                await session.execute(insert(MessageModel), rows)
+
+    def dead_letter(self, failed: List[tuple]):
+        # 逐条写入仍失败的消息追加到死信文件（JSONL），修复后可重新导入；未配置文件时只记录日志
+        self.dead_lettered += len(failed)
+        for row, error in failed:
+            logger.error(f"消息 {row['id']}（聊天 {row['chat_id']}）写入失败，转入死信: {error}")
+        if not self.dead_letter_file:
+            self.dropped += len(failed)
+            return
+        try:
+            with open(self.dead_letter_file, "a", encoding="utf-8") as f:
+                for row, error in failed:
+                    f.write(json.dumps({"message": row, "error": error}, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            self.dropped += len(failed)
+            logger.error(f"写入死信文件失败: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "pending": sum(len(messages) for messages in self.pending.values()),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "dropped": self.dropped,
+        }
+
+message_writer = MessageWriteBehind(
+    mode=settings.MESSAGE_PERSISTENCE_MODE,
+    batch_size=settings.MESSAGE_FLUSH_BATCH_SIZE,
+    flush_interval=settings.MESSAGE_FLUSH_INTERVAL,
+    max_pending=settings.MESSAGE_WRITE_QUEUE_MAX,
+    max_retries=settings.MESSAGE_FLUSH_RETRIES,
+    dead_letter_file=settings.MESSAGE_DEAD_LETTER_FILE,
+)
@@ -0,0 +1,103 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+from sqlalchemy import Integer, String, column, func, update, values
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.orm import HaiguiTangModel
+
+logger = logging.getLogger(__name__)
+
+class UsageCounter:
+    """海龟汤使用次数的内存计数，定期合并成一条 UPDATE 写入数据库。
+
+    热门海龟汤每次开局都执行 usage_count = usage_count + 1 会在同一行上排队等锁；
+    这里把一个周期内的增量按 ID 汇总，一次 UPDATE ... FROM (VALUES ...) 写入。
+    写入失败时增量会放回内存，下个周期重试；正常关闭时把剩余增量全部写入。
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.pending: Dict[str, int] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.stopping: Optional[asyncio.Event] = None
+        self.lock = asyncio.Lock()
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def record(self, haiguitang_id: str, count: int = 1):
+        self.pending[haiguitang_id] = self.pending.get(haiguitang_id, 0) + count
+
+    async def start(self):
+        if self.task is None:
+            self.stopping = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            # 不取消后台任务：正在执行的 UPDATE 被取消时无法确定是否已提交，可能重复或丢失计数
+            self.stopping.set()
+            await self.task
+            self.task = None
+        # 关闭前写入剩余的增量，失败时重试几次
+        for attempt in range(3):
+            if await self.flush():
+                return
+            await asyncio.sleep(0.1 * 2 ** attempt)
+        if self.pending:
+            logger.error(f"关闭时未能写入海龟汤使用次数: {self.pending}")
+
+    async def run(self):
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    async def flush(self) -> bool:
+        async with self.lock:
+            if not self.pending:
+                return True
+            # 先取走当前的增量，写入期间新的计数进入新字典
+            snapshot, self.pending = self.pending, {}
+            # 按 ID 排序，多个进程同时写入时以相同顺序加锁，避免死锁
+            items = sorted(snapshot.items())
+            try:
+                await self.apply(items)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"写入海龟汤使用次数失败: {str(e)}")
+                for haiguitang_id, count in items:
+                    self.record(haiguitang_id, count)
+                return False
+            self.flushed += sum(count for _, count in items)
+            self.flushes += 1
+            return True
+
+    async def apply(self, items: List[Tuple[str, int]]):
+        deltas = values(column("id", String), column("delta", Integer), name="deltas").data(items)
+        statement = (
+            update(HaiguiTangModel)
+            .where(HaiguiTangModel.id == deltas.c.id)
+            .values(
+                # 旧数据的 usage_count 可能为 NULL
+                usage_count=func.coalesce(HaiguiTangModel.usage_count, 0) + deltas.c.delta,
+                # 使用次数不算内容修改：保持 updated_at 不变，提示模板和回答缓存以它作为版本
+                updated_at=HaiguiTangModel.updated_at,
+            )
+        )
+        async with AsyncSessionLocal() as session:
+            async with session.begin():
+                await session.execute(statement)
+
+    def stats(self) -> dict:
+        return {
+            "pending_puzzles": len(self.pending),
+            "pending_count": sum(self.pending.values()),
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+        }
+
+usage_counter = UsageCounter(flush_interval=settings.USAGE_FLUSH_INTERVAL)
@@ -4,9 +4,7 @@ from app.models.orm import UserModel
 from app.models.schemas import User, UserCreate
 from typing import Optional
 from datetime import datetime
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.password_hasher import pwd_context, password_hasher
 
 class UserRepository:
     def __init__(self, db: AsyncSession):
@@ -16,7 +14,7 @@ class UserRepository:
         return pwd_context.hash(password)
 
     async def create_user(self, user: UserCreate) -> User:
-        hashed_password = self.get_password_hash(user.password)
+        hashed_password = await password_hasher.hash(user.password)
         db_user = UserModel(username=user.username, email=user.email, hashed_password=hashed_password)
         self.db.add(db_user)
         await self.db.commit()
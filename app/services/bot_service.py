@@ -1,19 +1,19 @@
-from app.models.enums import ModelType, ServiceProvider
+from app.models.enums import ModelType, ServiceProvider, MessageRole, SenderType
 from app.repositories.bot_repository import BotRepository
-from app.models.schemas import BotCreate, Bot, Message
+from app.models.schemas import BotCreate, Bot, Message, MessageCreate, HaiguiTang
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional, List, Tuple
-from app.services.llm.openai_service import OpenAIService
-from app.services.llm.anthropic_service import AnthropicService
-from app.services.bots.check_completion_service import StoryCompletionChecker
+from typing import Optional, List, Tuple, AsyncIterator
+from app.services.llm.registry import LLMProviderRegistry, get_llm_registry
 
 class BotService:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, registry: Optional[LLMProviderRegistry] = None):
         self.db = db
         self.repository = BotRepository(db)
-        self.openai_service = OpenAIService()
-        self.anthropic_service = AnthropicService()
-        self.story_completion_checker = StoryCompletionChecker()
+        # LLM 客户端由进程级注册表持有，每个请求只引用，不再重新创建
+        registry = registry or get_llm_registry()
+        self.openai_service = registry.openai_service
+        self.anthropic_service = registry.anthropic_service
+        self.story_completion_checker = registry.story_completion_checker
 
     async def create_bot(self, bot: BotCreate) -> Bot:
         return await self.repository.create_bot(bot)
@@ -27,21 +27,38 @@ class BotService:
     async def delete_bot(self, bot_id: str) -> bool:
         return await self.repository.delete_bot(bot_id)
     
-    async def generate_chat_message_response(self, chat_messages: List[Message], chat_id: str, bot_id: str) -> str:
+    async def generate_chat_message_response(self, chat_messages: List[Message], chat_id: str, bot_id: str,
+                                             haiguitang: Optional[HaiguiTang] = None) -> str:
 
         model_type: ModelType = ModelType.GPT4O
         provider, model = self.get_provider_and_model(model_type)
         
         if provider == ServiceProvider.OPENAI:
-            return await self.generate_openai_response(chat_messages, chat_id, bot_id, model)
+            return await self.generate_openai_response(chat_messages, chat_id, bot_id, model, haiguitang)
         elif provider == ServiceProvider.ANTHROPIC:
             return await self.generate_anthropic_response(chat_messages, chat_id, bot_id, model)
         else:
             raise ValueError(f"不支持的服务提供商: {provider}")
 
-    async def generate_openai_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str) -> str:
+    async def stream_chat_message_response(self, chat_messages: List[Message], chat_id: str, bot_id: str,
+                                           haiguitang: Optional[HaiguiTang] = None) -> AsyncIterator[str]:
+
+        model_type: ModelType = ModelType.GPT4O
+        provider, model = self.get_provider_and_model(model_type)
+
+        if provider == ServiceProvider.OPENAI:
+            async for token in self.openai_service.stream_response(chat_messages, chat_id, bot_id, model, haiguitang):
+                yield token
+        elif provider == ServiceProvider.ANTHROPIC:
+            async for token in self.anthropic_service.stream_response(chat_messages, chat_id, bot_id, model):
+                yield token
+        else:
+            raise ValueError(f"不支持的服务提供商: {provider}")
+
+    async def generate_openai_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str,
+                                       haiguitang: Optional[HaiguiTang] = None) -> str:
         # 实现 OpenAI 响应生成逻辑
-        return await self.openai_service.generate_response(chat_messages, chat_id, bot_id, model)
+        return await self.openai_service.generate_response(chat_messages, chat_id, bot_id, model, haiguitang)
 
     async def generate_anthropic_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str) -> str:
         # 实现 Anthropic 响应生成逻辑
@@ -52,7 +69,7 @@ class BotService:
             ModelType.GPT3: (ServiceProvider.OPENAI, "gpt-3.5-turbo"),
             ModelType.GPT4: (ServiceProvider.OPENAI, "gpt-4"),  # 添加这行
             ModelType.GPT4O: (ServiceProvider.OPENAI, "gpt-4"),
-            ModelType.CLAUDE: (ServiceProvider.ANTHROPIC, "claude-v1"),
+            ModelType.CLAUDE: (ServiceProvider.ANTHROPIC, "claude-3-5-sonnet-20240620"),
             ModelType.LLM: (ServiceProvider.OPENAI, "text-davinci-003"),
         }
         # 使用get方法，如果没有找到对应的模型类型，则返回GPT3的配置
@@ -61,19 +78,16 @@ class BotService:
     async def check_story_completion(self, story: str, messages: List[Message]) -> bool:
         return await self.story_completion_checker.check_story_completion(story, messages)
 
-    async def handle_story_completion(self, chat_id: str, story: str, messages: List[Message]) -> List[Message]:
+    async def handle_story_completion(self, chat_repository, chat_id: str, story: str, messages: List[Message]) -> Optional[Message]:
         is_completed = await self.check_story_completion(story, messages)
         
         if is_completed:
-            completion_message = Message(
-                chat_id=chat_id,
+            completion_message = MessageCreate(
                 content="恭喜！你已经成功还原了完整的故事细节。",
-                role="system",
+                role=MessageRole.SYSTEM,
                 sender_id="system",
-                sender_type="SYSTEM"
+                sender_type=SenderType.BOT
             )
-            # 这里假设你有一个方法来添加消息
-            # 你可能需要在 ChatRepository 中添加这个方法
-            return await self.chat_repository.add_message(chat_id, completion_message)
+            return await chat_repository.add_message(chat_id, completion_message)
         
-        return messages
\ No newline at end of file
+        return None
@@ -1,14 +1,25 @@
-from typing import List
+from typing import List, Optional
+import httpx
 from app.models.orm import MessageModel
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
 from app.core.config import settings  # 导入配置
+from app.core.metrics import track_llm_call
+import logging
+
+logger = logging.getLogger(__name__)
 
 class StoryCompletionChecker:
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.Client] = None, http_async_client: Optional[httpx.AsyncClient] = None):
         # 初始化 ChatOpenAI 实例，使用配置中的 API 密钥
-        self.chat = ChatOpenAI(temperature=0, openai_api_key=settings.OPENAI_API_KEY)
+        self.chat = ChatOpenAI(
+            temperature=0,
+            openai_api_key=settings.OPENAI_API_KEY,
+            openai_api_base=settings.OPENAI_API_BASE,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
 
     async def check_story_completion(self, story: str, messages: List[MessageModel]) -> bool:
         system_message = SystemMessage(content="你是一个海龟汤游戏的裁判，负责判断玩家是否已经还原了完整的故事细节。")
@@ -31,8 +42,10 @@ class StoryCompletionChecker:
 
         messages = [system_message, human_message]
 
-        response = await self.chat.ainvoke(messages)
-        print("==============response==============", response.content)
+        with track_llm_call("openai", "story_completion") as call:
+            response = await self.chat.ainvoke(messages)
+            call.usage_metadata(response.usage_metadata)
+        logger.debug("故事完成度检查结果: %s", response.content)
         return response.content.strip().lower() == "是"
 
     # 这里可以添加未来的其他方法
@@ -4,10 +4,18 @@ from app.models.schemas import Chat, ChatCreate, MessageCreate, Message
 from app.models.enums import MessageRole, SenderType
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from typing import List
+from typing import List, AsyncIterator, Tuple, Optional
+import json
 import logging
 import asyncio
 from app.db.database import AsyncSessionLocal
+from app.core.tasks import spawn
+from app.core.exceptions import AppException
+from app.services.prompt_validator_service import check_prompt
+from app.core.logger import bind_log_context
+from app.models.haiguitang import HaiguiTangStart
+from app.repositories.haiguitang_repository import HaiguiTangRepository
+from app.repositories.haiguitang_cache import haiguitang_cache
 
 logger = logging.getLogger(__name__)
 
@@ -42,49 +50,103 @@ class ChatService:
             logger.error(f"ChatService: 获取聊天时发生错误: {str(e)}")
             raise
 
+    # 快速序列化路径：返回与 response_model 字段一致的字典，由路由直接用 orjson 编码
+    async def get_chat_row(self, chat_id: str) -> Optional[dict]:
+        return await self.chat_repository.get_chat_row(chat_id)
+
+    async def get_all_chat_rows(self) -> List[dict]:
+        return await self.chat_repository.get_all_chat_rows()
+
+    async def get_chat_history_rows(self, user_id: str, limit: int = 10) -> List[dict]:
+        return await self.chat_repository.get_chat_history_rows(user_id, limit)
+
+    async def get_message_rows(self, chat_id: str, limit: int = 50, before: Optional[str] = None,
+                               after: Optional[str] = None, oldest_first: bool = False) -> List[dict]:
+        return await self.chat_repository.get_message_rows(chat_id, limit, before=before, after=after, oldest_first=oldest_first)
+
+    async def get_chat_version(self, chat_id: str) -> Optional[str]:
+        return await self.chat_repository.get_chat_version(chat_id)
+
     async def get_chat_history(self, user_id: str, limit: int = 10) -> List[Chat]:
         return await self.chat_repository.get_chat_history(user_id, limit)
 
     async def add_message_and_get_caipan_reply(self, chat_id: str, message: MessageCreate) -> List[Message]:
+        chat, user_message, chat_history, bot_id = await self._prepare_caipan_turn(chat_id, message)
+
+        bot_reply = await self.bot_service.generate_chat_message_response(chat_history, chat_id, bot_id, chat.current_haiguitang)
+
+        bot_message = await self._save_caipan_reply(chat_id, bot_id, bot_reply)
+
+        self._finish_caipan_turn(chat, chat_id, chat_history, bot_message)
+
+        return [user_message, bot_message]
+
+    async def add_message_and_stream_caipan_reply(self, chat_id: str, message: MessageCreate) -> AsyncIterator[Tuple[str, str]]:
+        # 以 (事件名, JSON 数据) 的形式依次产出：用户消息、逐个 token、保存后的机器人消息
+        chat, user_message, chat_history, bot_id = await self._prepare_caipan_turn(chat_id, message)
+        yield "user_message", user_message.model_dump_json()
+
+        chunks = []
+        async for token in self.bot_service.stream_chat_message_response(chat_history, chat_id, bot_id, chat.current_haiguitang):
+            chunks.append(token)
+            yield "token", json.dumps({"content": token}, ensure_ascii=False)
+
+        # 只有在流完整结束后才落库
+        bot_message = await self._save_caipan_reply(chat_id, bot_id, "".join(chunks))
+        # 先启动完成度检查再产出最后一个事件：客户端收到 bot_message 后断开时，生成器会在 yield 处被关闭
+        self._finish_caipan_turn(chat, chat_id, chat_history, bot_message)
+        yield "bot_message", bot_message.model_dump_json()
+
+    async def _prepare_caipan_turn(self, chat_id: str, message: MessageCreate) -> Tuple[Chat, Message, List[Message], str]:
         chat = await self.chat_repository.get_chat(chat_id)
         if not chat:
             raise ValueError(f"Chat with id {chat_id} not found")
 
-        user_message = await self.chat_repository.add_message(chat_id, message)
-
-        chat_history = await self.chat_repository.get_chat_messages_history(chat_id)
-
         caipan_bot = next((bot for bot in chat.bots if bot.id == 'caipan'), None)
         if not caipan_bot:
             raise ValueError("在聊天中找不到'caipan'机器人")
-        bot_id = caipan_bot.id
 
-        bot_reply = await self.bot_service.generate_chat_message_response(chat_history, chat_id, caipan_bot.id)
+        # 不合规的提问直接拒绝，不落库也不调用 LLM
+        if message.sender_type == SenderType.USER:
+            bind_log_context(user_id=message.sender_id)
+            validation = check_prompt(message.content)
+            if not validation.is_valid:
+                raise AppException(status_code=400, detail=validation.reason)
+
+        user_message = await self.chat_repository.add_message(chat_id, message)
+
+        chat_history = await self.chat_repository.get_chat_messages_history(chat_id)
 
+        return chat, user_message, chat_history, caipan_bot.id
+
+    async def _save_caipan_reply(self, chat_id: str, bot_id: str, bot_reply: str) -> Message:
         bot_message = MessageCreate(
             content=bot_reply,
             role=MessageRole.ASSISTANT,
             sender_id=bot_id,
             sender_type=SenderType.BOT
         )
-        bot_message = await self.chat_repository.add_message(chat_id, bot_message)
-
-        messages = [user_message, bot_message]
+        return await self.chat_repository.add_message(chat_id, bot_message)
 
+    def _finish_caipan_turn(self, chat: Chat, chat_id: str, chat_history: List[Message], bot_message: Message):
         # 检查是否需要 验证故事完成度
-        print(f"================ChatService: 当前消息: {bot_message}")
         is_handle_story_completion = bot_message.role == MessageRole.ASSISTANT and bot_message.content.strip().lower().startswith("是")
 
-        print(f"================ChatService: 当前消息: {is_handle_story_completion}")
-        if is_handle_story_completion:
-            # chat 在什么情况下插入海龟汤呢？！！！
-            # 获取当前的海龟汤汤底
-            print(f"================ChatService: 当前海龟汤汤底: {chat.current_haiguitang}")
+        if is_handle_story_completion and chat.current_haiguitang:
+            # 完成度检查需要再调用一次 LLM，放到后台执行，不阻塞本次回复
+            # 结果以系统消息写入聊天，客户端通过消息历史获取
             tang_di = chat.current_haiguitang.tang_di
+            spawn(self._check_story_completion(chat_id, tang_di, chat_history + [bot_message]))
 
-            messages = await self.bot_service.handle_story_completion(chat_id, tang_di, messages)
-
-        return messages
+    async def _check_story_completion(self, chat_id: str, tang_di: str, messages: List[Message]):
+        # 请求结束后原会话会被关闭，后台任务使用独立的数据库会话
+        try:
+            async with AsyncSessionLocal() as session:
+                completion_message = await self.bot_service.handle_story_completion(ChatRepository(session), chat_id, tang_di, messages)
+            if completion_message:
+                logger.info(f"ChatService: 聊天 {chat_id} 已还原完整故事")
+        except Exception as e:
+            logger.error(f"ChatService: 检查故事完成度时发生错误: {str(e)}")
 
     async def add_user_to_chat(self, chat_id: str, user_id: str) -> Chat:
         return await self.chat_repository.add_user_to_chat(chat_id, user_id)
@@ -92,6 +154,26 @@ class ChatService:
     async def remove_user_from_chat(self, chat_id: str, user_id: str) -> Chat:
         return await self.chat_repository.remove_user_from_chat(chat_id, user_id)
 
+    async def start_haiguitang(self, chat_id: str, request: HaiguiTangStart) -> Chat:
+        # 选题在仓库开启的事务中执行：请求会话上不能先有查询，否则事务已自动开始，无法再 begin()
+        async def choose_haiguitang(session: AsyncSession) -> str:
+            if request.haiguitang_id is None:
+                haiguitang = await HaiguiTangRepository(session).get_random_haiguitang(
+                    chat_id=chat_id, tags=request.tags or None, target_difficulty=request.difficulty,
+                    favor_unused=request.favor_unused,
+                )
+                if haiguitang is None:
+                    raise ValueError("没有符合条件且未玩过的海龟汤")
+                return haiguitang.id
+            if not await haiguitang_cache.get_many(session, [request.haiguitang_id]):
+                raise ValueError(f"海龟汤 {request.haiguitang_id} 不存在")
+            return request.haiguitang_id
+
+        return await self.chat_repository.start_haiguitang(chat_id, choose_haiguitang)
+
+    async def end_haiguitang(self, chat_id: str) -> Chat:
+        return await self.chat_repository.end_haiguitang(chat_id)
+
     async def get_all_chats(self) -> List[Chat]:
         logger.info("ChatService: 尝试获取所有聊天")
         try:
@@ -102,19 +184,20 @@ class ChatService:
             logger.error(f"ChatService: 获取所有聊天时发生错误: {str(e)}")
             raise
 
-    async def get_chat_messages_history(self, chat_id: str, limit: int = 50) -> List[Message]:
+    async def get_chat_messages_history(self, chat_id: str, limit: int = 50, before: Optional[str] = None,
+                                        after: Optional[str] = None) -> List[Message]:
         logger.info(f"ChatService: 尝试获取聊天ID {chat_id} 的消息历史")
         try:
-            messages = await self.chat_repository.get_chat_messages_history(chat_id, limit)
+            messages = await self.chat_repository.get_chat_messages_history(chat_id, limit, before=before, after=after)
             logger.info(f"ChatService: 成功获取聊天ID {chat_id} 的消息历史，共 {len(messages)} 条消息")
             return messages
         except Exception as e:
             logger.error(f"ChatService: 获取聊天消息历史时发生错误: {str(e)}")
             raise
 
-    async def get_chat_messages(self, chat_id: str) -> List[Message]:
+    async def get_chat_messages(self, chat_id: str, after: Optional[str] = None, limit: int = 100) -> List[Message]:
         try:
-            messages = await self.chat_repository.get_chat_messages(chat_id)
+            messages = await self.chat_repository.get_chat_messages(chat_id, after=after, limit=limit)
             return messages
         except Exception as e:
             logger.error(f"ChatService: 获取聊天消息历史时发生错误: {str(e)}")
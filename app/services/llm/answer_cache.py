@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+import re
+import time
+import unicodedata
+import zlib
+import numpy as np
+from app.core.config import settings
+
+# 常见繁体字到简体字的映射，覆盖玩家提问中最常出现的字
+TRADITIONAL_TO_SIMPLIFIED = str.maketrans(
+    "們個為嗎會這時來說對裡後與還沒麼媽親殺開關門見兒過發車東體愛種頭號醫聽讓從經錢電問無現樣學長當邊誰屍條腦變傷認識覺歲帶記憶夢殺買賣寫讀鄰難險獨戲間題嗎幾點"
+    "氣處務員場隻雙張兩實錯換筆書報紙歡樂聲們閱啟麗臉將據",
+    "们个为吗会这时来说对里后与还没么妈亲杀开关门见儿过发车东体爱种头号医听让从经钱电问无现样学长当边谁尸条脑变伤认识觉岁带记忆梦杀买卖写读邻难险独戏间题吗几点"
+    "气处务员场只双张两实错换笔书报纸欢乐声们阅启丽脸将据",
+)
+
+# 标点、空白等非文字字符
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+# 否定词不同的问题答案往往相反，近似匹配时要求否定词完全一致
+NEGATIONS = ("不", "没", "非", "无", "未", "别")
+
+# 2^61 - 1，MinHash 使用的梅森素数
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = text.translate(TRADITIONAL_TO_SIMPLIFIED)
+    return _NON_WORD.sub("", text)
+
+class MinHasher:
+    def __init__(self, num_perm: int, ngram: int, seed: int = 42):
+        self.ngram = ngram
+        rng = np.random.default_rng(seed)
+        # 系数取在 2^31 以内，保证 uint64 乘法不会溢出
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> Set[str]:
+        if len(text) <= self.ngram:
+            return {text}
+        return {text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in self.shingles(text)),
+            dtype=np.uint64,
+        )
+        return ((np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME).min(axis=0)
+
+class _Entry:
+    __slots__ = ("answer", "signature", "negations", "expires_at")
+
+    def __init__(self, answer: str, signature: np.ndarray, negations: Tuple[int, ...], expires_at: float):
+        self.answer = answer
+        self.signature = signature
+        self.negations = negations
+        self.expires_at = expires_at
+
+class _PuzzleIndex:
+    """单个海龟汤下所有问题的 MinHash 签名矩阵。
+
+    矩阵按容量预先分配，前 size 行有效，每个问题占一行；新增写入末尾，删除时把最后一行移到空出的位置，
+    更新签名时原地覆盖该行，都不需要重建整个矩阵。容量不足时翻倍。
+    """
+
+    def __init__(self, num_perm: int, capacity: int = 16):
+        self.matrix = np.empty((capacity, num_perm), dtype=np.uint64)
+        self.questions: List[str] = []
+        self.rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def signatures(self) -> np.ndarray:
+        return self.matrix[:len(self.questions)]
+
+    def put(self, question: str, signature: np.ndarray):
+        row = self.rows.get(question)
+        if row is None:
+            row = len(self.questions)
+            if row == len(self.matrix):
+                grown = np.empty((row * 2, self.matrix.shape[1]), dtype=np.uint64)
+                grown[:row] = self.matrix
+                self.matrix = grown
+            self.rows[question] = row
+            self.questions.append(question)
+        self.matrix[row] = signature
+
+    def remove(self, question: str):
+        row = self.rows.pop(question)
+        last = self.questions.pop()
+        if row < len(self.questions):
+            self.questions[row] = last
+            self.rows[last] = row
+            self.matrix[row] = self.matrix[len(self.questions)]
+
+class JudgeAnswerCache:
+    """跨聊天的裁判回答缓存，键为 (海龟汤, 规范化后的问题)。
+
+    先做精确匹配，再用字符 n-gram 的 MinHash 签名与同一海龟汤下的所有已缓存问题批量比较，
+    估计的 Jaccard 相似度达到阈值才视为命中。
+    """
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float, num_perm: int, ngram: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, ngram)
+        self.entries: "OrderedDict[Tuple[Hashable, str], _Entry]" = OrderedDict()
+        self.indexes: Dict[Hashable, _PuzzleIndex] = {}
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def negation_key(self, question: str) -> Tuple[int, ...]:
+        return tuple(question.count(word) for word in NEGATIONS)
+
+    def lookup(self, puzzle_key: Hashable, question: str) -> Optional[str]:
+        normalized = normalize_question(question)
+        if not normalized:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        entry = self.get_live((puzzle_key, normalized), now)
+        if entry is not None:
+            self.exact_hits += 1
+            return entry.answer
+
+        entry = self.find_near_duplicate(puzzle_key, normalized, now)
+        if entry is not None:
+            self.near_hits += 1
+            return entry.answer
+
+        self.misses += 1
+        return None
+
+    def get_live(self, key: Tuple[Hashable, str], now: float) -> Optional[_Entry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self.remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def find_near_duplicate(self, puzzle_key: Hashable, normalized: str, now: float) -> Optional[_Entry]:
+        index = self.indexes.get(puzzle_key)
+        if index is None or not index.questions:
+            return None
+
+        signature = self.hasher.signature(normalized)
+        # 相同位置的最小哈希值相等的比例即为 Jaccard 相似度的估计
+        similarities = (index.signatures() == signature).mean(axis=1)
+        negations = self.negation_key(normalized)
+        # 只对达到阈值的行按相似度从高到低排序；最相似的条目已过期或否定词不同时继续看下一个
+        candidates = np.flatnonzero(similarities >= self.threshold)
+        found = None
+        expired = []
+        for row in candidates[np.argsort(-similarities[candidates], kind="stable")]:
+            key = (puzzle_key, index.questions[row])
+            entry = self.entries[key]
+            if entry.negations != negations:
+                continue
+            if entry.expires_at <= now:
+                expired.append(key)
+                continue
+            self.entries.move_to_end(key)
+            found = entry
+            break
+        # 删除会移动矩阵中的行，遍历结束后再清理过期条目
+        for key in expired:
+            self.remove(key)
+        return found
+
+    def store(self, puzzle_key: Hashable, question: str, answer: str):
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        key = (puzzle_key, normalized)
+        entry = _Entry(
+            answer=answer,
+            signature=self.hasher.signature(normalized),
+            negations=self.negation_key(normalized),
+            expires_at=time.monotonic() + self.ttl,
+        )
+        # 已有的问题原地更新签名所在的行，并移到 LRU 末尾
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        index = self.indexes.get(puzzle_key)
+        if index is None:
+            index = self.indexes[puzzle_key] = _PuzzleIndex(len(self.hasher.a))
+        index.put(normalized, entry.signature)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key: Tuple[Hashable, str]):
+        del self.entries[key]
+        index = self.indexes[key[0]]
+        index.remove(key[1])
+        if not index.questions:
+            del self.indexes[key[0]]
+
+    def invalidate(self, haiguitang_id: str):
+        # puzzle_key 为 (海龟汤ID, 版本)，清除该海龟汤所有版本的缓存
+        for puzzle_key in [key for key in self.indexes if key[0] == haiguitang_id]:
+            for question in list(self.indexes[puzzle_key].questions):
+                self.remove((puzzle_key, question))
+
+    def clear(self):
+        self.entries.clear()
+        self.indexes.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.near_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "puzzles": len(self.indexes),
+        }
+
+judge_answer_cache = JudgeAnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl=settings.ANSWER_CACHE_TTL,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    num_perm=settings.ANSWER_CACHE_NUM_PERM,
+    ngram=settings.ANSWER_CACHE_NGRAM,
+)
@@ -1,30 +1,74 @@
-from typing import List
+from typing import List, Optional, AsyncIterator, Tuple, Dict
+import httpx
+from app.models.enums import MessageRole
 from app.models.schemas import Message
-from anthropic import Anthropic, HUMAN_PROMPT, AI_PROMPT
-import os
+from app.core.config import settings
+from app.services.llm.base_llm_service import BaseLLMService, FALLBACK_RESPONSE
+from app.core.metrics import track_llm_call
+from anthropic import AsyncAnthropic
+import logging
 
-class AnthropicService:
-    def __init__(self):
-        # 初始化 Anthropic 客户端
-        # 注意: 你需要设置 ANTHROPIC_API_KEY 环境变量
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+logger = logging.getLogger(__name__)
 
-    async def generate_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str) -> str:
-        # 将 Message 对象转换为 Anthropic 期望的格式
-        prompt = ""
+class AnthropicService(BaseLLMService):
+    def __init__(self, http_async_client: Optional[httpx.AsyncClient] = None):
+        # 使用异步客户端，调用期间不会阻塞事件循环
+        self.client = AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            base_url=settings.ANTHROPIC_API_BASE,
+            http_client=http_async_client,
+        )
+
+    def to_anthropic_messages(self, chat_messages: List[Message]) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        # Messages API 要求 user/assistant 交替出现且以 user 开头，系统消息单独传入
+        system_parts = []
+        messages = []
         for msg in chat_messages:
-            if msg.role == "user":
-                prompt += f"{HUMAN_PROMPT} {msg.content}"
+            if msg.role == MessageRole.SYSTEM:
+                system_parts.append(msg.content)
+                continue
+            role = "user" if msg.role == MessageRole.USER else "assistant"
+            if messages and messages[-1]["role"] == role:
+                messages[-1]["content"] += f"\n{msg.content}"
             else:
-                prompt += f"{AI_PROMPT} {msg.content}"
+                messages.append({"role": role, "content": msg.content})
+        if messages and messages[0]["role"] != "user":
+            messages.pop(0)
+        system = "\n".join(system_parts) if system_parts else None
+        return system, messages
+
+    def request_params(self, chat_messages: List[Message], model: str, max_tokens: int, timeout: Optional[float]) -> dict:
+        system, messages = self.to_anthropic_messages(chat_messages)
+        params = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "timeout": timeout or settings.LLM_REQUEST_TIMEOUT,
+        }
+        if system:
+            params["system"] = system
+        return params
 
+    async def generate_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str,
+                                max_tokens: int = 1000, timeout: Optional[float] = None) -> str:
+        params = self.request_params(chat_messages, model, max_tokens, timeout)
         try:
-            response = self.client.completions.create(
-                model=model,
-                prompt=prompt,
-                max_tokens_to_sample=1000
-            )
-            return response.completion
+            with track_llm_call("anthropic", "chat") as call:
+                response = await self.client.messages.create(**params)
+                call.tokens(response.usage.input_tokens, response.usage.output_tokens)
+            return "".join(block.text for block in response.content if block.type == "text")
         except Exception as e:
-            print(f"Anthropic API 调用出错: {str(e)}")
-            return "抱歉,生成响应时出现了错误。"
\ No newline at end of file
+            # asyncio.CancelledError 不是 Exception 的子类，请求被取消时会直接向上传播
+            logger.error(f"Anthropic API 调用出错: {str(e)}")
+            return FALLBACK_RESPONSE
+
+    async def stream_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str,
+                              max_tokens: int = 1000, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        params = self.request_params(chat_messages, model, max_tokens, timeout)
+        # 退出上下文时会关闭底层连接，客户端断开（任务取消）时也能及时释放
+        with track_llm_call("anthropic", "chat_stream") as call:
+            async with self.client.messages.stream(**params) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                final_message = await stream.get_final_message()
+                call.tokens(final_message.usage.input_tokens, final_message.usage.output_tokens)
@@ -1,8 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, AsyncIterator
 from app.models.schemas import Message
 
+# 非流式调用失败时各服务商返回的兜底文案；录制模式据此识别失败的调用，不把它当作真实回答写入录制文件
+FALLBACK_RESPONSE = "抱歉，生成响应时出现了错误。"
+
 class BaseLLMService(ABC):
     @abstractmethod
     async def generate_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str) -> str:
-        pass
\ No newline at end of file
+        pass
+
+    async def stream_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str) -> AsyncIterator[str]:
+        # 默认实现：不支持流式的服务商一次性返回完整回复
+        yield await self.generate_response(chat_messages, chat_id, bot_id, model)
@@ -0,0 +1,58 @@
+from typing import Dict, Optional
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class Cassette:
+    """LLM 请求与回复的录制文件（JSON Lines，每行一次调用）。
+
+    record 模式下把真实调用追加写入文件，replay 模式下按请求键查找录制的回复。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    @staticmethod
+    def key(kind: str, request: dict) -> str:
+        payload = json.dumps({"kind": kind, **request}, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load(self) -> int:
+        if not os.path.exists(self.path):
+            logger.warning(f"录制文件不存在: {self.path}")
+            return 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    # 同一请求录制了多次时以最后一次为准
+                    self.entries[entry["key"]] = entry
+        logger.info(f"已加载 {len(self.entries)} 条 LLM 录制: {self.path}")
+        return len(self.entries)
+
+    def lookup(self, kind: str, request: dict) -> Optional[dict]:
+        entry = self.entries.get(self.key(kind, request))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def record(self, kind: str, request: dict, response, latency_ms: float):
+        key = self.key(kind, request)
+        entry = {"key": key, "kind": kind, "request": request, "response": response, "latency_ms": round(latency_ms, 1)}
+        self.entries[key] = entry
+        # 录制只用于准备压测数据，直接同步追加写入
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.recorded += 1
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
@@ -0,0 +1,187 @@
+from typing import AsyncIterator, List, Optional
+import asyncio
+import math
+import random
+import time
+import zlib
+from app.models.enums import MessageRole
+from app.models.schemas import Message, HaiguiTang
+from app.core.config import settings
+from app.core.metrics import track_llm_call
+from app.services.llm.base_llm_service import BaseLLMService, FALLBACK_RESPONSE
+from app.services.llm.cassette import Cassette
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 裁判的固定回复，按问题内容的哈希选取，同一个问题总是得到同一个回答
+CANNED_ANSWERS = ("不是。", "是的。", "无关。", "不是。", "是也不是。", "无关，请换个方向提问。")
+
+class LatencyProfile:
+    """首个 token 的延迟服从对数正态分布（median_ms, sigma），之后按 tokens_per_second 逐个输出。"""
+
+    def __init__(self, median_ms: float, sigma: float, tokens_per_second: float):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.tokens_per_second = tokens_per_second
+
+    def first_token_delay(self, rng: random.Random) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median_ms), self.sigma) / 1000
+
+    def token_interval(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+LATENCY_PROFILES = {
+    "instant": LatencyProfile(0, 0, 0),
+    "fast": LatencyProfile(50, 0.3, 200),
+    "realistic": LatencyProfile(700, 0.5, 40),
+    "slow": LatencyProfile(2500, 0.6, 12),
+}
+
+def latency_profile_from_settings() -> LatencyProfile:
+    profile = LATENCY_PROFILES.get(settings.LLM_LOCAL_PROFILE)
+    if profile is None:
+        raise ValueError(f"不支持的本地 LLM 延迟配置: {settings.LLM_LOCAL_PROFILE}")
+    return LatencyProfile(
+        median_ms=settings.LLM_LOCAL_LATENCY_MS if settings.LLM_LOCAL_LATENCY_MS is not None else profile.median_ms,
+        sigma=profile.sigma,
+        tokens_per_second=settings.LLM_LOCAL_TOKENS_PER_SECOND if settings.LLM_LOCAL_TOKENS_PER_SECOND is not None else profile.tokens_per_second,
+    )
+
+class LocalLLMError(Exception):
+    pass
+
+def last_user_message(chat_messages: List[Message]) -> str:
+    return next((msg.content for msg in reversed(chat_messages) if msg.role == MessageRole.USER), "")
+
+def chat_request(chat_messages: List[Message], model: str, haiguitang: Optional[HaiguiTang]) -> dict:
+    # 录制键只取模型、汤面和最后一个问题：裁判的回答只取决于这些，且换一个数据库回放时依然能命中
+    return {
+        "model": model,
+        "tang_mian": haiguitang.tang_mian if haiguitang is not None else None,
+        "input": last_user_message(chat_messages),
+    }
+
+def completion_request(story: str, messages: list) -> dict:
+    return {"story": story, "messages": [f"{msg.role}: {msg.content}" for msg in messages]}
+
+class LocalLLMService(BaseLLMService):
+    """离线的 LLM 服务：返回固定回复或录制的回复，并模拟延迟、流式速度和错误率。"""
+
+    def __init__(self, profile: LatencyProfile, error_rate: float = 0.0, seed: Optional[int] = None,
+                 cassette: Optional[Cassette] = None):
+        self.profile = profile
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.cassette = cassette
+
+    def answer_for(self, chat_messages: List[Message], model: str, haiguitang: Optional[HaiguiTang]) -> str:
+        request = chat_request(chat_messages, model, haiguitang)
+        if self.cassette is not None:
+            entry = self.cassette.lookup("chat", request)
+            if entry is not None:
+                return entry["response"]
+        return CANNED_ANSWERS[zlib.crc32(request["input"].encode("utf-8")) % len(CANNED_ANSWERS)]
+
+    def maybe_fail(self):
+        if self.error_rate > 0 and self.rng.random() < self.error_rate:
+            raise LocalLLMError("模拟的 LLM 调用失败")
+
+    def tokens(self, answer: str) -> List[str]:
+        # 中文按字切分，近似真实模型的 token 粒度
+        return list(answer)
+
+    async def generate_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str,
+                                haiguitang: Optional[HaiguiTang] = None, **kwargs) -> str:
+        answer = self.answer_for(chat_messages, model, haiguitang)
+        tokens = self.tokens(answer)
+        try:
+            with track_llm_call("local", "chat") as call:
+                await asyncio.sleep(self.profile.first_token_delay(self.rng) + len(tokens) * self.profile.token_interval())
+                self.maybe_fail()
+                call.tokens(sum(len(msg.content) for msg in chat_messages), len(tokens))
+            return answer
+        except LocalLLMError as e:
+            # 与真实服务商一致：非流式调用失败时返回兜底文案
+            logger.error(f"本地 LLM 调用出错: {str(e)}")
+            return FALLBACK_RESPONSE
+
+    async def stream_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str,
+                              haiguitang: Optional[HaiguiTang] = None, **kwargs) -> AsyncIterator[str]:
+        answer = self.answer_for(chat_messages, model, haiguitang)
+        tokens = self.tokens(answer)
+        interval = self.profile.token_interval()
+        with track_llm_call("local", "chat_stream") as call:
+            await asyncio.sleep(self.profile.first_token_delay(self.rng))
+            self.maybe_fail()
+            for i, token in enumerate(tokens):
+                if i and interval:
+                    await asyncio.sleep(interval)
+                yield token
+            call.tokens(sum(len(msg.content) for msg in chat_messages), len(tokens))
+
+class LocalStoryCompletionChecker:
+    """离线的故事完成度检查：优先使用录制结果，否则视为尚未还原。"""
+
+    def __init__(self, profile: LatencyProfile, seed: Optional[int] = None, cassette: Optional[Cassette] = None):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.cassette = cassette
+
+    async def check_story_completion(self, story: str, messages: list) -> bool:
+        with track_llm_call("local", "story_completion"):
+            await asyncio.sleep(self.profile.first_token_delay(self.rng))
+        if self.cassette is not None:
+            entry = self.cassette.lookup("story_completion", completion_request(story, messages))
+            if entry is not None:
+                return bool(entry["response"])
+        return False
+
+class RecordingLLMService(BaseLLMService):
+    """record 模式：调用真实服务商，并把请求和回复写入录制文件。"""
+
+    def __init__(self, inner: BaseLLMService, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+
+    def __getattr__(self, name):
+        # build_chain 等服务商特有的方法直接转发
+        return getattr(self.inner, name)
+
+    async def generate_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str,
+                                haiguitang: Optional[HaiguiTang] = None, **kwargs) -> str:
+        if haiguitang is not None:
+            kwargs["haiguitang"] = haiguitang
+        start = time.perf_counter()
+        answer = await self.inner.generate_response(chat_messages, chat_id, bot_id, model, **kwargs)
+        if answer == FALLBACK_RESPONSE:
+            # 服务商调用失败，兜底文案不是裁判的回答，不能录制后在回放时返回
+            logger.warning("LLM 调用失败，本次回复不写入录制文件")
+            return answer
+        self.cassette.record("chat", chat_request(chat_messages, model, haiguitang), answer, (time.perf_counter() - start) * 1000)
+        return answer
+
+    async def stream_response(self, chat_messages: List[Message], chat_id: str, bot_id: str, model: str,
+                              haiguitang: Optional[HaiguiTang] = None, **kwargs) -> AsyncIterator[str]:
+        if haiguitang is not None:
+            kwargs["haiguitang"] = haiguitang
+        start = time.perf_counter()
+        chunks = []
+        # 流式调用失败时异常直接向上传播、客户端断开时生成器在 yield 处关闭，两种情况都不会走到录制
+        async for token in self.inner.stream_response(chat_messages, chat_id, bot_id, model, **kwargs):
+            chunks.append(token)
+            yield token
+        self.cassette.record("chat", chat_request(chat_messages, model, haiguitang), "".join(chunks), (time.perf_counter() - start) * 1000)
+
+class RecordingStoryCompletionChecker:
+    def __init__(self, inner, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+
+    async def check_story_completion(self, story: str, messages: list) -> bool:
+        start = time.perf_counter()
+        result = await self.inner.check_story_completion(story, messages)
+        self.cassette.record("story_completion", completion_request(story, messages), result, (time.perf_counter() - start) * 1000)
+        return result
@@ -0,0 +1,128 @@
+from typing import Dict, List, Optional, Tuple, Any
+from collections import OrderedDict
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import Runnable, RunnableLambda
+
+# 海龟汤没有设置时使用的默认汤面和汤底
+DEFAULT_TANG_MIAN = "女主很喜欢在网上分享自己的近况，有一天她收到一则留言，被吓到的女主夺门而出。或许她不该逃，第二天警方发现了女孩的尸体。"
+DEFAULT_TANG_DI = "女主在网上分享自己的近况的同时泄露了很多个人信息，其中包括她的家庭住址。有一天，一个变态通过女主的博文推断出了女主的家庭住址，藏匿到了女主的家里。女主在家时，他给女主发了一句：”我正在看着你。“女主被吓得夺门而出，变态从家里追了出来，在争执之中，变态失手把女主给杀了。"
+DEFAULT_KEY = ("default", "0")
+
+# 定义示例
+EXAMPLES = [
+    {"input": "是亲哥哥吗？", "output": "是的。"},
+    {"input": "大哥也生病了吗？", "output": "无关，大哥身体一直很健康。"},
+    {"input": "你们家里几个人？", "output": "无关，家里有三个兄弟。"},
+    {"input": "大哥是想杀我吗？", "output": "不是。"}
+]
+
+# 创建系统提示模板
+SYSTEM_TEMPLATE = """我正在进行一个海龟汤游戏，这是一个情境猜谜游戏。我会根据谜题情境（汤面）进行推理，并通过提问来猜出真相（汤底）。我的任务是回答你的提问。游戏规则如下：
+
+                你的提问内容应参考谜题情境（汤面），汤面会在下方提供。
+
+                你可以提出任何问题，我会根据真相（汤底）帮助你推理，我只会回答你“是的”、“不是”或“无关”。
+
+                回答“是的”、“不是”和“无关”的情况如下：
+
+                1. 是的：当玩家的问题直接指向谜题的某个关键点，并且该点与谜题的答案相关且正确时，回答“是的”。
+
+                2. 不是：当玩家的问题直接指向谜题的某个关键点，但该点与谜题的答案不相关或不正确时，回答“不是”。
+
+                3. 无关：当玩家的问题与谜题的核心内容无关，或者问题本身没有明确的指向性，无法帮助玩家缩小答案范围时，回答“无关”。
+
+                例如，假设谜题是“一个人在房间里，房间里有一扇门和一扇窗户，这个人是怎么出去的？”
+
+                - 玩家问：“这个人是通过门出去的吗？” 如果答案是通过门出去的，回答“是的”；如果不是，回答“不是”。
+
+                - 玩家问：“这个人是通过窗户出去的吗？” 如果答案是通过窗户出去的，回答“是的”；如果不是，回答“不是”。
+
+                - 玩家问：“这个人是通过烟囱出去的吗？” 如果房间里没有烟囱，或者这个问题与谜题无关，回答“无关，（这里补充简短的提示）”。
+
+
+                如果用户的问题与汤底有关，我会回答“无关”。
+
+                我会参考其他对话消息的格式，回答你的提问。
+
+                汤面：{tang_mian}
+                汤底：{tang_di}
+
+                开始吧！请你提问！
+            """
+
+# 示例对话与海龟汤无关，只构建一次
+EXAMPLE_MESSAGES: List[BaseMessage] = [
+    message
+    for example in EXAMPLES
+    for message in (HumanMessage(content=example["input"]), AIMessage(content=example["output"]))
+]
+
+def render_prefix(tang_mian: str, tang_di: str) -> Tuple[BaseMessage, ...]:
+    # 与 ChatPromptTemplate 的 f-string 渲染结果相同：系统提示 + 示例对话
+    return (SystemMessage(content=SYSTEM_TEMPLATE.format(tang_mian=tang_mian, tang_di=tang_di)), *EXAMPLE_MESSAGES)
+
+class CompiledPrompt:
+    """一个海龟汤版本的提示：系统消息和示例已经渲染好，调用时只追加玩家的问题。"""
+
+    def __init__(self, prefix: Tuple[BaseMessage, ...]):
+        self.prefix = prefix
+        # 按模型缓存连接好的 prompt | model，保留模型引用以免 id 被复用
+        self.chains: Dict[int, Tuple[Any, Runnable]] = {}
+
+    def messages(self, inputs: dict) -> List[BaseMessage]:
+        return [*self.prefix, HumanMessage(content=inputs["input"])]
+
+    def chain(self, model: Any) -> Runnable:
+        entry = self.chains.get(id(model))
+        if entry is None:
+            entry = self.chains[id(model)] = (model, RunnableLambda(self.messages) | model)
+        return entry[1]
+
+class PromptCache:
+    """按 (海龟汤ID, 版本) 缓存已渲染的提示和连接好的调用链，调用时只需传入 input。"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.entries: "OrderedDict[Tuple[str, str], CompiledPrompt]" = OrderedDict()
+
+    def key_for(self, haiguitang: Optional[Any]) -> Tuple[str, str]:
+        if haiguitang is None:
+            return DEFAULT_KEY
+        # 以 updated_at 作为版本，其他进程修改过的海龟汤也不会命中旧条目
+        updated_at = getattr(haiguitang, "updated_at", None)
+        return str(haiguitang.id), updated_at.isoformat() if updated_at else "0"
+
+    def compile(self, haiguitang: Optional[Any]) -> CompiledPrompt:
+        if haiguitang is None:
+            return CompiledPrompt(render_prefix(DEFAULT_TANG_MIAN, DEFAULT_TANG_DI))
+        return CompiledPrompt(render_prefix(haiguitang.tang_mian or "", haiguitang.tang_di or ""))
+
+    def get(self, haiguitang: Optional[Any] = None) -> CompiledPrompt:
+        key = self.key_for(haiguitang)
+        prompt = self.entries.get(key)
+        if prompt is not None:
+            self.entries.move_to_end(key)
+            return prompt
+        return self.prime(haiguitang)
+
+    def chain(self, model: Any, haiguitang: Optional[Any] = None) -> Runnable:
+        return self.get(haiguitang).chain(model)
+
+    def prime(self, haiguitang: Optional[Any]) -> CompiledPrompt:
+        key = self.key_for(haiguitang)
+        # 同一海龟汤只保留最新版本
+        self.invalidate(key[0])
+        prompt = self.compile(haiguitang)
+        self.entries[key] = prompt
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return prompt
+
+    def invalidate(self, haiguitang_id: str):
+        for key in [key for key in self.entries if key[0] == haiguitang_id]:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
+
+prompt_cache = PromptCache()
@@ -0,0 +1,99 @@
+from typing import Optional
+import asyncio
+import logging
+import httpx
+from app.core.config import settings
+from app.services.llm.openai_service import OpenAIService
+from app.services.llm.anthropic_service import AnthropicService
+from app.services.bots.check_completion_service import StoryCompletionChecker
+from app.services.llm.cassette import Cassette
+from app.services.llm.local_service import (
+    LocalLLMService, LocalStoryCompletionChecker, RecordingLLMService, RecordingStoryCompletionChecker,
+    latency_profile_from_settings,
+)
+
+logger = logging.getLogger(__name__)
+
+class LLMProviderRegistry:
+    """进程级的 LLM 服务商注册表，所有请求共享同一组 HTTP 连接池。"""
+
+    def __init__(self):
+        limits = httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(settings.LLM_REQUEST_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+
+        self.mode = settings.LLM_MODE
+        self.cassette = Cassette(settings.LLM_CASSETTE_PATH) if self.mode in ("record", "replay") else None
+
+        if self.mode in ("local", "replay"):
+            # 离线模式：不创建任何真实服务商的客户端，也不需要 API 密钥
+            if self.cassette is not None:
+                self.cassette.load()
+            profile = latency_profile_from_settings()
+            local_service = LocalLLMService(profile, settings.LLM_LOCAL_ERROR_RATE, settings.LLM_LOCAL_SEED, self.cassette)
+            self.openai_service = local_service
+            self.anthropic_service = local_service
+            self.story_completion_checker = LocalStoryCompletionChecker(profile, settings.LLM_LOCAL_SEED, self.cassette)
+            return
+
+        self.openai_service = OpenAIService(http_client=self.http_client, http_async_client=self.http_async_client)
+        self.anthropic_service = AnthropicService(http_async_client=self.http_async_client)
+        self.story_completion_checker = StoryCompletionChecker(http_client=self.http_client, http_async_client=self.http_async_client)
+        if self.mode == "record":
+            self.openai_service = RecordingLLMService(self.openai_service, self.cassette)
+            self.anthropic_service = RecordingLLMService(self.anthropic_service, self.cassette)
+            self.story_completion_checker = RecordingStoryCompletionChecker(self.story_completion_checker, self.cassette)
+
+    @property
+    def offline(self) -> bool:
+        return self.mode in ("local", "replay")
+
+    async def warm_up(self):
+        if self.offline:
+            return
+        # 预先建立 TLS 连接并放入 keep-alive 池，避免第一个用户请求承担握手开销
+        urls = [settings.OPENAI_API_BASE, settings.ANTHROPIC_API_BASE]
+        results = await asyncio.gather(
+            *(self.http_async_client.head(url) for url in urls),
+            return_exceptions=True,
+        )
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                logger.warning(f"LLM 连接预热失败 {url}: {str(result)}")
+            else:
+                logger.info(f"LLM 连接预热完成 {url}: {result.status_code}")
+
+        # 预先构建一次提示链，提前完成 langchain 的惰性初始化
+        self.openai_service.build_chain()
+
+    async def aclose(self):
+        if self.cassette is not None:
+            logger.info(f"LLM 录制统计: {self.cassette.stats()}")
+        await self.http_async_client.aclose()
+        self.http_client.close()
+
+_registry: Optional[LLMProviderRegistry] = None
+
+def get_llm_registry() -> LLMProviderRegistry:
+    # 正常情况下在应用启动时创建；脚本等未经过启动流程的场景下按需创建
+    global _registry
+    if _registry is None:
+        _registry = LLMProviderRegistry()
+    return _registry
+
+async def init_llm_registry() -> LLMProviderRegistry:
+    registry = get_llm_registry()
+    if settings.LLM_WARMUP:
+        await registry.warm_up()
+    return registry
+
+async def close_llm_registry():
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
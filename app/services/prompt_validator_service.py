@@ -1,16 +1,15 @@
 from app.core.config import settings
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
+from app.utils.keyword_matcher import KeywordAutomaton
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
 
 class PromptValidation(BaseModel):
     is_valid: bool = Field(description="提示是否是有效的海龟汤提问")
     reason: str = Field(description="判断的理由")
 
-validation_model = ChatOpenAI(
-    model='gpt-4',
-    openai_api_key=settings.OPENAI_API_KEY,
-)
-
 keywords = [
     "为什么", "怎么", "什么", "谁", "哪里", "哪儿", "什么时候", "如何", 
     "多少", "哪个", "几", "怎么回事", "怎么样", "为啥", "如何回事", "怎么不", "能否", 
@@ -21,14 +20,38 @@ keywords = [
     "谁来", "什么时间"
 ]
 
+# 所有关键词编译为一个自动机，一次扫描完成匹配；重新加载时整体替换
+keyword_automaton = KeywordAutomaton(keywords)
+
+def load_keywords_file(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def reload_keywords() -> int:
+    # 只从服务器上配置的 PROMPT_KEYWORDS_FILE 读取，未配置文件则恢复默认列表；关键词不接受来自请求的内容
+    global keyword_automaton
+    new_keywords = load_keywords_file(settings.PROMPT_KEYWORDS_FILE) if settings.PROMPT_KEYWORDS_FILE else keywords
+    if not new_keywords:
+        # 空列表会让所有提问通过校验，保留当前的自动机
+        raise ValueError(f"关键词文件 {settings.PROMPT_KEYWORDS_FILE} 为空")
+    keyword_automaton = KeywordAutomaton(new_keywords)
+    logger.info(f"已重新加载 {len(keyword_automaton.keywords)} 个提问校验关键词")
+    return len(keyword_automaton.keywords)
+
+def check_prompt(prompt: str) -> PromptValidation:
+    keyword = keyword_automaton.first_match(prompt)
+    if keyword is not None:
+        return PromptValidation(
+            is_valid=False,
+            reason=f"提示包含无效关键词：'{keyword}'。海龟汤提问应该是陈述句，不应包含疑问词。"
+        )
+    return PromptValidation(is_valid=True, reason="提示是有效的海龟汤提问。")
+
 async def validate_prompt(prompt: str) -> PromptValidation:
-    is_valid = True
-    reason = "提示是有效的海龟汤提问。"
+    return check_prompt(prompt)
 
-    for keyword in keywords:
-        if keyword in prompt:
-            is_valid = False
-            reason = f"提示包含无效关键词：'{keyword}'。海龟汤提问应该是陈述句，不应包含疑问词。"
-            break
+async def validate_prompts(prompts: List[str]) -> List[PromptValidation]:
+    return [check_prompt(prompt) for prompt in prompts]
 
-    return PromptValidation(is_valid=is_valid, reason=reason)
\ No newline at end of file
+if settings.PROMPT_KEYWORDS_FILE:
+    reload_keywords()
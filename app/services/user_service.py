@@ -5,9 +5,10 @@ from sqlalchemy.future import select
 from datetime import datetime
 import uuid
 from fastapi import HTTPException
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.password_hasher import pwd_context, password_hasher
+from app.core.security import create_access_token
+from app.core.config import settings
+from app.models.user import UserWithToken
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -15,6 +16,13 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# bcrypt 耗时数十毫秒，异步接口中使用以下版本，在线程池中执行
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
 async def create_user(db: AsyncSession, user: UserCreate) -> User:
     # 检查用户名是否已存在
     existing_user = await get_user_by_username(db, user.username)
@@ -29,7 +37,7 @@ async def create_user(db: AsyncSession, user: UserCreate) -> User:
 
     db_user = UserModel(
         username=user.username,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=await get_password_hash_async(user.password),
         email=user.email if user.email else None
     )
     db.add(db_user)
@@ -37,18 +45,19 @@ async def create_user(db: AsyncSession, user: UserCreate) -> User:
     await db.refresh(db_user)
     return User.model_validate(db_user)
 
-async def login_user(db: AsyncSession, user: UserLogin) -> User:
-    db_user = await get_user_by_username(db, user.username)
+async def login_user(db: AsyncSession, user: UserLogin, db_user: UserInDB | None = None) -> User:
+    if db_user is None:
+        db_user = await get_user_by_username(db, user.username)
     if not db_user:
         raise HTTPException(status_code=401, detail="用户名或密码错误")
-    if not verify_password(user.password, db_user.hashed_password):
+    if not await verify_password_async(user.password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="用户名或密码错误")
     return User.model_validate(db_user)
 
 async def login_or_register(db: AsyncSession, user: UserLogin) -> User:
     existing_user = await get_user_by_username(db, user.username)
     if existing_user:
-        return await login_user(db, user)
+        return await login_user(db, user, existing_user)
     else:
         new_user = UserCreate(username=user.username, password=user.password)
         return await create_user(db, new_user)
@@ -72,4 +81,12 @@ async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
     db_user = result.scalar_one_or_none()
     if db_user:
         return User.model_validate(db_user)
-    return None
\ No newline at end of file
+    return None
+
+def issue_token(user: User) -> UserWithToken:
+    access_token = create_access_token(user.id, user.username)
+    return UserWithToken(
+        **user.model_dump(),
+        access_token=access_token,
+        expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    )
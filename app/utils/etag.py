@@ -0,0 +1,15 @@
+from typing import Optional
+import hashlib
+
+def make_etag(version: str) -> str:
+    # 弱 ETag：内容相同即可复用，不要求字节级一致
+    return 'W/"' + hashlib.blake2b(version.encode(), digest_size=12).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """按 If-None-Match 的弱比较规则判断客户端缓存是否仍然有效。"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(tag.strip() in (etag, opaque, "W/" + opaque) for tag in if_none_match.split(","))
@@ -0,0 +1,22 @@
+from typing import Any
+import orjson
+from pydantic import BaseModel
+from starlette.responses import Response
+
+def encode_default(obj: Any):
+    # 缓存中已校验过的模型（消息、海龟汤）直接导出字段，不再校验
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"无法序列化 {type(obj).__name__}")
+
+class FastJSONResponse(Response):
+    """用 orjson 编码的 JSON 响应。
+
+    路由直接返回 Response 时 FastAPI 不再按 response_model 校验和转换内容，
+    因此内容必须已是与 response_model 一致的字典或模型。datetime 输出与 pydantic 相同（UTC 以 Z 结尾）。
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=encode_default, option=orjson.OPT_UTC_Z)
@@ -1,4 +1,37 @@
 from ulid import ULID
+import os
+import threading
+import time
+
+RANDOM_BITS = 80
+
+class MonotonicULIDGenerator:
+    """单调递增的 ULID：同一毫秒内把上一个 ID 的随机部分加一，而不是重新取随机数。
+
+    消息按 ID 排序和分页（after/before 游标），ULID() 在同一毫秒内的顺序是随机的，
+    即时返回的裁判回复可能排在它回答的提问之前。这里保证本进程生成的 ID 严格递增；
+    时钟回拨时沿用上一个时间戳，随机部分用尽时进入下一毫秒。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_ms = 0
+        self.last_random = 0
+
+    def generate(self) -> str:
+        with self.lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self.last_ms:
+                self.last_ms = now_ms
+                self.last_random = int.from_bytes(os.urandom(RANDOM_BITS // 8), "big")
+            elif self.last_random + 1 < 1 << RANDOM_BITS:
+                self.last_random += 1
+            else:
+                self.last_ms += 1
+                self.last_random = int.from_bytes(os.urandom(RANDOM_BITS // 8), "big")
+            return str(ULID.from_int((self.last_ms << RANDOM_BITS) | self.last_random))
+
+ulid_generator = MonotonicULIDGenerator()
 
 def generate_ulid():
-    return str(ULID())
\ No newline at end of file
+    return ulid_generator.generate()
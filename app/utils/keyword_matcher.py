@@ -0,0 +1,67 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class KeywordAutomaton:
+    """Aho-Corasick 多模式匹配自动机，一次扫描找出文本中出现的所有关键词。"""
+
+    def __init__(self, keywords: Iterable[str]):
+        # 去重并保留原有顺序，顺序即优先级
+        self.keywords: List[str] = [keyword for keyword in dict.fromkeys(keywords) if keyword]
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+        for index, keyword in enumerate(self.keywords):
+            self._insert(keyword, index)
+        self._build_failure_links()
+
+    def _insert(self, keyword: str, index: int):
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(index)
+
+    def _build_failure_links(self):
+        # 第一层节点的失败指针指向根节点，其余按广度优先计算
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                # 合并失败链上的输出，匹配时无需再沿失败链回溯
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        # 返回 (结束位置, 关键词) 列表
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for index in self.output[state]:
+                matches.append((position, self.keywords[index]))
+        return matches
+
+    def first_match(self, text: str) -> Optional[str]:
+        # 多个关键词同时出现时，返回列表中最靠前的那个
+        best = None
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for index in self.output[state]:
+                if best is None or index < best:
+                    best = index
+        return self.keywords[best] if best is not None else None
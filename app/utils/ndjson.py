@@ -0,0 +1,20 @@
+from typing import AsyncIterator, Tuple
+
+class LineTooLong(Exception):
+    pass
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes], max_line_bytes: int = 1 << 20) -> AsyncIterator[Tuple[int, bytes]]:
+    """把字节流按行切分，产出 (行号, 行内容)，跳过空行。只缓存当前不完整的一行。"""
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(f"第 {line_number + 1} 行超过 {max_line_bytes} 字节")
+    if buffer.strip():
+        yield line_number + 1, buffer
@@ -0,0 +1,280 @@
+"""聊天接口的进程内压测：用 httpx 的 ASGITransport 直接驱动 FastAPI 应用，不经过网络。
+
+覆盖创建聊天、发送消息、GET /all、按用户查询聊天、历史消息翻页和带 If-None-Match 的聊天轮询，
+报告每个接口的 p50/p95/p99、吞吐量以及每个请求执行的 SQL 语句数（来自 /metrics 使用的同一份统计），
+结果写成 JSON，便于在不同提交之间比较。
+
+需要可用的数据库（DATABASE_URL）。默认以 LLM_MODE=local、LLM_LOCAL_PROFILE=instant 运行，
+裁判的回复由本地服务商即时返回，测的是接口和数据库本身的开销；
+可通过环境变量改用 realistic 等延迟配置或 replay 录制文件。
+
+运行: python -m benchmarks.bench_chat_api --users 20 --chats 200 --messages-per-chat 200 \\
+          --concurrency 32 --requests 500 --output bench_chat_api.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+# 压测完全离线运行，也不希望日志输出影响结果
+os.environ.setdefault("LLM_MODE", "local")
+os.environ.setdefault("LLM_LOCAL_PROFILE", "instant")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# 压测进程内签发和验证令牌，未配置时使用随机密钥
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(48))
+
+import httpx
+from ulid import ULID
+from sqlalchemy import insert, select
+from app.main import app
+from app.core.metrics import metrics
+from app.db.database import AsyncSessionLocal
+from app.models.orm import BotModel, MessageModel
+from app.models.enums import MessageRole, SenderType
+from app.core.config import settings
+
+QUESTIONS = ["死者是男性", "他在船上", "和食物有关", "有人说谎", "当时是晚上", "他认识凶手"]
+
+class Scenario:
+    def __init__(self, name: str, method: str, route: str, request: Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]):
+        self.name = name
+        self.method = method
+        self.route = route
+        self.request = request
+
+def sql_snapshot(method: str, route: str) -> Dict[str, float]:
+    # 中间件按 (method, route) 汇总每个请求的 SQL 语句数和耗时
+    totals = {"statements": 0.0, "seconds": 0.0, "requests": 0}
+    for name, field in (("http_request_sql_statements", "statements"), ("http_request_sql_seconds", "seconds")):
+        for labels, histogram in metrics.histograms[name].items():
+            if dict(labels) == {"method": method, "route": route}:
+                totals[field] += histogram.sum
+                if field == "statements":
+                    totals["requests"] += histogram.count
+    return totals
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int, seed: int) -> dict:
+    before = sql_snapshot(scenario.method, scenario.route)
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker(worker_id: int):
+        rng = random.Random(seed * 1000 + worker_id)
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await scenario.request(client, rng)
+                status = response.status_code
+            except Exception:
+                status = 0
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    after = sql_snapshot(scenario.method, scenario.route)
+    measured = after["requests"] - before["requests"]
+    latencies.sort()
+    return {
+        "method": scenario.method,
+        "route": scenario.route,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(count for status, count in statuses.items() if not 200 <= status < 300),
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "sql_statements_per_request": round((after["statements"] - before["statements"]) / measured, 2) if measured else None,
+        "sql_ms_per_request": round((after["seconds"] - before["seconds"]) * 1000 / measured, 2) if measured else None,
+    }
+
+async def seed_dataset(client: httpx.AsyncClient, users: int, chats: int, messages_per_chat: int, run_id: str):
+    user_ids = []
+    for i in range(users):
+        response = await client.post("/api/users/", json={
+            "username": f"bench_{run_id}_{i}",
+            "email": f"bench_{run_id}_{i}@example.com",
+            "password": "bench-password",
+        })
+        response.raise_for_status()
+        user_ids.append(response.json()["id"])
+
+    # 创建聊天时会自动加入 caipan 机器人
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            if (await session.execute(select(BotModel.id).where(BotModel.id == "caipan"))).scalar_one_or_none() is None:
+                session.add(BotModel(id="caipan", name="裁判", description="海龟汤裁判", creator_id=user_ids[0]))
+
+    chat_ids = []
+    for i in range(chats):
+        response = await client.post("/api/chats/", json={"title": f"bench {run_id} {i}", "creator_id": user_ids[i % users]})
+        response.raise_for_status()
+        chat_ids.append(response.json()["id"])
+
+    # 历史消息直接批量写入数据库，ULID 按时间递增
+    base = datetime.utcnow() - timedelta(days=1)
+    for chat_index, chat_id in enumerate(chat_ids):
+        user_id = user_ids[chat_index % users]
+        rows = []
+        for i in range(messages_per_chat):
+            created_at = base + timedelta(seconds=i)
+            is_user = i % 2 == 0
+            rows.append({
+                "id": str(ULID.from_timestamp(created_at.timestamp())),
+                "chat_id": chat_id,
+                "sender_id": user_id if is_user else "caipan",
+                "sender_type": SenderType.USER if is_user else SenderType.BOT,
+                "role": MessageRole.USER if is_user else MessageRole.ASSISTANT,
+                "content": QUESTIONS[i % len(QUESTIONS)] if is_user else "不是。",
+                "created_at": created_at,
+            })
+        if rows:
+            async with AsyncSessionLocal() as session:
+                async with session.begin():
+                    await session.execute(insert(MessageModel), rows)
+    return user_ids, chat_ids
+
+def build_scenarios(user_ids: List[str], chat_ids: List[str], page_size: int, run_id: str) -> List[Scenario]:
+    async def create_chat(client, rng):
+        return await client.post("/api/chats/", json={
+            "title": f"bench {run_id} new",
+            "creator_id": rng.choice(user_ids),
+            "user_ids": [rng.choice(user_ids)],
+        })
+
+    async def post_message(client, rng):
+        return await client.post(f"/api/chats/{rng.choice(chat_ids)}/messages", json={
+            "content": rng.choice(QUESTIONS),
+            "role": MessageRole.USER.value,
+            "sender_id": rng.choice(user_ids),
+            "sender_type": SenderType.USER.value,
+        })
+
+    async def list_all(client, rng):
+        return await client.get("/api/chats/all")
+
+    async def user_chats(client, rng):
+        return await client.get(f"/api/chats/users/{rng.choice(user_ids)}", params={"limit": 10})
+
+    # 每个 worker 从最新一页开始按 before 游标向前翻，翻到底后换一个聊天
+    cursors: Dict[int, tuple] = {}
+
+    async def history_page(client, rng):
+        key = id(rng)
+        chat_id, before = cursors.get(key) or (rng.choice(chat_ids), None)
+        params = {"limit": page_size}
+        if before:
+            params["before"] = before
+        response = await client.get(f"/api/chats/{chat_id}/messages/history", params=params)
+        page = response.json() if response.status_code == 200 else []
+        cursors[key] = (chat_id, page[0]["id"]) if len(page) == page_size else None
+        return response
+
+    # 轮询客户端：记住每个聊天上次的 ETag，内容未变时应得到 304
+    etags: Dict[str, str] = {}
+
+    async def poll_chat(client, rng):
+        chat_id = rng.choice(chat_ids)
+        headers = {"If-None-Match": etags[chat_id]} if chat_id in etags else {}
+        response = await client.get(f"/api/chats/{chat_id}", headers=headers)
+        if "etag" in response.headers:
+            etags[chat_id] = response.headers["etag"]
+        return response
+
+    return [
+        Scenario("create_chat", "POST", "/api/chats/", create_chat),
+        Scenario("post_message", "POST", "/api/chats/{chat_id}/messages", post_message),
+        Scenario("list_all_chats", "GET", "/api/chats/all", list_all),
+        Scenario("user_chats", "GET", "/api/chats/users/{user_id}", user_chats),
+        Scenario("history_page", "GET", "/api/chats/{chat_id}/messages/history", history_page),
+        Scenario("poll_chat", "GET", "/api/chats/{chat_id}", poll_chat),
+    ]
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+async def main(args):
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            run_id = uuid.uuid4().hex[:8]
+            user_ids, chat_ids = await seed_dataset(client, args.users, args.chats, args.messages_per_chat, run_id)
+            scenarios = build_scenarios(user_ids, chat_ids, args.page_size, run_id)
+            selected = [s for s in scenarios if not args.only or s.name in args.only]
+
+            results = {}
+            for scenario in selected:
+                if args.warmup:
+                    await run_scenario(client, scenario, args.warmup, args.concurrency, args.seed + 1)
+                result = await run_scenario(client, scenario, args.requests, args.concurrency, args.seed)
+                results[scenario.name] = result
+                latency = result["latency_ms"]
+                print(f"{scenario.name:<16} {result['requests_per_second']:>8.1f} req/s  "
+                      f"p50={latency['p50']:.1f}ms p95={latency['p95']:.1f}ms p99={latency['p99']:.1f}ms  "
+                      f"sql/req={result['sql_statements_per_request']}  errors={result['errors']}")
+    finally:
+        await app.router.shutdown()
+
+    report = {
+        "benchmark": "chat_api",
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "config": {
+            "users": args.users,
+            "chats": args.chats,
+            "messages_per_chat": args.messages_per_chat,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "page_size": args.page_size,
+            "seed": args.seed,
+            "llm_mode": settings.LLM_MODE,
+            "llm_profile": settings.LLM_LOCAL_PROFILE,
+        },
+        "scenarios": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="聊天接口进程内压测")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages-per-chat", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500, help="每个场景的请求数")
+    parser.add_argument("--warmup", type=int, default=50, help="每个场景正式计时前的预热请求数")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="*", help="只运行指定场景")
+    parser.add_argument("--output", default="bench_chat_api.json")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,92 @@
+"""WebSocket 推送中心的扇出开销：数千个空闲连接 + 活跃聊天室 + 少量慢客户端。
+
+不经过网络，连接用模拟对象代替：send_text 按设定的延迟完成，慢客户端的延迟远大于消息间隔。
+测量每次 publish 在调用方（写消息的请求）中的耗时、消息从发布到送达各连接的延迟，
+以及慢客户端是否被及时断开而不影响其他连接。
+
+运行: python -m benchmarks.bench_chat_hub [空闲连接数] [活跃聊天室数] [每个聊天室的成员数]
+"""
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime
+from app.core.chat_hub import ChatHub
+from app.models.schemas import Message
+from app.models.enums import MessageRole, SenderType
+
+PUBLISH_RATE = 1000  # 每秒发布的消息数（分布在所有活跃聊天室）
+DURATION = 3.0
+SLOW_FRACTION = 0.01
+NORMAL_SEND_DELAY = 0.0002
+SLOW_SEND_DELAY = 3600.0  # 慢客户端：完全不读
+# 缩小队列和超时，让慢客户端在几秒内触发断开（生产默认 WS_SEND_QUEUE_SIZE=256、WS_SEND_TIMEOUT=5）
+QUEUE_SIZE = 16
+SEND_TIMEOUT = 1.0
+
+class FakeWebSocket:
+    def __init__(self, delay: float, latencies: list):
+        self.delay = delay
+        self.latencies = latencies
+        self.closed_with = None
+
+    async def send_text(self, frame: str):
+        await asyncio.sleep(self.delay)
+        # 帧中的 content 字段携带发布时间
+        sent_at = float(frame.rsplit('"content":"', 1)[1].split('"', 1)[0])
+        self.latencies.append((time.perf_counter() - sent_at) * 1000)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+async def run(idle: int, rooms: int, members: int):
+    hub = ChatHub(queue_size=QUEUE_SIZE, send_timeout=SEND_TIMEOUT)
+    rng = random.Random(1)
+    latencies: list = []
+    sockets = []
+
+    for i in range(idle):
+        hub.connect(f"idle-{i}", f"user-{i}", FakeWebSocket(NORMAL_SEND_DELAY, latencies))
+    for room in range(rooms):
+        for member in range(members):
+            slow = rng.random() < SLOW_FRACTION
+            websocket = FakeWebSocket(SLOW_SEND_DELAY if slow else NORMAL_SEND_DELAY, latencies)
+            sockets.append((slow, websocket))
+            hub.connect(f"room-{room}", f"member-{member}", websocket)
+
+    publish_costs = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    total = int(PUBLISH_RATE * DURATION)
+    for i in range(total):
+        await asyncio.sleep(max(0.0, start + i / PUBLISH_RATE - loop.time()))
+        message = Message(
+            id=str(i), chat_id="", sender_id="u", sender_type=SenderType.USER, role=MessageRole.USER,
+            content=repr(time.perf_counter()), created_at=datetime.utcnow(),
+        )
+        t0 = time.perf_counter()
+        hub.publish(f"room-{i % rooms}", "message", message)
+        publish_costs.append((time.perf_counter() - t0) * 1e6)
+
+    await asyncio.sleep(0.5)
+    stats = hub.stats()
+    slow_sockets = [websocket for slow, websocket in sockets if slow]
+    evicted_slow = sum(1 for websocket in slow_sockets if websocket.closed_with == 1013)
+    evicted_normal = sum(1 for slow, websocket in sockets if not slow and websocket.closed_with == 1013)
+    await hub.close_all()
+
+    print(f"连接: 空闲 {idle}，活跃 {rooms} 个聊天室 × {members} 人（慢客户端 {len(slow_sockets)} 个）")
+    print(f"发布 {stats['published']} 条，送达 {stats['delivered']} 次")
+    print(f"publish 调用耗时 p50={percentile(publish_costs, 0.5):.1f}us p99={percentile(publish_costs, 0.99):.1f}us")
+    print(f"送达延迟 p50={percentile(latencies, 0.5):.2f}ms p99={percentile(latencies, 0.99):.2f}ms")
+    print(f"断开慢客户端 {evicted_slow}/{len(slow_sockets)}，误断正常客户端 {evicted_normal}")
+
+if __name__ == "__main__":
+    idle = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rooms = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    members = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    asyncio.run(run(idle, rooms, members))
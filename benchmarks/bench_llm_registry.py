@@ -0,0 +1,129 @@
+"""对比每个请求新建 LLM 客户端与复用进程级注册表时，一次真实 HTTPS 请求的端到端耗时。
+
+在本机启动一个模拟 OpenAI chat/completions 接口的 HTTPS 服务（自签名证书，需要 openssl 命令），
+两种方式各发送相同数量的请求：
+  per_request: 旧的做法，每个请求新建 OpenAIService / AnthropicService / StoryCompletionChecker，
+               SDK 各自创建 httpx 客户端，每次都要重新建立 TCP 连接和 TLS 握手
+  registry:    BotService 引用注册表中的服务，共享的连接池保持 keep-alive 连接
+测的是本机回环上的开销（客户端构建 + TCP/TLS 握手的 CPU 时间）；真实网络中每次握手还要多 1~2 个往返，差距会更大。
+
+运行: python -m benchmarks.bench_llm_registry [请求数] [并发数]
+"""
+import asyncio
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CERT_DIR = tempfile.mkdtemp(prefix="bench_llm_")
+CERT_FILE = os.path.join(CERT_DIR, "cert.pem")
+KEY_FILE = os.path.join(CERT_DIR, "key.pem")
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "是"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}).encode()
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    connections = set()
+
+    def setup(self):
+        super().setup()
+        CompletionHandler.connections.add(self.client_address)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *args):
+        pass
+
+def start_server() -> int:
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1", "-keyout", KEY_FILE, "-out", CERT_FILE],
+        check=True, capture_output=True,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionHandler)
+    server.daemon_threads = True
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(CERT_FILE, KEY_FILE)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+# 配置需在导入 app 之前设置：指向本机服务，SDK 自建的 httpx 客户端通过 SSL_CERT_FILE 信任自签名证书
+port = start_server()
+os.environ.update({
+    "LLM_MODE": "remote",
+    "OPENAI_API_BASE": f"https://localhost:{port}/v1",
+    "OPENAI_API_KEY": "bench", "DEEPSEEK_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "SSL_CERT_FILE": CERT_FILE,
+})
+
+from app.services.bot_service import BotService
+from app.services.llm.openai_service import OpenAIService
+from app.services.llm.anthropic_service import AnthropicService
+from app.services.bots.check_completion_service import StoryCompletionChecker
+from app.services.llm.registry import get_llm_registry, close_llm_registry
+
+async def per_request_call():
+    # 旧的做法：每个请求都创建新的客户端
+    openai_service = OpenAIService()
+    AnthropicService()
+    StoryCompletionChecker()
+    await openai_service.chat_model.ainvoke("是亲哥哥吗？")
+
+async def registry_call():
+    bot_service = BotService(None)
+    await bot_service.openai_service.chat_model.ainvoke("是亲哥哥吗？")
+
+async def measure(call, requests: int, concurrency: int) -> dict:
+    CompletionHandler.connections.clear()
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return {
+        "p50_ms": samples[len(samples) // 2],
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "req_per_s": requests / elapsed,
+        "tcp_connections": len(CompletionHandler.connections),
+    }
+
+async def main(requests: int, concurrency: int):
+    # 两种方式都先跑一次，排除 langchain / SDK 的首次导入和惰性初始化
+    await per_request_call()
+    await registry_call()
+    print(f"{requests} 个请求，并发 {concurrency}，本机 HTTPS 模拟服务")
+    for name, call in [("per_request", per_request_call), ("registry", registry_call)]:
+        result = await measure(call, requests, concurrency)
+        print(f"  {name:<12} p50={result['p50_ms']:.2f}ms p99={result['p99_ms']:.2f}ms "
+              f"{result['req_per_s']:.0f} req/s  新建连接 {result['tcp_connections']}")
+    await close_llm_registry()
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    get_llm_registry()
+    asyncio.run(main(requests, concurrency))
@@ -0,0 +1,133 @@
+"""事件循环中的日志开销：同步写文件 vs 队列 + 逐条 flush 的后台线程 vs 队列 + 按批写入（当前实现）。
+
+按固定节奏到达的轻量请求模拟聊天接口，每个请求写若干条日志，测量其从计划到达到完成的延迟；
+同时报告单条 logger.info 在调用线程中的平均耗时，以及流量结束后后台线程还需多久才能写完积压的日志。写入目标为真实文件，可为每次 flush（write 系统调用）
+附加固定延迟，模拟被管道阻塞的 stdout、网络盘等慢速目标。
+单次运行受调度抖动影响很大，三种方式交替运行多轮，延迟分位数按所有轮次的请求合并计算。
+
+运行: python -m benchmarks.bench_logging [每个请求的日志条数] [轮数] [text|json] [每次 flush 的附加延迟 us]
+"""
+import asyncio
+import logging
+import os
+import queue
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+from app.core.logger import (
+    JsonFormatter, ContextFilter, _StructuredQueueHandler, configure_logging, stop_logging, logging_context,
+)
+
+REQUEST_INTERVAL = 0.002
+REQUESTS = 1000
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+
+def make_formatter(json_format: bool) -> logging.Formatter:
+    return JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+
+def reset_root() -> logging.Logger:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.INFO)
+    return root
+
+class SlowStream:
+    """每次 flush 额外等待固定时间（time.sleep 释放 GIL，与真实的阻塞 I/O 一样）。"""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def flush(self):
+        self.stream.flush()
+        time.sleep(self.delay)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def configure_sync(path: str, json_format: bool):
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(make_formatter(json_format))
+    handler.addFilter(ContextFilter())
+    reset_root().addHandler(handler)
+    return [handler], handler.close
+
+def configure_per_record(path: str, json_format: bool):
+    # 优化前的队列实现：标准 QueueListener + RotatingFileHandler，每条记录单独 flush
+    handler = RotatingFileHandler(path, maxBytes=10000000, backupCount=5, encoding="utf-8")
+    handler.setFormatter(make_formatter(json_format))
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    reset_root().addHandler(queue_handler)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+
+    def stop():
+        listener.stop()
+        handler.close()
+    return [handler], stop
+
+def configure_batched(path: str, json_format: bool):
+    listener = configure_logging(level="INFO", log_file=path, json_format=json_format, console=False)
+    return listener.handlers, stop_logging
+
+async def traffic(log: logging.Logger, per_request: int, latencies: list, call_costs: list):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i in range(REQUESTS):
+        scheduled = start + i * REQUEST_INTERVAL
+        await asyncio.sleep(max(0.0, scheduled - loop.time()))
+        with logging_context(chat_id=f"chat-{i % 50}", user_id=f"user-{i % 200}"):
+            for j in range(per_request):
+                t0 = time.perf_counter()
+                log.info("处理消息 %d/%d", i, j)
+                call_costs.append(time.perf_counter() - t0)
+        latencies.append((loop.time() - scheduled) * 1000)
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def run(configure, per_request: int, json_format: bool, sink_delay: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app.log")
+        handlers, stop = configure(path, json_format)
+        if sink_delay:
+            for handler in handlers:
+                handler.stream = SlowStream(handler.stream, sink_delay)
+        log = logging.getLogger("bench")
+        latencies, call_costs = [], []
+        asyncio.run(traffic(log, per_request, latencies, call_costs))
+        start = time.perf_counter()
+        stop()
+        drain = time.perf_counter() - start
+        reset_root()
+        # 超过大小上限时会轮转出 app.log.1 等文件
+        written = 0
+        for filename in os.listdir(tmp):
+            with open(os.path.join(tmp, filename), encoding="utf-8") as f:
+                written += sum(1 for _ in f)
+    assert written == REQUESTS * per_request, f"丢失日志: 写入 {written} 条"
+    return {"latencies": latencies, "call_us": sum(call_costs) / len(call_costs) * 1e6, "drain_ms": drain * 1000}
+
+if __name__ == "__main__":
+    per_request = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    json_format = (sys.argv[3] if len(sys.argv) > 3 else "text") == "json"
+    sink_delay = (float(sys.argv[4]) if len(sys.argv) > 4 else 0.0) / 1e6
+    modes = [("sync", configure_sync), ("per_record", configure_per_record), ("batched", configure_batched)]
+    results = {name: [] for name, _ in modes}
+    for _ in range(rounds):
+        for name, configure in modes:
+            results[name].append(run(configure, per_request, json_format, sink_delay))
+    print(f"每个请求 {per_request} 条日志，{'JSON' if json_format else '文本'}格式，"
+          f"每次 flush 附加 {sink_delay * 1e6:.0f}us，{rounds} 轮")
+    for name, runs in results.items():
+        latencies = [latency for r in runs for latency in r["latencies"]]
+        print(f"  {name:<11} 请求延迟 p50={percentile(latencies, 0.5):.2f}ms p99={percentile(latencies, 0.99):.2f}ms "
+              f"p99.9={percentile(latencies, 0.999):.2f}ms 单条日志 {statistics.median(r['call_us'] for r in runs):.1f}us "
+              f"积压写完 {statistics.median(r['drain_ms'] for r in runs):.0f}ms")
@@ -0,0 +1,108 @@
+"""登录风暴期间聊天请求的尾延迟：bcrypt 直接在事件循环中执行 vs 放入有界线程池。
+
+聊天请求是真实的 POST /api/chats/{chat_id}/messages，与 bench_chat_api 一样经 httpx 的 ASGITransport
+在进程内驱动 FastAPI 应用（写消息、查询历史、裁判回复、启动完成度检查），按固定节奏到达，
+测量其从计划到达到完成的延迟 p50/p99；同时在这段时间内发起大量密码校验。
+登录只调用密码校验本身（登录接口的其余部分与两种方式无关），idle 为没有登录时的基线。
+聊天到达率和登录数都应低于机器的处理能力：bcrypt 总计算量超过 CPU 核数能承担的部分时，
+两种方式都会排队，线程池也无济于事。
+
+需要可用的数据库（DATABASE_URL）。默认以 LLM_MODE=local、LLM_LOCAL_PROFILE=instant 运行，裁判即时回复。
+
+运行: python -m benchmarks.bench_login_storm [登录并发数] [聊天数]
+"""
+import asyncio
+import random
+import sys
+import uuid
+# 先导入 bench_chat_api：它在导入 app 之前设置离线运行所需的环境变量
+from benchmarks.bench_chat_api import QUESTIONS, percentile, seed_dataset
+import httpx
+from app.main import app
+from app.core.password_hasher import PasswordHasher, pwd_context
+from app.core.exceptions import AppException
+from app.models.enums import MessageRole, SenderType
+
+CHAT_INTERVAL = 0.02
+CHAT_REQUESTS = 400
+
+async def post_message(client: httpx.AsyncClient, chat_id: str, user_id: str, content: str) -> int:
+    response = await client.post(f"/api/chats/{chat_id}/messages", json={
+        "content": content,
+        "role": MessageRole.USER.value,
+        "sender_id": user_id,
+        "sender_type": SenderType.USER.value,
+    })
+    return response.status_code
+
+async def chat_traffic(client: httpx.AsyncClient, user_ids: list, chat_ids: list, latencies: list, statuses: list):
+    # 按固定节奏到达的聊天请求（开环：不等上一个请求完成），延迟从计划到达时间算起，事件循环被阻塞期间的请求同样计入
+    loop = asyncio.get_running_loop()
+    rng = random.Random(1)
+
+    async def one(scheduled: float, chat_id: str, user_id: str):
+        statuses.append(await post_message(client, chat_id, user_id, rng.choice(QUESTIONS)))
+        latencies.append((loop.time() - scheduled) * 1000)
+
+    start = loop.time()
+    requests = []
+    for i in range(CHAT_REQUESTS):
+        scheduled = start + i * CHAT_INTERVAL
+        await asyncio.sleep(max(0.0, scheduled - loop.time()))
+        chat_index = rng.randrange(len(chat_ids))
+        requests.append(asyncio.create_task(one(scheduled, chat_ids[chat_index], user_ids[chat_index % len(user_ids)])))
+    await asyncio.gather(*requests)
+
+async def inline_login(hashed: str):
+    pwd_context.verify("secret", hashed)
+
+async def delayed(login, delay: float):
+    await asyncio.sleep(delay)
+    await login()
+
+async def run(client: httpx.AsyncClient, user_ids: list, chat_ids: list, login, logins: int):
+    # 登录请求均匀分布在聊天流量持续的时间内到达
+    latencies, statuses = [], []
+    chat = asyncio.create_task(chat_traffic(client, user_ids, chat_ids, latencies, statuses))
+    spacing = CHAT_INTERVAL * CHAT_REQUESTS / max(logins, 1)
+    rejected = 0
+    logins = [delayed(login, i * spacing) for i in range(logins)]
+    for result in await asyncio.gather(*logins, return_exceptions=True):
+        if isinstance(result, AppException):
+            rejected += 1
+    await chat
+    latencies.sort()
+    return {
+        "chat_p50_ms": percentile(latencies, 0.50),
+        "chat_p99_ms": percentile(latencies, 0.99),
+        "chat_max_ms": latencies[-1],
+        "chat_errors": sum(1 for status in statuses if not 200 <= status < 300),
+        "rejected_logins": rejected,
+    }
+
+async def main(logins: int, chats: int):
+    hashed = pwd_context.hash("secret")
+    hasher = PasswordHasher(max_workers=4, max_queue=64)
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+            user_ids, chat_ids = await seed_dataset(client, users=4, chats=chats, messages_per_chat=20,
+                                                    run_id=uuid.uuid4().hex[:8])
+            # 预热：排除首次请求的惰性初始化
+            for chat_id in chat_ids:
+                await post_message(client, chat_id, user_ids[0], QUESTIONS[0])
+
+            baseline = await run(client, user_ids, chat_ids, lambda: asyncio.sleep(0), 0)
+            inline = await run(client, user_ids, chat_ids, lambda: inline_login(hashed), logins)
+            pooled = await run(client, user_ids, chat_ids, lambda: hasher.verify("secret", hashed), logins)
+    finally:
+        await app.router.shutdown()
+        hasher.shutdown()
+
+    for name, result in [("idle", baseline), ("inline", inline), ("pool", pooled)]:
+        print(f"{name:8s} " + " ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    chats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(logins, chats))
@@ -0,0 +1,99 @@
+"""消息历史的序列化开销：默认路径与 FAST_SERIALIZATION 快速路径，按每 1000 条消息计。
+
+默认路径：查询 ORM 对象 → Message.from_orm → FastAPI 按 response_model 再校验一次并转成 JSON 兼容对象 → json.dumps。
+快速路径：只查询需要的列 → 结果元组直接组装成字典 → orjson 编码（FastJSONResponse）。
+另测缓存命中时（消息已是 Message 模型）两种响应方式的编码开销。
+
+用内存中的 SQLite 提供真实的查询结果，只比较 Python 侧的开销，不含网络和数据库本身的耗时；
+两条路径的输出会先比对，确保 JSON 内容一致。
+
+运行: python -m benchmarks.bench_serialization [消息数] [重复次数]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_response_field
+from ulid import ULID
+from app.models.enums import MessageRole, SenderType
+from app.models.orm import MessageModel
+from app.models.schemas import Message
+from app.repositories.chat_repository import message_columns, message_row
+from app.utils.fast_json import FastJSONResponse
+
+CONTENT = "他是因为喝了海龟汤才意识到妻子当年的死因吗？"
+response_field = create_response_field(name="response", type_=List[Message])
+
+def seed(engine, count: int):
+    MessageModel.__table__.create(engine)
+    start = datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(insert(MessageModel), [
+            {
+                "id": str(ULID()),
+                "chat_id": "01J0000000000000000000CHAT",
+                "sender_id": "01J0000000000000000000USER",
+                "sender_type": SenderType.USER,
+                "role": MessageRole.USER,
+                "content": CONTENT,
+                "created_at": start + timedelta(seconds=i),
+            }
+            for i in range(count)
+        ])
+
+def load_models(engine) -> List[Message]:
+    with Session(engine) as session:
+        return [Message.from_orm(msg) for msg in session.execute(select(MessageModel).order_by(MessageModel.id)).scalars().all()]
+
+def load_rows(engine) -> List[dict]:
+    with Session(engine) as session:
+        return [message_row(row) for row in session.execute(select(*message_columns()).order_by(MessageModel.id)).all()]
+
+def encode_default(messages: list) -> bytes:
+    # 与 fastapi.routing.serialize_response 对 pydantic v2 的处理相同：先校验，再转成 JSON 兼容对象
+    value, errors = response_field.validate(messages, {}, loc=("response",))
+    assert not errors
+    return JSONResponse(response_field.serialize(value)).body
+
+def encode_fast(content: list) -> bytes:
+    return FastJSONResponse(content).body
+
+def measure(func, repeat: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main(count: int, repeat: int):
+    engine = create_engine("sqlite://")
+    seed(engine, count)
+    models = load_models(engine)
+    rows = load_rows(engine)
+    assert json.loads(encode_default(models)) == json.loads(encode_fast(rows)) == json.loads(encode_fast(models))
+
+    scale = 1000 / count
+    results = {
+        "默认: ORM 查询 + from_orm": measure(lambda: load_models(engine), repeat),
+        "默认: response_model 校验 + json": measure(lambda: encode_default(models), repeat),
+        "快速: 列查询 + 字典": measure(lambda: load_rows(engine), repeat),
+        "快速: orjson 编码字典": measure(lambda: encode_fast(rows), repeat),
+        "缓存命中: orjson 编码 Message": measure(lambda: encode_fast(models), repeat),
+    }
+    print(f"{count} 条消息，每项重复 {repeat} 次，单位: 毫秒 / 1000 条")
+    for name, elapsed in results.items():
+        print(f"  {name:<32} {elapsed * scale:8.2f}")
+    default_total = results["默认: ORM 查询 + from_orm"] + results["默认: response_model 校验 + json"]
+    fast_total = results["快速: 列查询 + 字典"] + results["快速: orjson 编码字典"]
+    print(f"  合计: 默认 {default_total * scale:.2f}，快速 {fast_total * scale:.2f}（{default_total / fast_total:.1f}x）")
+    print(f"  缓存命中: 默认 {results['默认: response_model 校验 + json'] * scale:.2f}，"
+          f"快速 {results['缓存命中: orjson 编码 Message'] * scale:.2f}")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    main(count, repeat)
@@ -0,0 +1,6 @@
+import os
+
+# 测试不访问真实的 LLM 服务商；设置需在导入 app 之前完成
+os.environ.setdefault("LLM_MODE", "local")
+os.environ.setdefault("LLM_LOCAL_PROFILE", "instant")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-0123456789abcdef0123456789")
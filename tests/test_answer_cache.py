@@ -0,0 +1,31 @@
+import numpy as np
+from app.services.llm.answer_cache import JudgeAnswerCache
+
+PUZZLE = ("01J0000000000000000000TANG", "0")
+
+def make_cache(**kwargs) -> JudgeAnswerCache:
+    options = dict(max_entries=1000, ttl=3600, threshold=0.6, num_perm=64, ngram=2)
+    options.update(kwargs)
+    return JudgeAnswerCache(**options)
+
+def test_index_rows_match_entries_after_updates_and_removals():
+    cache = make_cache(max_entries=50)
+    for i in range(200):
+        cache.store(PUZZLE, f"他是第{i % 80}个走进房间的人吗", f"回答{i}")
+    index = cache.indexes[PUZZLE]
+    assert len(index) == len(cache.entries) == 50
+    for row, question in enumerate(index.questions):
+        assert index.rows[question] == row
+        assert np.array_equal(index.signatures()[row], cache.entries[(PUZZLE, question)].signature)
+    assert cache.lookup(PUZZLE, "他是第39个走进房间的人吗") == "回答199"
+
+def test_expired_best_match_falls_through_to_next_candidate():
+    cache = make_cache()
+    cache.store(PUZZLE, "男人是被妻子毒死的吗", "是的。")
+    cache.store(PUZZLE, "男人是被妻子毒死的吗？对吧", "是的，被妻子。")
+    # 让与提问完全相同的那条过期，近似匹配应继续找到次优的条目并清理过期条目
+    best = cache.entries[(PUZZLE, "男人是被妻子毒死的吗")]
+    best.expires_at = 0
+    assert cache.find_near_duplicate(PUZZLE, "男人是被妻子毒死的吗", now=1.0).answer == "是的，被妻子。"
+    assert (PUZZLE, "男人是被妻子毒死的吗") not in cache.entries
+    assert cache.indexes[PUZZLE].questions == ["男人是被妻子毒死的吗对吧"]
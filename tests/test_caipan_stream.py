@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from app.models.enums import MessageRole, SenderType
+from app.models.schemas import Message, MessageCreate
+from app.services.chat_service import ChatService
+
+def message(content: str, role: MessageRole) -> Message:
+    return Message(
+        id=content, chat_id="chat", sender_id="caipan", sender_type=SenderType.BOT, role=role,
+        content=content, created_at=datetime.utcnow(),
+    )
+
+class FakeBotService:
+    async def stream_chat_message_response(self, chat_history, chat_id, bot_id, haiguitang):
+        for token in ("是", "的。"):
+            yield token
+
+class StreamingChatService(ChatService):
+    # 只替换数据库相关的步骤，测试流式回合本身的顺序
+    def __init__(self):
+        self.bot_service = FakeBotService()
+        self.checked = []
+
+    async def _prepare_caipan_turn(self, chat_id, message_create):
+        chat = SimpleNamespace(current_haiguitang=SimpleNamespace(tang_di="汤底"))
+        return chat, message("他死了", MessageRole.USER), [], "caipan"
+
+    async def _save_caipan_reply(self, chat_id, bot_id, bot_reply):
+        return message(bot_reply, MessageRole.ASSISTANT)
+
+    async def _check_story_completion(self, chat_id, tang_di, messages):
+        self.checked.append(messages[-1].content)
+
+def test_completion_check_runs_when_client_disconnects_after_bot_message():
+    async def scenario():
+        service = StreamingChatService()
+        stream = service.add_message_and_stream_caipan_reply(
+            "chat", MessageCreate(content="他死了", role=MessageRole.USER, sender_id="u", sender_type=SenderType.USER)
+        )
+        async for event, _ in stream:
+            if event == "bot_message":
+                # 客户端收到最后一个事件后立即断开
+                await stream.aclose()
+                break
+        await asyncio.sleep(0)
+        return service.checked
+
+    assert asyncio.run(scenario()) == ["是的。"]
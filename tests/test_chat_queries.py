@@ -0,0 +1,70 @@
+"""聊天列表的查询次数不随聊天数量增长（SQLite 上运行仓库的真实查询）。"""
+import asyncio
+from datetime import datetime
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.models.enums import MessageRole, SenderType
+from app.models.orm import BotModel, ChatModel, MessageModel, UserModel, chat_bots, chat_users
+from app.repositories.chat_repository import ChatRepository
+from app.utils.id_generator import generate_ulid
+
+TABLES = [UserModel.__table__, BotModel.__table__, ChatModel.__table__, MessageModel.__table__, chat_users, chat_bots]
+
+async def seed(engine, chats: int, messages_per_chat: int = 3) -> dict:
+    now = datetime.utcnow()
+    last_message_ids = {}
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: [table.create(sync_conn) for table in TABLES])
+        await conn.execute(insert(UserModel), [
+            {"id": f"u{i}", "username": f"user{i}", "email": f"user{i}@example.com", "created_at": now, "updated_at": now}
+            for i in range(3)
+        ])
+        await conn.execute(insert(BotModel), [{
+            "id": "caipan", "name": "裁判", "description": "海龟汤裁判", "creator_id": "u0",
+            "is_active": True, "created_at": now, "updated_at": now,
+        }])
+        await conn.execute(insert(ChatModel), [
+            {"id": f"c{i}", "title": f"chat {i}", "creator_id": "u0", "is_active": True, "created_at": now, "updated_at": now}
+            for i in range(chats)
+        ])
+        await conn.execute(insert(chat_users), [
+            {"chat_id": f"c{i}", "user_id": f"u{j}"} for i in range(chats) for j in range(i % 3 + 1)
+        ])
+        await conn.execute(insert(chat_bots), [{"chat_id": f"c{i}", "bot_id": "caipan"} for i in range(chats)])
+        rows = []
+        for _ in range(messages_per_chat):
+            for i in range(chats):
+                message_id = generate_ulid()
+                last_message_ids[f"c{i}"] = message_id
+                rows.append({
+                    "id": message_id, "chat_id": f"c{i}", "sender_id": "u0", "sender_type": SenderType.USER,
+                    "role": MessageRole.USER, "content": "是亲哥哥吗？", "created_at": now,
+                })
+        await conn.execute(insert(MessageModel), rows)
+    return last_message_ids
+
+async def run_listing(tmp_path, chats: int, method: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/chats_{chats}.db")
+    try:
+        last_message_ids = await seed(engine, chats)
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            result = await getattr(ChatRepository(session), method)()
+        return len(statements), result, last_message_ids
+    finally:
+        await engine.dispose()
+
+def last_message_id(chat) -> str:
+    return chat["last_message"]["id"] if isinstance(chat, dict) else chat.last_message.id
+
+@pytest.mark.parametrize("method", ["get_all_chats", "get_all_chat_rows"])
+def test_chat_list_query_count_does_not_grow_with_chats(tmp_path, method):
+    counts = {}
+    for chats in (1, 5, 40):
+        count, result, last_message_ids = asyncio.run(run_listing(tmp_path, chats, method))
+        counts[chats] = count
+        assert len(result) == chats
+        assert {chat["id"] if isinstance(chat, dict) else chat.id: last_message_id(chat) for chat in result} == last_message_ids
+    assert len(set(counts.values())) == 1, counts
@@ -0,0 +1,137 @@
+"""海龟汤的 NDJSON 导入导出（SQLite 上运行仓库的真实语句）。"""
+import asyncio
+import json
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from app.core.puzzle_sampler import puzzle_sampler
+from app.models.orm import HaiguiTangModel
+from app.repositories import haiguitang_repository
+from app.repositories.haiguitang_repository import HaiguiTangRepository, export_ndjson
+from app.utils.ndjson import LineTooLong, iter_ndjson_lines
+
+def puzzle(i: int, **fields) -> dict:
+    return {"title": f"海龟汤 {i}", "tang_mian": f"汤面 {i}", "tang_di": f"汤底 {i}", "tags": ["经典", f"t{i % 3}"],
+            "difficulty": i % 5 + 1, **fields}
+
+def ndjson(rows) -> bytes:
+    return b"".join(json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n" for row in rows)
+
+async def chunks(data: bytes, size: int = 7):
+    # 小块切分，行会跨越多个块
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'haiguitang.db'}")
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(HaiguiTangModel.__table__.create)
+    asyncio.run(create())
+    yield engine
+    asyncio.run(engine.dispose())
+
+@pytest.fixture(autouse=True)
+def restore_sampler():
+    puzzles = dict(puzzle_sampler.puzzles)
+    yield
+    puzzle_sampler.load((puzzle_id, p.difficulty, p.tags, p.usage_count) for puzzle_id, p in puzzles.items())
+
+async def import_bytes(engine, data: bytes, batch_size: int, max_line_bytes: int = 1 << 20):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        return await HaiguiTangRepository(session).import_ndjson(
+            iter_ndjson_lines(chunks(data), max_line_bytes), batch_size
+        )
+
+async def export_rows(engine, monkeypatch, batch_size: int = 4) -> list:
+    monkeypatch.setattr(haiguitang_repository, "AsyncSessionLocal", async_sessionmaker(engine))
+    body = b"".join([chunk async for chunk in export_ndjson(batch_size)])
+    return [json.loads(line) for line in body.splitlines()]
+
+async def count(engine) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(text("SELECT count(*) FROM haiguitang"))).scalar()
+
+def test_iter_ndjson_lines_numbers_lines_and_skips_blank():
+    async def collect():
+        return [item async for item in iter_ndjson_lines(chunks(b'{"a":1}\n\n  \n{"b":2}\n{"c":3}', 3))]
+    assert asyncio.run(collect()) == [(1, b'{"a":1}'), (4, b'{"b":2}'), (5, b'{"c":3}')]
+
+def test_iter_ndjson_lines_rejects_overlong_line():
+    async def collect():
+        return [item async for item in iter_ndjson_lines(chunks(b"short\n" + b"x" * 100, 10), max_line_bytes=32)]
+    with pytest.raises(LineTooLong):
+        asyncio.run(collect())
+
+def test_import_inserts_in_batches_and_reports_invalid_lines(engine):
+    rows = [puzzle(i) for i in range(10)]
+    data = ndjson(rows[:4]) + '{"title": "缺少标签"}\n'.encode() + b"not json\n" + ndjson(rows[4:])
+    result = asyncio.run(import_bytes(engine, data, batch_size=3))
+    assert result.inserted == 10
+    assert result.failed == 2
+    assert [error.line for error in result.errors] == [5, 6]
+    assert asyncio.run(count(engine)) == 10
+    assert len([p for p in puzzle_sampler.puzzles.values() if "经典" in p.tags]) >= 10
+
+def test_failed_batch_is_retried_row_by_row(engine):
+    async def reject_bad_titles():
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TRIGGER reject_bad BEFORE INSERT ON haiguitang WHEN NEW.title LIKE '%坏%' "
+                "BEGIN SELECT RAISE(ABORT, 'bad title'); END"
+            ))
+    asyncio.run(reject_bad_titles())
+
+    rows = [puzzle(i) for i in range(6)]
+    rows[2]["title"] = "坏的海龟汤"
+    result = asyncio.run(import_bytes(engine, ndjson(rows), batch_size=4))
+    # 第一批（第 1-4 行）整批失败后逐行写入，只有第 3 行被拒绝
+    assert result.inserted == 5
+    assert result.failed == 1
+    assert result.errors[0].line == 3
+    assert "bad title" in result.errors[0].error
+    assert asyncio.run(count(engine)) == 5
+
+def test_line_too_long_stops_import_but_keeps_earlier_rows(engine):
+    data = ndjson([puzzle(0), puzzle(1)]) + json.dumps(puzzle(2, tang_mian="长" * 200)).encode()
+    result = asyncio.run(import_bytes(engine, data, batch_size=10, max_line_bytes=256))
+    assert result.inserted == 2
+    assert result.failed == 1
+    assert result.errors[0].line == -1
+    assert asyncio.run(count(engine)) == 2
+
+def test_export_round_trip_includes_legacy_null_rows(engine, tmp_path, monkeypatch):
+    rows = [puzzle(i) for i in range(9)]
+    asyncio.run(import_bytes(engine, ndjson(rows), batch_size=4))
+
+    async def insert_legacy():
+        async with engine.begin() as conn:
+            await conn.execute(insert(HaiguiTangModel), [{
+                "id": "00000000000000000000LEGACY", "title": "旧数据", "tags": [], "difficulty": None, "usage_count": None,
+            }])
+    asyncio.run(insert_legacy())
+
+    exported = asyncio.run(export_rows(engine, monkeypatch))
+    # 含 NULL 的旧数据不会中断导出
+    assert len(exported) == 10
+    legacy = next(row for row in exported if row["id"] == "00000000000000000000LEGACY")
+    assert legacy["difficulty"] is None and legacy["usage_count"] is None
+
+    # 导出的内容可以直接导入另一个库；缺少难度的旧数据按行报告
+    other = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'other.db'}")
+
+    async def reimport():
+        async with other.begin() as conn:
+            await conn.run_sync(HaiguiTangModel.__table__.create)
+        return await import_bytes(other, ndjson(exported), batch_size=4)
+    result = asyncio.run(reimport())
+    assert result.inserted == 9
+    assert result.failed == 1
+    reexported = asyncio.run(export_rows(other, monkeypatch))
+    asyncio.run(other.dispose())
+
+    fields = ("title", "tang_mian", "tang_di", "tags", "difficulty")
+    content = lambda items: sorted(tuple(json.dumps(row[f], ensure_ascii=False) for f in fields) for row in items)
+    assert content(reexported) == content(rows)
@@ -0,0 +1,48 @@
+"""消息历史长轮询：超时后重新比较版本，其他进程写入的消息不会被 304 吞掉。"""
+import asyncio
+import httpx
+from fastapi import FastAPI
+from app.api import chat_routes
+from app.core.config import settings
+from app.utils.etag import make_etag
+
+class FakeChatService:
+    def __init__(self, versions):
+        self.versions = list(versions)
+        self.calls = 0
+
+    async def get_chat_version(self, chat_id: str):
+        version = self.versions[min(self.calls, len(self.versions) - 1)]
+        self.calls += 1
+        return version
+
+    async def get_message_rows(self, chat_id, limit, before=None, after=None):
+        return [{"id": "m2", "chat_id": chat_id, "content": "新消息"}]
+
+    async def get_chat_messages_history(self, chat_id, limit, before=None, after=None):
+        return []
+
+def get_history(service: FakeChatService, etag: str, wait: float) -> httpx.Response:
+    app = FastAPI()
+    app.include_router(chat_routes.router, prefix="/api/chats")
+    app.dependency_overrides[chat_routes.get_chat_service] = lambda: service
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(f"/api/chats/c1/messages/history?wait={wait}", headers={"If-None-Match": etag})
+    return asyncio.run(run())
+
+def test_timeout_without_changes_returns_304():
+    service = FakeChatService(["v1"])
+    response = get_history(service, make_etag("v1"), wait=0.05)
+    assert response.status_code == 304
+    assert service.calls == 2
+
+def test_timeout_after_write_from_another_process_returns_new_rows(monkeypatch):
+    monkeypatch.setattr(settings, "FAST_SERIALIZATION", True)
+    # 等待期间版本变化，但本进程的 chat_hub 没有收到通知，只能等到超时
+    service = FakeChatService(["v1", "v2"])
+    response = get_history(service, make_etag("v1"), wait=0.05)
+    assert response.status_code == 200
+    assert response.headers["etag"] == make_etag("v2")
+    assert response.json()[0]["id"] == "m2"
@@ -0,0 +1,26 @@
+from ulid import ULID
+from app.utils.id_generator import MonotonicULIDGenerator, RANDOM_BITS
+
+def test_ids_strictly_increase_within_a_millisecond():
+    generator = MonotonicULIDGenerator()
+    ids = [generator.generate() for _ in range(20000)]
+    assert all(a < b for a, b in zip(ids, ids[1:]))
+    # 两万个 ID 必然有多个落在同一毫秒
+    assert len({ULID.from_str(i).milliseconds for i in ids}) < len(ids)
+
+def test_clock_going_backwards_keeps_order():
+    generator = MonotonicULIDGenerator()
+    first = generator.generate()
+    generator.last_ms += 60_000
+    second = generator.generate()
+    assert first < second
+    assert ULID.from_str(second).milliseconds == generator.last_ms
+
+def test_random_overflow_moves_to_next_millisecond():
+    generator = MonotonicULIDGenerator()
+    generator.generate()
+    generator.last_ms += 60_000
+    generator.last_random = (1 << RANDOM_BITS) - 1
+    before = generator.last_ms
+    value = generator.generate()
+    assert ULID.from_str(value).milliseconds == before + 1
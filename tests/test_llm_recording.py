@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime
+import pytest
+from app.models.enums import MessageRole, SenderType
+from app.models.schemas import Message
+from app.services.llm.base_llm_service import FALLBACK_RESPONSE
+from app.services.llm.cassette import Cassette
+from app.services.llm.local_service import (
+    LATENCY_PROFILES, LocalLLMError, LocalLLMService, RecordingLLMService, chat_request,
+)
+
+def question(content: str) -> list:
+    return [Message(
+        id="01J0000000000000000000MSG0", chat_id="chat", sender_id="user", sender_type=SenderType.USER,
+        role=MessageRole.USER, content=content, created_at=datetime.utcnow(),
+    )]
+
+def test_failed_call_is_not_recorded_or_replayed(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    instant = LATENCY_PROFILES["instant"]
+
+    async def record():
+        cassette = Cassette(path)
+        failing = RecordingLLMService(LocalLLMService(instant, error_rate=1.0, seed=1), cassette)
+        working = RecordingLLMService(LocalLLMService(instant, seed=1), cassette)
+        assert await failing.generate_response(question("他死了"), "chat", "bot", "gpt-4o") == FALLBACK_RESPONSE
+        with pytest.raises(LocalLLMError):
+            async for _ in failing.stream_response(question("他是自杀"), "chat", "bot", "gpt-4o"):
+                pass
+        answer = await working.generate_response(question("他是男人"), "chat", "bot", "gpt-4o")
+        return cassette, answer
+
+    cassette, answer = asyncio.run(record())
+    assert cassette.recorded == 1
+
+    replay_cassette = Cassette(path)
+    assert replay_cassette.load() == 1
+    replay = LocalLLMService(instant, cassette=replay_cassette)
+    assert replay_cassette.lookup("chat", chat_request(question("他死了"), "gpt-4o", None)) is None
+    assert asyncio.run(replay.generate_response(question("他死了"), "chat", "bot", "gpt-4o")) != FALLBACK_RESPONSE
+    assert asyncio.run(replay.generate_response(question("他是男人"), "chat", "bot", "gpt-4o")) == answer
@@ -0,0 +1,32 @@
+import logging
+from app.core.logger import configure_logging, setup_logger, stop_logging
+
+def test_stop_logging_writes_every_queued_record(tmp_path):
+    path = tmp_path / "app.log"
+    configure_logging(level="INFO", log_file=str(path), console=False)
+    log = logging.getLogger("test_logger")
+    for i in range(5000):
+        log.info("记录 %d", i)
+    stop_logging()
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 5000
+    # 默认是文本格式
+    assert lines[-1].endswith("INFO test_logger 记录 4999")
+
+def test_stop_logging_stops_named_loggers(tmp_path):
+    path = tmp_path / "named.log"
+    log = setup_logger("test_named_logger", str(path))
+    for i in range(1000):
+        log.info("记录 %d", i)
+    stop_logging()
+    assert not log.listener._thread
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 1000
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+
+def test_json_format_is_opt_in(tmp_path):
+    path = tmp_path / "json.log"
+    configure_logging(level="INFO", log_file=str(path), json_format=True, console=False)
+    logging.getLogger("test_logger").warning("出错了")
+    stop_logging()
+    assert '"message": "出错了"' in path.read_text(encoding="utf-8")
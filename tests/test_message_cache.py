@@ -0,0 +1,72 @@
+from datetime import datetime
+from app.core.message_cache import MessageWindowCache
+from app.models.enums import MessageRole, SenderType
+from app.models.schemas import Message
+
+def message(chat_id: str, i: int) -> Message:
+    return Message(id=f"m{i}", chat_id=chat_id, sender_id="u0", sender_type=SenderType.USER,
+                   role=MessageRole.USER, content=f"问题 {i}", created_at=datetime(2024, 1, 1))
+
+def messages(chat_id: str, count: int) -> list:
+    return [message(chat_id, i) for i in range(count)]
+
+def test_get_misses_until_filled_then_hits():
+    cache = MessageWindowCache(max_chats=4, window_size=5)
+    assert cache.get("c1", 3) is None
+    cache.fill("c1", messages("c1", 5), limit=5, read_seq=cache.begin_read())
+    assert [m.id for m in cache.get("c1", 3)] == ["m2", "m3", "m4"]
+    # 窗口不完整时比窗口更长的请求仍需回源
+    assert cache.get("c1", 10) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_short_chat_is_complete_and_answers_any_limit():
+    cache = MessageWindowCache(max_chats=4, window_size=5)
+    cache.fill("c1", messages("c1", 2), limit=3, read_seq=cache.begin_read())
+    assert [m.id for m in cache.get("c1", 50)] == ["m0", "m1"]
+    cache.append("c1", message("c1", 2))
+    assert len(cache.get("c1", 50)) == 3
+    # 窗口滚动丢弃旧消息后不再完整
+    for i in range(3, 6):
+        cache.append("c1", message("c1", i))
+    assert cache.get("c1", 50) is None
+    assert [m.id for m in cache.get("c1", 5)] == ["m1", "m2", "m3", "m4", "m5"]
+
+def test_partial_read_below_window_size_is_not_cached():
+    cache = MessageWindowCache(max_chats=4, window_size=5)
+    cache.fill("c1", messages("c1", 3), limit=3, read_seq=cache.begin_read())
+    assert cache.get("c1", 3) is None
+
+def test_least_recently_used_chat_is_evicted():
+    cache = MessageWindowCache(max_chats=2, window_size=5)
+    for chat_id in ("c1", "c2"):
+        cache.fill(chat_id, messages(chat_id, 1), limit=5, read_seq=cache.begin_read())
+    cache.get("c1", 1)
+    cache.fill("c3", messages("c3", 1), limit=5, read_seq=cache.begin_read())
+    assert cache.get("c2", 1) is None
+    assert cache.get("c1", 1) is not None and cache.get("c3", 1) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.size_bytes == sum(w.size_bytes for w in cache.windows.values())
+
+def test_fill_from_read_started_before_a_write_is_rejected():
+    cache = MessageWindowCache(max_chats=4, window_size=5)
+    read_seq = cache.begin_read()
+    # 读取进行中写入了新消息，读到的结果不含它
+    cache.append("c1", message("c1", 1))
+    cache.fill("c1", messages("c1", 1), limit=5, read_seq=read_seq)
+    assert cache.get("c1", 1) is None
+    cache.fill("c1", messages("c1", 2), limit=5, read_seq=cache.begin_read())
+    assert len(cache.get("c1", 5)) == 2
+
+def test_guard_survives_eviction_of_the_write_record():
+    cache = MessageWindowCache(max_chats=1, window_size=5)
+    read_seq = cache.begin_read()
+    cache.append("c1", message("c1", 1))
+    # 其他聊天的写入把 c1 的写入记录挤出 last_writes
+    for i in range(cache.max_chats * 4):
+        cache.append(f"other{i}", message(f"other{i}", 0))
+    assert "c1" not in cache.last_writes
+    cache.fill("c1", messages("c1", 1), limit=5, read_seq=read_seq)
+    assert cache.get("c1", 1) is None
+    # 写入之后开始的读取仍可回填
+    cache.fill("c1", messages("c1", 2), limit=5, read_seq=cache.begin_read())
+    assert len(cache.get("c1", 5)) == 2
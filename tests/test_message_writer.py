@@ -0,0 +1,109 @@
+"""后写模式的崩溃一致性：进程崩溃（后台任务被直接取消、不执行 stop）时哪些已确认的消息会丢失。"""
+import asyncio
+import json
+from datetime import datetime
+import pytest
+from app.models.enums import MessageRole, SenderType
+from app.models.schemas import Message
+from app.repositories.message_writer import MessageWriteBehind
+from app.utils.id_generator import generate_ulid
+
+class MemoryWriter(MessageWriteBehind):
+    """用内存中的表代替数据库；内容为 poison 的消息模拟违反约束的坏数据。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.table = {}
+
+    async def insert_rows(self, rows):
+        await asyncio.sleep(0)
+        if any(row["content"] == "poison" for row in rows):
+            raise ValueError("value too long for type character varying")
+        for row in rows:
+            self.table[row["id"]] = row
+
+def make_message(content: str = "是亲哥哥吗？") -> Message:
+    return Message(
+        id=generate_ulid(), chat_id="c1", sender_id="u1", sender_type=SenderType.USER,
+        role=MessageRole.USER, content=content, created_at=datetime.utcnow(),
+    )
+
+async def crash(writer: MessageWriteBehind):
+    # 模拟进程崩溃：后台任务直接终止，队列和 pending 中的消息随进程消失
+    writer.task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await writer.task
+
+def test_batched_crash_loses_at_most_the_last_flush_interval():
+    async def run():
+        writer = MemoryWriter("batched", batch_size=1000, flush_interval=0.02, max_pending=10000)
+        await writer.start()
+        old = [make_message() for _ in range(100)]
+        for message in old:
+            await writer.enqueue(message)
+        # 超过一个刷新周期之后，之前确认的消息都已落库
+        await asyncio.sleep(0.1)
+        recent = [make_message() for _ in range(10)]
+        for message in recent:
+            await writer.enqueue(message)
+        await crash(writer)
+        return writer, old, recent
+
+    writer, old, recent = asyncio.run(run())
+    assert all(message.id in writer.table for message in old)
+    # 崩溃前最后一个周期内确认的消息尚未写入，会丢失
+    assert not any(message.id in writer.table for message in recent)
+
+def test_shutdown_mode_crash_loses_everything_since_last_full_batch():
+    async def run():
+        writer = MemoryWriter("shutdown", batch_size=50, flush_interval=0.01, max_pending=10000)
+        await writer.start()
+        messages = [make_message() for _ in range(120)]
+        for message in messages:
+            await writer.enqueue(message)
+        await asyncio.sleep(0.05)
+        await crash(writer)
+        return writer, messages
+
+    writer, messages = asyncio.run(run())
+    # 两个整批（100 条）已写入，之后的 20 条丢失
+    assert [message.id in writer.table for message in messages] == [True] * 100 + [False] * 20
+
+@pytest.mark.parametrize("mode", ["batched", "shutdown"])
+def test_graceful_stop_persists_everything(mode):
+    async def run():
+        writer = MemoryWriter(mode, batch_size=50, flush_interval=0.01, max_pending=10000)
+        await writer.start()
+        messages = [make_message() for _ in range(120)]
+        for message in messages:
+            await writer.enqueue(message)
+        await writer.stop()
+        return writer, messages
+
+    writer, messages = asyncio.run(run())
+    assert all(message.id in writer.table for message in messages)
+    assert writer.pending == {}
+
+def test_bad_row_is_dead_lettered_without_blocking_other_messages(tmp_path):
+    dead_letter_file = tmp_path / "dead.jsonl"
+
+    async def run():
+        writer = MemoryWriter("batched", batch_size=10, flush_interval=0.01, max_pending=20,
+                              max_retries=2, dead_letter_file=str(dead_letter_file))
+        await writer.start()
+        poison = make_message("poison")
+        await writer.enqueue(poison)
+        # 队列上限 20：坏数据若一直重试，这里的 enqueue 会永远阻塞
+        messages = [make_message() for _ in range(100)]
+        for message in messages:
+            await asyncio.wait_for(writer.enqueue(message), 5)
+        await writer.stop()
+        return writer, poison, messages
+
+    writer, poison, messages = asyncio.run(run())
+    assert all(message.id in writer.table for message in messages)
+    assert poison.id not in writer.table
+    assert writer.dead_lettered == 1 and writer.dropped == 0
+    assert writer.pending == {}
+    [entry] = [json.loads(line) for line in dead_letter_file.read_text(encoding="utf-8").splitlines()]
+    assert entry["message"]["id"] == poison.id
@@ -0,0 +1,35 @@
+import asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.db.database import TimedAsyncAdaptedQueuePool, pool_wait_stats
+
+def test_only_blocking_checkouts_count_as_pool_wait(tmp_path):
+    async def scenario():
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            poolclass=TimedAsyncAdaptedQueuePool, pool_size=1, max_overflow=0, pool_timeout=5,
+        )
+        count, total = pool_wait_stats.count, pool_wait_stats.total
+        # 建立连接和取空闲连接不算等待
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        assert pool_wait_stats.count == count
+
+        async def hold():
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                await asyncio.sleep(0.2)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.05)
+        # 唯一的连接被占用，第二个请求必须排队
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        await holder
+        await engine.dispose()
+        assert pool_wait_stats.count == count + 1
+        assert pool_wait_stats.total - total >= 0.1
+
+    asyncio.run(scenario())
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
+from app.services.llm.prompt_cache import EXAMPLES, SYSTEM_TEMPLATE, PromptCache
+
+def template_messages(tang_mian: str, tang_di: str, question: str):
+    # 原来按模板逐次渲染的提示，预渲染的结果必须与它一致
+    few_shot = FewShotChatMessagePromptTemplate(
+        example_prompt=ChatPromptTemplate.from_messages([("human", "{input}"), ("ai", "{output}")]),
+        examples=EXAMPLES,
+    )
+    prompt = ChatPromptTemplate.from_messages([("system", SYSTEM_TEMPLATE), few_shot, ("human", "{input}")])
+    return prompt.format_messages(tang_mian=tang_mian, tang_di=tang_di, input=question)
+
+def puzzle(updated_at: datetime):
+    return SimpleNamespace(id="01J0000000000000000000TANG", tang_mian="汤面{不是变量}", tang_di="汤底", updated_at=updated_at)
+
+def test_prerendered_prompt_matches_template():
+    cache = PromptCache()
+    haiguitang = puzzle(datetime(2024, 1, 1))
+    assert cache.get(haiguitang).messages({"input": "是亲哥哥吗？"}) == template_messages("汤面{不是变量}", "汤底", "是亲哥哥吗？")
+
+def test_chain_is_reused_until_the_puzzle_changes():
+    cache = PromptCache()
+    model = FakeListChatModel(responses=["是的。"])
+    haiguitang = puzzle(datetime(2024, 1, 1))
+    chain = cache.chain(model, haiguitang)
+    assert cache.chain(model, haiguitang) is chain
+    assert chain.invoke({"input": "是亲哥哥吗？"}).content == "是的。"
+
+    # 新版本替换旧条目，重新渲染
+    updated = puzzle(datetime(2024, 1, 1) + timedelta(minutes=1))
+    assert cache.chain(model, updated) is not chain
+    assert len(cache.entries) == 1
@@ -0,0 +1,48 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.api import prompt_routes
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.services import prompt_validator_service
+
+app = FastAPI()
+app.include_router(prompt_routes.router, prefix="/api/prompt")
+
+def post(path: str, **kwargs) -> httpx.Response:
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post(path, **kwargs)
+    return asyncio.run(run())
+
+@pytest.fixture
+def keywords_file(tmp_path):
+    original = settings.PROMPT_KEYWORDS_FILE
+    path = tmp_path / "keywords.txt"
+    settings.PROMPT_KEYWORDS_FILE = str(path)
+    yield path
+    settings.PROMPT_KEYWORDS_FILE = original
+    prompt_validator_service.reload_keywords()
+
+def auth_headers() -> dict:
+    return {"Authorization": f"Bearer {create_access_token('u1', 'alice')}"}
+
+def test_reload_requires_login(keywords_file):
+    keywords_file.write_text("为什么\n", encoding="utf-8")
+    assert post("/api/prompt/keywords/reload").status_code == 401
+
+def test_reload_reads_only_the_configured_file(keywords_file):
+    keywords_file.write_text("为什么\n是谁\n", encoding="utf-8")
+    # 请求体中的关键词被忽略，不能借此关闭或篡改校验
+    response = post("/api/prompt/keywords/reload", json={"keywords": []}, headers=auth_headers())
+    assert response.status_code == 200
+    assert response.json() == {"count": 2}
+    assert not prompt_validator_service.check_prompt("他为什么死了").is_valid
+
+def test_empty_keywords_file_keeps_current_automaton(keywords_file):
+    keywords_file.write_text("为什么\n", encoding="utf-8")
+    post("/api/prompt/keywords/reload", headers=auth_headers())
+    keywords_file.write_text("", encoding="utf-8")
+    assert post("/api/prompt/keywords/reload", headers=auth_headers()).status_code == 500
+    assert not prompt_validator_service.check_prompt("他为什么死了").is_valid
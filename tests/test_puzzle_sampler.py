@@ -0,0 +1,62 @@
+from app.core.puzzle_sampler import PuzzleSampler
+
+def test_min_usage_rises_as_puzzles_are_used():
+    sampler = PuzzleSampler(seed=1)
+    sampler.load([(f"p{i}", None, [], 0) for i in range(100)])
+    for _ in range(5):
+        for i in range(100):
+            sampler.record_usage(f"p{i}")
+    assert sampler.min_usage == 5
+
+    sampler.record_usage("p0", 10)
+    assert sampler.min_usage == 5
+    sampler.upsert("new", None, [], 2)
+    assert sampler.min_usage == 2
+    sampler.remove("new")
+    assert sampler.min_usage == 5
+
+def test_favor_unused_does_not_drift_to_fallback():
+    # 每次抽取后记录使用，使用次数整体上涨；最小值跟着上涨时拒绝采样不会退化为完整抽取
+    sampler = PuzzleSampler(seed=1)
+    sampler.load([(f"p{i}", None, [], 0) for i in range(200)])
+    for _ in range(20000):
+        sampler.record_usage(sampler.sample(favor_unused=True))
+    assert sampler.min_usage > 0
+    assert sampler.fallbacks == 0
+    assert sampler.attempts / sampler.samples < 3
+
+def test_upsert_keeps_pending_usage():
+    # 编辑题目时数据库中的计数还不含 usage_counter 未写入的增量
+    sampler = PuzzleSampler(seed=1)
+    sampler.load([("p0", 1, ["a"], 3), ("p1", 1, ["a"], 3)])
+    sampler.record_usage("p0", 5)
+    sampler.upsert("p0", 2, ["b"], 3)
+    assert sampler.puzzles["p0"].usage_count == 8
+    assert sampler.puzzles["p0"].tags == frozenset(["b"])
+    sampler.upsert("p0", 2, ["b"], 12)
+    assert sampler.puzzles["p0"].usage_count == 12
+
+def test_database_fallback_prefers_target_difficulty(tmp_path, monkeypatch):
+    import asyncio
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from app.core.puzzle_sampler import puzzle_sampler
+    from app.models.orm import HaiguiTangModel
+    from app.repositories.haiguitang_repository import HaiguiTangRepository
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'fallback.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(HaiguiTangModel.__table__.create)
+            await conn.execute(insert(HaiguiTangModel), [
+                {"id": f"p{d}{i}", "title": "t", "tags": [], "difficulty": d, "usage_count": i}
+                for d in range(1, 6) for i in range(3)
+            ])
+        async with AsyncSession(engine) as session:
+            repository = HaiguiTangRepository(session)
+            picks = [(await repository.get_random_haiguitang(target_difficulty=4, favor_unused=True)).id for _ in range(10)]
+        await engine.dispose()
+        return picks
+
+    monkeypatch.setattr(puzzle_sampler, "loaded", False)
+    assert set(asyncio.run(scenario())) == {"p40"}
@@ -0,0 +1,33 @@
+import pytest
+from app.core.config import settings
+from app.core.exceptions import AppException
+from app.core.security import check_secret_key, create_access_token, decode_access_token
+
+@pytest.fixture
+def secret_key():
+    original = settings.SECRET_KEY
+    yield lambda value: setattr(settings, "SECRET_KEY", value)
+    settings.SECRET_KEY = original
+
+@pytest.mark.parametrize("value", [None, "", "default_secret_key", "x" * 31])
+def test_weak_secret_key_is_refused(secret_key, value):
+    secret_key(value)
+    with pytest.raises(RuntimeError):
+        check_secret_key()
+    with pytest.raises(AppException) as exc:
+        create_access_token("u1", "alice")
+    assert exc.value.status_code == 500
+
+def test_token_round_trip_with_strong_key(secret_key):
+    secret_key("k" * 32)
+    check_secret_key()
+    user = decode_access_token(create_access_token("u1", "alice"))
+    assert (user.id, user.username) == ("u1", "alice")
+
+def test_token_signed_with_other_key_is_rejected(secret_key):
+    secret_key("a" * 40)
+    token = create_access_token("u1", "alice")
+    secret_key("b" * 40)
+    with pytest.raises(AppException) as exc:
+        decode_access_token(token)
+    assert exc.value.status_code == 401
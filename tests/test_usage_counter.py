@@ -0,0 +1,60 @@
+import asyncio
+from app.repositories.usage_counter import UsageCounter
+
+class RecordingCounter(UsageCounter):
+    """用内存代替数据库：apply 记录写入的增量，前 failures 次写入失败。"""
+
+    def __init__(self, flush_interval: float, failures: int = 0):
+        super().__init__(flush_interval)
+        self.written = {}
+        self.remaining_failures = failures
+
+    async def apply(self, items):
+        await asyncio.sleep(0)
+        if self.remaining_failures:
+            self.remaining_failures -= 1
+            raise RuntimeError("数据库不可用")
+        for haiguitang_id, count in items:
+            self.written[haiguitang_id] = self.written.get(haiguitang_id, 0) + count
+
+def test_stop_flushes_all_pending_counts():
+    async def run():
+        # 刷新间隔远大于测试时长：所有计数都只能由 stop 写入
+        counter = RecordingCounter(flush_interval=3600)
+        await counter.start()
+        for i in range(1000):
+            counter.record(f"h{i % 7}")
+        await counter.stop()
+        return counter
+
+    counter = asyncio.run(run())
+    assert sum(counter.written.values()) == 1000
+    assert counter.written["h0"] == 143
+    assert counter.pending == {}
+
+def test_stop_retries_failed_flush():
+    async def run():
+        counter = RecordingCounter(flush_interval=3600, failures=2)
+        await counter.start()
+        counter.record("h1", 5)
+        counter.record("h2")
+        await counter.stop()
+        return counter
+
+    counter = asyncio.run(run())
+    assert counter.written == {"h1": 5, "h2": 1}
+    assert counter.failures == 2
+    assert counter.pending == {}
+
+def test_counts_recorded_during_flush_are_not_lost():
+    async def run():
+        counter = RecordingCounter(flush_interval=0.01, failures=3)
+        await counter.start()
+        for _ in range(50):
+            counter.record("h1")
+            await asyncio.sleep(0.002)
+        await counter.stop()
+        return counter
+
+    counter = asyncio.run(run())
+    assert counter.written == {"h1": 50}